@@ -29,6 +29,9 @@ setuptools.setup(
     ],
     python_requires='>=3.6',
     install_requires=requirements,
+    extras_require={
+        'marian': ['transformers', 'sentencepiece'],
+    },
     package_data={'RealtimeTTS': ['engines/*.json']},
     include_package_data=True,
     keywords='replace, voice, youtube, video, audio, voice, synthesis, '
@@ -0,0 +1,223 @@
+import difflib
+import re
+
+# available word alignment engines:
+# - refine: stable_whisper refine (re-runs whisper, precise but slow)
+# - ctc: CTC forced alignment with a wav2vec2 model (fast, runs on cpu)
+# - none: keeps the timestamps delivered by the transcription
+ALIGNMENT_ENGINES = ("refine", "ctc", "none")
+
+ctc_bundle = None
+ctc_model = None
+ctc_device = None
+
+
+def refine_alignment(stable_model, file_name, result, precision=0.05):
+    """
+    Tightens word timestamps with stable_whisper's refine, which
+    iteratively mutes parts of the audio and re-runs the model.
+
+    Args:
+    stable_model: Loaded stable_whisper model.
+    file_name (str): Path to the transcribed audio file.
+    result: stable_whisper transcription result.
+    precision (float): Precision of the timestamps in seconds.
+
+    Returns:
+    The refined result.
+    """
+    return stable_model.refine(
+        file_name,
+        result,
+        precision=precision,
+    )
+
+
+def load_ctc_model(device="cpu"):
+    """
+    Loads the multilingual MMS forced alignment model from torchaudio.
+    """
+    global ctc_bundle, ctc_model, ctc_device
+
+    if ctc_model is None or ctc_device != device:
+        import torchaudio
+
+        print(f"Loading CTC alignment model on {device}...")
+        ctc_bundle = torchaudio.pipelines.MMS_FA
+        ctc_model = ctc_bundle.get_model(with_star=False).to(device)
+        ctc_device = device
+
+    return ctc_bundle, ctc_model
+
+
+def normalize_alignment_word(word: str, dictionary) -> str:
+    """
+    Normalizes a word to the characters known by the alignment model.
+    """
+    word = word.lower().replace("’", "'")
+    word = re.sub(r"[^a-z']", "", word)
+    return "".join(char for char in word if char in dictionary)
+
+
+def ctc_alignment(file_name, result, device="cpu", context=0.5):
+    """
+    Aligns the words of a stable_whisper result to the audio with CTC
+    forced alignment. Every segment is aligned separately in a window
+    around its transcribed position, which keeps memory usage low and
+    runs fast on cpu.
+
+    Words consisting only of characters unknown to the alignment model
+    (for example non-latin scripts) keep their original timestamps.
+
+    Args:
+    file_name (str): Path to the transcribed audio file.
+    result: stable_whisper transcription result.
+    device (str): Device to run the alignment model on.
+    context (float): Seconds of audio added before and after a segment.
+
+    Returns:
+    The result with aligned word timestamps.
+    """
+    import torchaudio
+    import torch
+
+    bundle, model = load_ctc_model(device)
+    dictionary = bundle.get_dict(star=None)
+    tokenizer = bundle.get_tokenizer()
+    aligner = bundle.get_aligner()
+
+    waveform, sample_rate = torchaudio.load(file_name)
+    waveform = waveform.mean(dim=0, keepdim=True)
+    if sample_rate != bundle.sample_rate:
+        waveform = torchaudio.functional.resample(
+            waveform, sample_rate, bundle.sample_rate
+        )
+        sample_rate = bundle.sample_rate
+
+    audio_duration = waveform.size(1) / sample_rate
+
+    for segment in result.segments:
+        words = segment.words
+        if not words:
+            continue
+
+        # only words with known characters take part in the alignment
+        aligned_words = []
+        transcript = []
+        for word in words:
+            normalized = normalize_alignment_word(word.word, dictionary)
+            if normalized:
+                aligned_words.append(word)
+                transcript.append(normalized)
+
+        if not transcript:
+            continue
+
+        window_start = max(0.0, words[0].start - context)
+        window_end = min(audio_duration, words[-1].end + context)
+        chunk = waveform[
+            :, int(window_start * sample_rate):int(window_end * sample_rate)
+        ]
+
+        with torch.inference_mode():
+            emission, _ = model(chunk.to(device))
+
+        if emission.size(1) < sum(len(word) for word in transcript):
+            # window too short to align the characters, keep timestamps
+            continue
+
+        try:
+            token_spans = aligner(emission[0], tokenizer(transcript))
+        except RuntimeError as e:
+            print(f"CTC alignment failed for segment "
+                  f"'{segment.text.strip()}': {e}")
+            continue
+
+        seconds_per_frame = chunk.size(1) / emission.size(1) / sample_rate
+
+        for word, spans in zip(aligned_words, token_spans):
+            word.start = window_start + spans[0].start * seconds_per_frame
+            word.end = window_start + spans[-1].end * seconds_per_frame
+
+    return result
+
+
+def match_words(words, reference_words):
+    """
+    Pairs words with the reference words of the same text (compared
+    case and punctuation insensitive) in sequence order, so word lists
+    of different transcriptions can be compared.
+
+    Args:
+    words (list): List of (text, start, end) tuples.
+    reference_words (list): List of (text, start, end) tuples.
+
+    Returns:
+    list: List of (word, reference_word) tuples.
+    """
+    def normalize(text):
+        return re.sub(r"\W", "", text.lower())
+
+    matcher = difflib.SequenceMatcher(
+        None,
+        [normalize(text) for text, _, _ in words],
+        [normalize(text) for text, _, _ in reference_words],
+        autojunk=False
+    )
+
+    return [
+        (words[block.a + offset], reference_words[block.b + offset])
+        for block in matcher.get_matching_blocks()
+        for offset in range(block.size)
+    ]
+
+
+def timestamp_error(words, reference_words):
+    """
+    Mean absolute start and end error in seconds of the words matched
+    to the reference by text (see match_words).
+
+    Args:
+    words (list): List of (text, start, end) tuples.
+    reference_words (list): List of (text, start, end) tuples.
+
+    Returns:
+    tuple: Mean error in seconds and the number of matched words.
+    """
+    pairs = match_words(words, reference_words)
+    errors = [
+        (abs(start - ref_start) + abs(end - ref_end)) / 2
+        for (_, start, end), (_, ref_start, ref_end) in pairs
+    ]
+    return (sum(errors) / len(errors) if errors else 0), len(pairs)
+
+
+def align(
+        engine,
+        file_name,
+        result,
+        stable_model=None,
+        device="cpu"
+        ):
+    """
+    Runs the selected word alignment engine on a stable_whisper result.
+
+    Args:
+    engine (str): One of ALIGNMENT_ENGINES.
+    file_name (str): Path to the transcribed audio file.
+    result: stable_whisper transcription result.
+    stable_model: Loaded stable_whisper model (needed for 'refine').
+    device (str): Device for the 'ctc' engine.
+
+    Returns:
+    The aligned result.
+    """
+    if engine == "refine":
+        return refine_alignment(stable_model, file_name, result)
+    if engine == "ctc":
+        return ctc_alignment(file_name, result, device=device)
+    if engine == "none":
+        return result
+
+    raise ValueError(f"Unknown alignment engine {engine}. "
+                     f"Choose one of {', '.join(ALIGNMENT_ENGINES)}.")
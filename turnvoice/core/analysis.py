@@ -0,0 +1,200 @@
+from .diarize import (
+    diarize,
+    filter_speakers,
+    print_speakers,
+    write_speaker_timefiles
+)
+from os.path import basename, exists, getmtime, getsize, join
+import json
+
+ANALYSIS_FILE = "analysis.json"
+
+
+def normalize_limit_times(limit_times):
+    """
+    Converts time ranges into a JSON comparable list of lists.
+    """
+    if not limit_times:
+        return None
+    return [[start, end] for start, end in limit_times]
+
+
+def audio_identity(audio_file):
+    """
+    Identifies the analyzed audio file by name, size and modification
+    time.
+    """
+    return {
+        "audio_file": basename(audio_file),
+        "audio_size": getsize(audio_file),
+        "audio_mtime": getmtime(audio_file)
+    }
+
+
+def save_analysis(
+    speakers,
+    audio_file,
+    directory,
+    num_speakers=0,
+    min_speakers=0,
+    max_speakers=0,
+    limit_times=None
+):
+    """
+    Stores the speakers of a quick analysis at full precision,
+    so the follow-up full run can skip diarization.
+    """
+    analysis_file = join(directory, ANALYSIS_FILE)
+    analysis = {
+        **audio_identity(audio_file),
+        "num_speakers": num_speakers,
+        "min_speakers": min_speakers,
+        "max_speakers": max_speakers,
+        "limit_times": normalize_limit_times(limit_times),
+        "speakers": speakers
+    }
+
+    with open(analysis_file, 'w', encoding='utf-8') as f:
+        json.dump(analysis, f, indent=4)
+
+    print(f"Analysis saved to {analysis_file}")
+
+
+def load_analysis(
+    directory,
+    audio_file,
+    num_speakers=0,
+    min_speakers=0,
+    max_speakers=0,
+    limit_times=None
+):
+    """
+    Loads the speakers of a previous quick analysis of audio_file (the
+    original audio, the analysis timings also apply to its vocals).
+
+    Returns:
+    - list: The speakers, or None if there is no analysis or it was
+        created for another audio file or with different speaker count
+        hints or time ranges.
+    """
+    analysis_file = join(directory, ANALYSIS_FILE)
+    if not exists(analysis_file):
+        return None
+
+    with open(analysis_file, 'r', encoding='utf-8') as f:
+        analysis = json.load(f)
+
+    identity = audio_identity(audio_file)
+    if any(analysis.get(key) != value for key, value in identity.items()):
+        print(f"Analysis in {analysis_file} was created for another "
+              "audio file, ignoring it.")
+        return None
+
+    if (analysis["num_speakers"] != num_speakers or
+            analysis["min_speakers"] != min_speakers or
+            analysis["max_speakers"] != max_speakers or
+            analysis.get("limit_times") !=
+            normalize_limit_times(limit_times)):
+        print(f"Analysis in {analysis_file} was created with different "
+              "speaker settings, ignoring it.")
+        return None
+
+    print(f"Using speakers from analysis {analysis_file}")
+    return analysis["speakers"]
+
+
+def print_turn_previews(audio_file, speakers, model="tiny"):
+    """
+    Transcribes the audio with a small model and prints
+    a preview line for every speaker turn.
+    """
+    from .transcribe import faster_transcribe, extract_words
+
+    print(f"Transcribing {audio_file} with {model} model for preview...")
+    segments, _ = faster_transcribe(audio_file, model=model)
+    words = extract_words(segments)
+
+    turns = sorted(
+        (segment["start"], segment["end"], speaker_number)
+        for speaker_number, speaker in enumerate(speakers, start=1)
+        for segment in speaker["segments"]
+    )
+
+    print("\nSpeaker turns:")
+    word_index = 0
+    for start, end, speaker_number in turns:
+
+        # skip words before this turn
+        while (word_index < len(words) and
+               (words[word_index].start + words[word_index].end) / 2 < start):
+            word_index += 1
+
+        text = ""
+        index = word_index
+        while (index < len(words) and
+               (words[index].start + words[index].end) / 2 <= end):
+            text += words[index].text
+            index += 1
+
+        print(f"[{start:.1f}s - {end:.1f}s] Speaker {speaker_number}: "
+              f"{text.strip()}")
+
+
+def quick_analysis(
+    audio_file,
+    download_sub_directory,
+    num_speakers=0,
+    min_speakers=0,
+    max_speakers=0,
+    processing_start=0,
+    processing_end=None,
+    preview_model=None,
+    cache_directory=None,
+    limit_times=None
+):
+    """
+    Lightweight speaker discovery. Runs only diarization on the original
+    audio (no audio splitting, no full transcription), prints the speaker
+    statistics and caches the result for the follow-up full run.
+
+    Parameters:
+    - audio_file (str): Path to the original audio file.
+    - download_sub_directory (str): Directory to store the analysis in.
+    - num_speakers, min_speakers, max_speakers (int): Speaker count hints.
+    - processing_start, processing_end (float): Time window to analyze.
+    - preview_model (str, optional): Small whisper model (like 'tiny') to
+        print a text preview for every speaker turn.
+    - cache_directory (str, optional): Directory for cached
+        diarization results.
+    - limit_times (list, optional): Time ranges to analyze.
+
+    Returns:
+    - list: The detected speakers.
+    """
+    speakers = diarize(
+        audio_file,
+        num_speakers,
+        min_speakers,
+        max_speakers,
+        cache_directory,
+        limit_times
+    )
+
+    save_analysis(
+        speakers,
+        audio_file,
+        download_sub_directory,
+        num_speakers,
+        min_speakers,
+        max_speakers,
+        limit_times
+    )
+
+    speakers = filter_speakers(speakers, processing_start, processing_end)
+    print_speakers(speakers)
+    write_speaker_timefiles(speakers, download_sub_directory)
+
+    if preview_model:
+        print_turn_previews(audio_file, speakers, preview_model)
+
+    return speakers
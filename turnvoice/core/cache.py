@@ -0,0 +1,113 @@
+import threading
+import hashlib
+import sqlite3
+import json
+
+
+class ResultCache:
+    """
+    Persistent, content addressed key-value cache in a SQLite file.
+
+    Keys are hashes over all inputs that determine a result (see key),
+    values are strings (for example serialized JSON). Safe to share
+    between threads.
+    """
+
+    def __init__(self, path: str, table: str = "results"):
+        """
+        :param path: Path of the SQLite database file.
+        :param table: Table name, lets several caches share one file.
+        """
+        self.path = path
+        self.table = table
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+
+    @staticmethod
+    def key(*parts) -> str:
+        """
+        Creates a cache key from JSON serializable parts.
+        """
+        serialized = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """
+        Returns the cached value or None.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                f"SELECT value FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return row[0]
+
+    def get_many(self, keys):
+        """
+        Returns a dictionary with the cached values of the given keys
+        (keys without a value are left out).
+        """
+        keys = list(set(keys))
+        values = {}
+
+        with self.lock:
+            # stay below the SQLite parameter limit
+            for offset in range(0, len(keys), 500):
+                chunk = keys[offset:offset + 500]
+                placeholders = ",".join("?" * len(chunk))
+                values.update(self.connection.execute(
+                    f"SELECT key, value FROM {self.table} "
+                    f"WHERE key IN ({placeholders})",
+                    chunk
+                ).fetchall())
+
+            self.hits += len(values)
+            self.misses += len(keys) - len(values)
+
+        return values
+
+    def put(self, key: str, value: str):
+        """
+        Stores a value.
+        """
+        self.put_many({key: value})
+
+    def put_many(self, items):
+        """
+        Stores all values of a key to value dictionary in one transaction.
+        """
+        with self.lock, self.connection:
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value) "
+                "VALUES (?, ?)",
+                list(items.items())
+            )
+
+    def stats(self) -> str:
+        """
+        Returns a printable summary of hits and misses.
+        """
+        requests = self.hits + self.misses
+        hit_rate = self.hits / requests if requests else 0
+        return (f"{self.hits} hits, {self.misses} misses "
+                f"({hit_rate:.0%} hit rate)")
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        with self.lock:
+            self.connection.close()
@@ -390,4 +390,40 @@ def normalize_audio(input_file: str, output_file: str) -> None:
     norm_audio_int16 = (norm_audio * np.iinfo(np.int16).max).astype(np.int16)
 
     # Save the normalized audio
-    wavfile.write(output_file, sample_rate, norm_audio_int16)
\ No newline at end of file
+    wavfile.write(output_file, sample_rate, norm_audio_int16)
+
+def mute_outside_ranges(input_file: str, ranges, output_file: str) -> str:
+    """
+    Silences everything outside the given time ranges of a WAV file.
+
+    The output keeps the original length, so timestamps detected in the
+    muted file stay valid for the original file. Voice activity detection
+    of the transcription models skips the muted parts.
+
+    Args:
+    input_file (str): Path to the input WAV file.
+    ranges (list): List of (start, end) tuples in seconds to keep.
+    output_file (str): Path where the muted WAV file will be saved.
+
+    Returns:
+    str: Path to the muted WAV file.
+    """
+    sample_rate, audio = wavfile.read(input_file)
+
+    keep = np.zeros(len(audio), dtype=bool)
+    for start, end in ranges:
+        start_sample = max(0, int(start * sample_rate))
+        end_sample = min(len(audio), int(end * sample_rate))
+        keep[start_sample:end_sample] = True
+
+    muted_audio = audio.copy()
+    muted_audio[~keep] = 0
+
+    kept_seconds = np.count_nonzero(keep) / sample_rate
+    print(f"Muting {input_file} outside of {len(ranges)} ranges, keeping "
+          f"{kept_seconds:.1f}s of {len(audio) / sample_rate:.1f}s "
+          f"in {output_file}")
+
+    wavfile.write(output_file, sample_rate, muted_audio)
+
+    return output_file
@@ -1,5 +1,9 @@
+from pyannote.core import Annotation, SlidingWindow, SlidingWindowFeature
+from pyannote.audio.utils.signal import binarize
 from pyannote.audio import Pipeline
 from collections import defaultdict
+import numpy as np
+import hashlib
 import torch
 import os
 import re
@@ -8,57 +12,414 @@ import gc
 access_token = os.getenv("HF_ACCESS_TOKEN")
 
 
-def diarize(audio_file, num_speakers=0, min_speakers=0, max_speakers=0):
+pipeline = None
+pipeline_on_gpu = False
+keep_pipeline_resident = False
+
+# hashes of already hashed audio files, keyed by (path, size, mtime)
+audio_hashes = {}
+
+
+def set_pipeline_resident(resident=True):
     """
-    Perform speaker diarization on an audio file
-    using a pre-trained model from pyannote.audio.
+    Keeps the diarization pipeline loaded between diarize calls
+    (for batch processing or server usage) or unloads it after every
+    call (default, frees the GPU memory for synthesis).
+    """
+    global keep_pipeline_resident
+    keep_pipeline_resident = resident
+
+    if not resident:
+        unload_pipeline()
+
+
+def load_pipeline(gpu=True):
+    """
+    Returns the pyannote diarization pipeline, loading it if needed.
+
+    With gpu=False the pipeline stays on the CPU, which is enough for
+    clustering cached speaker embeddings. A pipeline already on the GPU
+    stays there.
+    """
+    global pipeline, pipeline_on_gpu
+
+    if pipeline is None:
+        pipeline = Pipeline.from_pretrained(
+            "pyannote/speaker-diarization-3.1",
+            use_auth_token=access_token
+        )
+        pipeline_on_gpu = False
+
+    if gpu and not pipeline_on_gpu:
+        # Send pipeline to GPU (when available)
+        pipeline.to(torch.device("cuda"))
+        pipeline_on_gpu = True
+        print("Model moved to GPU.")
+
+    return pipeline
+
+
+def unload_pipeline():
+    """
+    Unloads the diarization pipeline and frees its memory.
+    """
+    global pipeline, pipeline_on_gpu
+
+    if pipeline is not None:
+        pipeline = None
+        pipeline_on_gpu = False
+        torch.cuda.empty_cache()
+        gc.collect()
+
+
+def audio_hash(audio_file):
+    """
+    Returns the SHA-1 hash of an audio file's content.
+    """
+    stat = os.stat(audio_file)
+    key = (os.path.abspath(audio_file), stat.st_size, stat.st_mtime)
+    if key not in audio_hashes:
+        sha1 = hashlib.sha1()
+        with open(audio_file, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha1.update(chunk)
+        audio_hashes[key] = sha1.hexdigest()
+
+    return audio_hashes[key]
+
+
+def regions_key(regions):
+    """
+    Returns a short key identifying a list of processed regions
+    (empty string when the whole file is processed).
+    """
+    if not regions:
+        return ""
+
+    regions_string = ",".join(
+        f"{start:.3f}-{end:.3f}" for start, end, _ in regions
+    )
+    return "_r" + hashlib.sha1(regions_string.encode()).hexdigest()[:10]
+
+
+def diarization_cache_file(
+    cache_directory,
+    audio_file,
+    num_speakers=0,
+    min_speakers=0,
+    max_speakers=0,
+    regions=None,
+    suffix=""
+):
+    """
+    Returns the path of the cached diarization result for an audio file,
+    keyed by the audio content, the speaker count hints and the
+    processed regions. The suffix distinguishes other diarization
+    methods (like windowed diarization).
+    """
+    return os.path.join(
+        cache_directory,
+        f"{audio_hash(audio_file)}{regions_key(regions)}_num{num_speakers}_"
+        f"min{min_speakers}_max{max_speakers}{suffix}.rttm"
+    )
+
+
+def embeddings_cache_file(cache_directory, audio_file, regions=None):
+    """
+    Returns the path of the cached segmentation and speaker embeddings
+    of an audio file, keyed by the audio content and processed regions.
+    """
+    return os.path.join(
+        cache_directory,
+        f"{audio_hash(audio_file)}{regions_key(regions)}_embeddings.npz"
+    )
+
+
+def get_regions(limit_times, duration, context=5.0):
+    """
+    Widens the time ranges by some context, merges overlapping ones
+    and lays them out one after another.
 
     Parameters:
-    - audio_file (str): Path to the audio file.
-    - num_speakers (int, optional): The number of speakers in the audio.
-        Default is 0 (unknown).
-    - min_speakers (int, optional): The minimum number of speakers
-        expected in the audio. Default is 0.
-    - max_speakers (int, optional): The maximum number of speakers
-        expected in the audio. Default is 0.
+    - limit_times (list): List of (start, end) tuples in seconds.
+    - duration (float): Duration of the audio file.
+    - context (float): Seconds of audio added before and after each range
+        (helps the segmentation model at the range borders).
 
     Returns:
-    - list: A sorted list of dictionaries with speaker information
-        ('name', 'total_time', 'segments').
+    - list: List of (start, end, offset) tuples, offset being the
+        position of the region within the concatenated audio.
     """
+    ranges = sorted(
+        (max(0, start - context), min(duration, end + context))
+        for start, end in limit_times
+    )
 
-    print(f"Running diarization on {audio_file}...")
+    merged_ranges = []
+    for start, end in ranges:
+        if end <= start:
+            continue
+        if merged_ranges and start <= merged_ranges[-1][1]:
+            start_prev, end_prev = merged_ranges[-1]
+            merged_ranges[-1] = (start_prev, max(end_prev, end))
+        else:
+            merged_ranges.append((start, end))
 
-    access_token = os.getenv("HF_ACCESS_TOKEN")
+    regions = []
+    offset = 0.0
+    for start, end in merged_ranges:
+        regions.append((start, end, offset))
+        offset += end - start
 
-    pipeline = Pipeline.from_pretrained(
-        "pyannote/speaker-diarization-3.1",
-        use_auth_token=access_token
-    )
+    return regions
 
-    # Send pipeline to GPU (when available)
-    pipeline.to(torch.device("cuda"))
-    print("Model moved to GPU.")
-
-    # Prepare diarization options
-    options = {}
-    if num_speakers > 0:
-        options['num_speakers'] = num_speakers
-    if min_speakers > 0:
-        options['min_speakers'] = min_speakers
-    if max_speakers > 0:
-        options['max_speakers'] = max_speakers
-
-    # Apply diarization
-    diarization = pipeline(audio_file, **options)
-    results = [
-        (turn.start, turn.end, speaker)
-        for turn, _, speaker in diarization.itertracks(yield_label=True)
+
+def load_regions(audio_file, regions):
+    """
+    Loads the regions of an audio file and concatenates them into
+    a pyannote in-memory file.
+    """
+    from pyannote.audio import Audio
+    from pyannote.core import Segment
+
+    audio = Audio(sample_rate=16000, mono="downmix")
+    waveforms = [
+        audio.crop(audio_file, Segment(start, end))[0]
+        for start, end, _ in regions
     ]
 
-    # Print results
+    return {
+        "uri": "audio",
+        "waveform": torch.cat(waveforms, dim=1),
+        "sample_rate": audio.sample_rate
+    }
+
+
+def map_regions_to_source(results, regions):
+    """
+    Maps diarization results on the concatenated regions back to the
+    timeline of the source audio. Turns spanning several regions
+    are split at the region borders.
+
+    Parameters:
+    - results (list): List of (start, end, speaker) tuples.
+    - regions (list): List of (start, end, offset) tuples.
+
+    Returns:
+    - list: List of (start, end, speaker) tuples in source time.
+    """
+    source_results = []
     for start, end, speaker in results:
-        print(f"Speaker {speaker} ({start:.1f} - {end:.1f})")
+        for region_start, region_end, offset in regions:
+            region_length = region_end - region_start
+            overlap_start = max(start, offset)
+            overlap_end = min(end, offset + region_length)
+            if overlap_end > overlap_start:
+                source_results.append((
+                    region_start + overlap_start - offset,
+                    region_start + overlap_end - offset,
+                    speaker
+                ))
+
+    return sorted(source_results)
+
+
+def extract_speaker_embeddings(diarization_pipeline, file):
+    """
+    First (expensive) diarization phase: local speaker segmentation of
+    overlapping chunks and one speaker embedding per chunk and local
+    speaker. Does not depend on the number of speakers.
+
+    Parameters:
+    - diarization_pipeline: Loaded pyannote speaker diarization pipeline.
+    - file (dict): pyannote file dictionary ('uri' and 'audio').
+
+    Returns:
+    - tuple: Segmentations (SlidingWindowFeature) and embeddings
+        (array of shape chunks x local speakers x dimension).
+    """
+    segmentations = diarization_pipeline.get_segmentations(file)
+
+    embeddings = diarization_pipeline.get_embeddings(
+        file,
+        binarize_segmentations(diarization_pipeline, segmentations),
+        exclude_overlap=diarization_pipeline.embedding_exclude_overlap
+    )
+
+    return segmentations, embeddings
+
+
+def binarize_segmentations(diarization_pipeline, segmentations):
+    """
+    Binarizes raw segmentation scores (powerset models already
+    deliver binary segmentations).
+    """
+    model = diarization_pipeline._segmentation.model
+    if model.specifications.powerset:
+        return segmentations
+
+    return binarize(
+        segmentations,
+        onset=diarization_pipeline.segmentation.threshold,
+        initial_state=False
+    )
+
+
+def save_speaker_embeddings(embeddings_file, segmentations, embeddings):
+    """
+    Stores segmentations and speaker embeddings as npz file.
+    """
+    window = segmentations.sliding_window
+    np.savez(
+        embeddings_file,
+        segmentations=segmentations.data,
+        window=np.array([window.start, window.duration, window.step]),
+        embeddings=embeddings
+    )
+
+
+def load_speaker_embeddings(embeddings_file):
+    """
+    Loads segmentations and speaker embeddings stored
+    by save_speaker_embeddings.
+    """
+    with np.load(embeddings_file) as data:
+        start, duration, step = data["window"]
+        segmentations = SlidingWindowFeature(
+            data["segmentations"],
+            SlidingWindow(start=start, duration=duration, step=step)
+        )
+        embeddings = data["embeddings"]
+
+    return segmentations, embeddings
+
+
+def cluster_speakers(
+    diarization_pipeline,
+    file,
+    segmentations,
+    embeddings,
+    num_speakers=0,
+    min_speakers=0,
+    max_speakers=0
+):
+    """
+    Second (cheap) diarization phase: clusters the speaker embeddings
+    into global speakers and reconstructs the speaker turns. Follows
+    pyannote's SpeakerDiarization.apply after the embedding step.
+
+    Returns:
+    - Annotation: The diarization result.
+    """
+    num_speakers, min_speakers, max_speakers = (
+        diarization_pipeline.set_num_speakers(
+            num_speakers=num_speakers or None,
+            min_speakers=min_speakers or None,
+            max_speakers=max_speakers or None
+        )
+    )
+
+    frames = diarization_pipeline._segmentation.model.receptive_field
+    binarized_segmentations = binarize_segmentations(
+        diarization_pipeline,
+        segmentations
+    )
+
+    # estimate frame-level number of instantaneous speakers
+    count = diarization_pipeline.speaker_count(
+        binarized_segmentations,
+        frames,
+        warm_up=(0.0, 0.0)
+    )
+
+    # no speaker is ever active
+    if np.nanmax(count.data) == 0.0:
+        return Annotation(uri=file["uri"])
+
+    hard_clusters, _, _ = diarization_pipeline.clustering(
+        embeddings=embeddings,
+        segmentations=binarized_segmentations,
+        num_clusters=num_speakers,
+        min_clusters=min_speakers,
+        max_clusters=max_speakers,
+        file=file,
+        frames=frames
+    )
+
+    count.data = np.minimum(count.data, max_speakers).astype(np.int8)
+
+    inactive_speakers = np.sum(binarized_segmentations.data, axis=1) == 0
+    hard_clusters[inactive_speakers] = -2
+
+    discrete_diarization = diarization_pipeline.reconstruct(
+        segmentations,
+        hard_clusters,
+        count
+    )
+
+    diarization = diarization_pipeline.to_annotation(
+        discrete_diarization,
+        min_duration_on=0.0,
+        min_duration_off=diarization_pipeline.segmentation.min_duration_off
+    )
+    diarization.uri = file["uri"]
+
+    mapping = {
+        label: expected_label
+        for label, expected_label in zip(
+            diarization.labels(),
+            diarization_pipeline.classes()
+        )
+    }
+    return diarization.rename_labels(mapping=mapping)
+
+
+def write_rttm(results, rttm_file, uri="audio"):
+    """
+    Writes diarization results as RTTM file (full precision).
+
+    Parameters:
+    - results (list): List of (start, end, speaker) tuples.
+    - rttm_file (str): Path of the RTTM file.
+    - uri (str): File identifier written into every line.
+    """
+    with open(rttm_file, "w", encoding='utf-8') as f:
+        for start, end, speaker in results:
+            f.write(f"SPEAKER {uri} 1 {start:.6f} {end - start:.6f} "
+                    f"<NA> <NA> {speaker} <NA> <NA>\n")
+
+
+def read_rttm(rttm_file):
+    """
+    Reads diarization results from an RTTM file.
+
+    Returns:
+    - list: List of (start, end, speaker) tuples.
+    """
+    results = []
+    with open(rttm_file, "r", encoding='utf-8') as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) < 8 or fields[0] != "SPEAKER":
+                continue
+            start = float(fields[3])
+            end = start + float(fields[4])
+            results.append((start, end, fields[7]))
+
+    return results
+
+
+def results_to_speakers(results):
+    """
+    Groups diarization results by speaker.
+
+    Parameters:
+    - results (list): List of (start, end, speaker) tuples.
+
+    Returns:
+    - list: A sorted list of dictionaries with speaker information
+        ('name', 'total_time', 'segments').
+    """
 
     # Create a defaultdict to temporarily store the data
     temp_speaker_data = defaultdict(lambda: {"total_time": 0, "segments": []})
@@ -85,12 +446,142 @@ def diarize(audio_file, num_speakers=0, min_speakers=0, max_speakers=0):
         reverse=True,
     )
 
+    return speakers
+
+
+def diarize(
+    audio_file,
+    num_speakers=0,
+    min_speakers=0,
+    max_speakers=0,
+    cache_directory=None,
+    limit_times=None,
+    context=5.0
+):
+    """
+    Perform speaker diarization on an audio file
+    using a pre-trained model from pyannote.audio.
+
+    Parameters:
+    - audio_file (str): Path to the audio file.
+    - num_speakers (int, optional): The number of speakers in the audio.
+        Default is 0 (unknown).
+    - min_speakers (int, optional): The minimum number of speakers
+        expected in the audio. Default is 0.
+    - max_speakers (int, optional): The maximum number of speakers
+        expected in the audio. Default is 0.
+    - cache_directory (str, optional): Directory for cached diarization
+        results. Results are keyed by the audio content and the speaker
+        count hints, a cache hit skips pyannote entirely. Segmentation and
+        speaker embeddings are cached per audio file as well, so changed
+        speaker count hints only re-run the clustering. The clustering
+        runs on the CPU without loading any audio, it still needs the
+        pipeline instance though, which is only fast to get if the
+        pipeline is kept resident (see set_pipeline_resident).
+    - limit_times (list, optional): List of (start, end) tuples. If given,
+        only these ranges (plus some context) get processed, so the cost
+        is proportional to the ranges instead of the whole file.
+    - context (float, optional): Seconds of context around each range.
+
+    Returns:
+    - list: A sorted list of dictionaries with speaker information
+        ('name', 'total_time', 'segments').
+    """
+
+    regions = None
+    if limit_times:
+        from pyannote.audio import Audio
+        duration = Audio().get_duration(audio_file)
+        regions = get_regions(limit_times, duration, context)
+        print(f"Limiting diarization to {len(regions)} regions with "
+              f"{sum(end - start for start, end, _ in regions):.1f}s "
+              f"of {duration:.1f}s audio...")
+
+    cache_file = None
+    if cache_directory:
+        if not os.path.exists(cache_directory):
+            os.makedirs(cache_directory)
+
+        cache_file = diarization_cache_file(
+            cache_directory,
+            audio_file,
+            num_speakers,
+            min_speakers,
+            max_speakers,
+            regions
+        )
+
+        if os.path.exists(cache_file):
+            print(f"Using cached diarization {cache_file} "
+                  f"for {audio_file}...")
+            return results_to_speakers(read_rttm(cache_file))
+
+    print(f"Running diarization on {audio_file}...")
+
+    # Segmentation and speaker embeddings (expensive, independent
+    # of the speaker count hints)
+    embeddings_file = None
+    if cache_directory:
+        embeddings_file = embeddings_cache_file(
+            cache_directory,
+            audio_file,
+            regions
+        )
+
+    file = {"uri": "audio", "audio": audio_file}
+    if embeddings_file and os.path.exists(embeddings_file):
+        print(f"Using cached speaker embeddings {embeddings_file}...")
+        segmentations, embeddings = load_speaker_embeddings(embeddings_file)
+
+        # clustering only, no need for the GPU
+        diarization_pipeline = load_pipeline(gpu=False)
+    else:
+        diarization_pipeline = load_pipeline()
+        if regions:
+            file = load_regions(audio_file, regions)
+
+        segmentations, embeddings = extract_speaker_embeddings(
+            diarization_pipeline,
+            file
+        )
+        if embeddings_file:
+            save_speaker_embeddings(
+                embeddings_file,
+                segmentations,
+                embeddings
+            )
+
+    # Clustering into speakers (cheap)
+    diarization = cluster_speakers(
+        diarization_pipeline,
+        file,
+        segmentations,
+        embeddings,
+        num_speakers,
+        min_speakers,
+        max_speakers
+    )
+    results = [
+        (turn.start, turn.end, speaker)
+        for turn, _, speaker in diarization.itertracks(yield_label=True)
+    ]
+
+    if regions:
+        results = map_regions_to_source(results, regions)
+
+    # Print results
+    for start, end, speaker in results:
+        print(f"Speaker {speaker} ({start:.1f} - {end:.1f})")
+
+    if cache_file:
+        write_rttm(results, cache_file)
+        print(f"Diarization cached in {cache_file}")
+
     # Clean-up resources
-    del pipeline
-    torch.cuda.empty_cache()
-    gc.collect()
+    if not keep_pipeline_resident:
+        unload_pipeline()
 
-    return speakers
+    return results_to_speakers(results)
 
 
 def print_speakers(speakers):
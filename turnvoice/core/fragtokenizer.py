@@ -16,6 +16,152 @@ start_no_break_words = [
 ]
 
 
+class FragmentTokenizer:
+    """
+    Incremental version of create_synthesizable_fragments.
+
+    Words are fed one at a time. A fragment is emitted as soon as its end
+    is certain: immediately after a break character, or once the next
+    word reveals a big gap. The remaining words are emitted on flush.
+    """
+
+    def __init__(
+            self,
+            gap_duration: float = 1.0,
+            break_characters=start_break_characters,
+            no_break_words=start_no_break_words
+            ):
+        """
+        Args:
+        gap_duration (float): The minimum duration of a gap between words
+            to consider it as a sentence break. Default is 1.0 seconds.
+        break_characters (tuple): Characters that typically indicate
+            the end of a sentence.
+        no_break_words (list of str): Abbreviations or acronyms that should
+            not be treated as sentence breaks.
+        """
+        self.gap_duration = gap_duration
+        self.break_characters = break_characters
+        self.no_break_words = no_break_words
+
+        self.current_sentence = ""  # accumulates words
+        self.sentence_start_time = 0.0  # start time of a sentence
+        self.last_word = None  # last word of the unfinished sentence
+
+    def finish_sentence(self):
+        """
+        Finalizes the current sentence and returns it as fragment.
+        """
+        sentence = {
+            "text": self.current_sentence.strip(),
+            "start": self.sentence_start_time,
+            "end": self.last_word.end
+        }
+
+        # reset the current sentence
+        self.current_sentence = ""
+        self.last_word = None
+        return sentence
+
+    def feed(self, word):
+        """
+        Adds the next word.
+
+        Args:
+        word (Word): The next Word object.
+
+        Returns:
+        list: Fragments finished by this word (zero, one or two).
+        """
+        fragments = []
+
+        # a big gap to the previous word finishes the pending sentence
+        if self.last_word is not None:
+            gap_to_next_word = word.start - self.last_word.end
+            if gap_to_next_word > self.gap_duration:
+                fragments.append(self.finish_sentence())
+
+        # if starting a new sentence, record the start time
+        if self.current_sentence == "":
+            self.sentence_start_time = word.start
+
+        # add the current word's text to the sentence
+        self.current_sentence += word.text
+        self.last_word = word
+
+        # a break character finishes the sentence if it's long enough
+        if (word.text.endswith(self.break_characters) and
+                word.text not in self.no_break_words):
+            sentence_duration = word.end - self.sentence_start_time
+
+            if sentence_duration > self.gap_duration:
+                fragments.append(self.finish_sentence())
+
+        return fragments
+
+    def flush(self):
+        """
+        Finishes the remaining words after the last word was fed.
+
+        Returns:
+        list: The last fragment (if words were left).
+        """
+        if self.last_word is None:
+            return []
+        return [self.finish_sentence()]
+
+
+def stream_synthesizable_fragments(
+        words,
+        gap_duration: float = 1.0,
+        break_characters=start_break_characters,
+        no_break_words=start_no_break_words
+        ):
+    """
+    Generator yielding synthesizable fragments from an iterable of
+    Word objects (for example transcribe.iter_words) as soon as each
+    fragment is finished.
+    """
+    tokenizer = FragmentTokenizer(
+        gap_duration,
+        break_characters,
+        no_break_words
+        )
+
+    for word in words:
+        yield from tokenizer.feed(word)
+
+    yield from tokenizer.flush()
+
+
+def tap_fragments(
+        words,
+        callback,
+        gap_duration: float = 1.0,
+        break_characters=start_break_characters,
+        no_break_words=start_no_break_words
+        ):
+    """
+    Passes an iterable of Word objects through unchanged and calls
+    callback with every synthesizable fragment as soon as it is
+    finished (lets fragments be processed while the words are still
+    being transcribed).
+    """
+    tokenizer = FragmentTokenizer(
+        gap_duration,
+        break_characters,
+        no_break_words
+        )
+
+    for word in words:
+        for fragment in tokenizer.feed(word):
+            callback(fragment)
+        yield word
+
+    for fragment in tokenizer.flush():
+        callback(fragment)
+
+
 def create_synthesizable_fragments(
         words,
         gap_duration: float = 1.0,
@@ -34,61 +180,18 @@ def create_synthesizable_fragments(
         the end of a sentence.
     no_break_words (list of str): Abbreviations or acronyms that should
         not be treated as sentence breaks.
-    min_sentence_duration (float): The minimum duration of a sentence
-        to be considered standalone. Default is 1.5 seconds.
 
     Returns:
     list: A list of dictionaries, each containing the 'text', 'start',
     and 'end' keys representing each sentence fragment.
     """
 
-    sentences = []  # holds sentence frags
-    current_sentence = ""  # accumulates words
-    sentence_start_time = 0.0  # start time of a sentence
-
-    for index, word in enumerate(words):
-
-        # if starting a new sentence, record the start time
-        if current_sentence == "":
-            sentence_start_time = word.start
-
-        # add the current word's text to the sentence
-        current_sentence += word.text
-
-        # initialize a flag for a big gap before the next word
-        big_gap_to_next_word = False
-
-        if index + 1 < len(words):
-
-            # calculate the gap to the next word
-            gap_to_next_word = words[index + 1].start - word.end
-
-            if gap_to_next_word > gap_duration:
-                big_gap_to_next_word = True
-
-        # check if the current word is the last in the list
-        is_last_word = index + 1 == len(words)
-
-        # check conditions to finalize the current sentence
-        if (big_gap_to_next_word or is_last_word or
-                word.text.endswith(break_characters) and
-                word.text not in no_break_words):
-            sentence_duration = word.end - sentence_start_time
-
-            # check if it's time to end the sentence.
-            if (is_last_word or big_gap_to_next_word or
-                    sentence_duration > gap_duration):
-
-                sentence_end_time = word.end
-                sentences.append({
-                    "text": current_sentence.strip(),
-                    "start": sentence_start_time,
-                    "end": sentence_end_time
-                })
-                # reset the current sentence
-                current_sentence = ""
-
-    return sentences
+    return list(stream_synthesizable_fragments(
+        words,
+        gap_duration,
+        break_characters,
+        no_break_words
+        ))
 
 
 def create_full_sentences(
@@ -199,6 +302,231 @@ def merge_short_sentences(sentences, gap_duration, min_sentence_duration):
     return merged_sentences
 
 
+# average speaking rate in characters per second (including spaces)
+characters_per_second = {
+    "en": 14.0, "de": 13.0, "es": 15.0, "fr": 14.0, "it": 14.5,
+    "pt": 14.5, "pl": 13.0, "tr": 13.0, "ru": 13.0, "nl": 13.5,
+    "cs": 13.0, "ar": 12.0, "hu": 13.0, "hi": 12.0, "zh": 5.0,
+    "ja": 7.0, "ko": 6.0,
+}
+default_characters_per_second = 14.0
+
+# rough length of translated text relative to english (in characters)
+translation_length = {
+    "en": 1.0, "de": 1.3, "es": 1.25, "fr": 1.2, "it": 1.2,
+    "pt": 1.2, "pl": 1.2, "tr": 1.1, "ru": 1.15, "nl": 1.25,
+    "cs": 1.1, "ar": 1.25, "hu": 1.15, "hi": 1.1, "zh": 0.35,
+    "ja": 0.6, "ko": 0.5,
+}
+
+# boundary costs by the character ending the fragment
+full_sentence_break_cost = 0.0
+break_cost = 0.3
+no_break_cost = 2.0
+
+# stretch factors synthesize_duration is able to reach
+min_stretch = 0.3
+max_stretch = 2.5
+
+
+def synthesis_characters_per_second(
+        language="en",
+        target_language=None,
+        speech_rate=1.0
+        ):
+    """
+    Characters of the transcribed text the synthesis voice speaks per
+    second, including the expected change of the text length by the
+    translation into target_language.
+    """
+    target_language = target_language or language
+    return (
+        speech_rate *
+        characters_per_second.get(
+            target_language, default_characters_per_second
+        ) *
+        translation_length.get(language, 1.0) /
+        translation_length.get(target_language, 1.0)
+    )
+
+
+def fragment_stretch_cost(text, duration, chars_per_second):
+    """
+    Expected cost of fitting the text into the duration: the squared
+    logarithm of the predicted stretch factor (0 for a perfect fit,
+    symmetric for speeding up and slowing down). Stretch factors beyond
+    the reachable range get an additional penalty.
+    """
+    import math
+
+    predicted_duration = max(len(text), 1) / chars_per_second
+    stretch = predicted_duration / max(duration, 0.05)
+
+    cost = math.log(stretch) ** 2
+    if stretch < min_stretch or stretch > max_stretch:
+        cost += 10.0
+    return cost
+
+
+def full_sentence_ends(
+        words,
+        gap_duration: float = 1.0,
+        full_sentence_characters=start_full_sentence_characters,
+        no_break_words=start_no_break_words
+        ):
+    """
+    Positions of the words ending a full sentence, following the rules
+    of FragmentTokenizer (which builds the full sentences the fragments
+    get assigned to).
+    """
+    tokenizer = FragmentTokenizer(
+        gap_duration,
+        full_sentence_characters,
+        no_break_words
+        )
+
+    ends = set()
+    for index, word in enumerate(words):
+        finished = tokenizer.feed(word)
+        if tokenizer.last_word is None:
+            # this word ended a sentence
+            ends.add(index)
+            finished = finished[:-1]
+        if finished:
+            # a big gap ended the previous sentence
+            ends.add(index - 1)
+
+    return ends
+
+
+def create_duration_aware_fragments(
+        words,
+        language="en",
+        target_language=None,
+        speech_rate=1.0,
+        gap_duration: float = 1.0,
+        max_fragment_duration: float = 10.0,
+        max_fragment_words: int = 40,
+        break_characters=start_break_characters,
+        full_sentence_characters=start_full_sentence_characters,
+        no_break_words=start_no_break_words
+        ):
+    """
+    Segments words into synthesizable fragments whose text fits the
+    time slot as well as possible.
+
+    Dynamic programming over all word boundaries picks the segmentation
+    minimizing the total predicted stretch (see fragment_stretch_cost)
+    plus a cost for each boundary that is not at a punctuation mark.
+    Gaps longer than gap_duration always break and fragments never span
+    the end of a full sentence, so every fragment belongs to exactly one
+    full sentence.
+
+    The synthesis duration is predicted from the text length, its
+    expected change by the translation and the speaking rate of the
+    target language.
+
+    Args:
+    words (list of Word): List of Word objects to analyze.
+    language (str): Language code of the words.
+    target_language (str): Language code of the synthesis (the
+        language of the words if not given).
+    speech_rate (float): Speed of the synthesis voice relative to an
+        average speaker.
+    gap_duration (float): Gaps longer than this always break.
+    max_fragment_duration (float): Maximum duration of a fragment
+        (single words can exceed it).
+    max_fragment_words (int): Maximum number of words per fragment.
+    break_characters (tuple): Characters allowing a cheap break.
+    full_sentence_characters (tuple): Characters allowing a free break.
+    no_break_words (list of str): Abbreviations or acronyms that should
+        not be treated as sentence breaks.
+
+    Returns:
+    list: A list of dictionaries, each containing the 'text', 'start',
+    and 'end' keys representing each sentence fragment.
+    """
+    words = list(words)
+    if len(words) == 0:
+        return []
+
+    chars_per_second = synthesis_characters_per_second(
+        language,
+        target_language,
+        speech_rate
+    )
+    sentence_ends = full_sentence_ends(
+        words,
+        gap_duration,
+        full_sentence_characters,
+        no_break_words
+    )
+
+    # cost of a boundary after each word
+    boundary_costs = []
+    for word in words:
+        if word.text in no_break_words:
+            boundary_costs.append(no_break_cost)
+        elif word.text.endswith(full_sentence_characters):
+            boundary_costs.append(full_sentence_break_cost)
+        elif word.text.endswith(break_characters):
+            boundary_costs.append(break_cost)
+        else:
+            boundary_costs.append(no_break_cost)
+
+    # best[i]: lowest cost of segmenting the first i words,
+    # previous[i]: start of the last fragment of that segmentation
+    best = [0.0] + [float("inf")] * len(words)
+    previous = [0] * (len(words) + 1)
+
+    for end in range(1, len(words) + 1):
+        text = ""
+        for start in range(end - 1, max(end - max_fragment_words, 0) - 1, -1):
+
+            # fragments never span a big gap or a full sentence end
+            if start < end - 1 and (
+                    words[start + 1].start - words[start].end > gap_duration
+                    or start in sentence_ends):
+                break
+
+            # neither grow beyond the maximum duration
+            duration = words[end - 1].end - words[start].start
+            if start < end - 1 and duration > max_fragment_duration:
+                break
+
+            text = words[start].text + text
+            if best[start] == float("inf"):
+                continue
+
+            cost = best[start] + fragment_stretch_cost(
+                text.strip(),
+                duration,
+                chars_per_second
+            )
+            if end < len(words):
+                gap_to_next_word = words[end].start - words[end - 1].end
+                if gap_to_next_word <= gap_duration:
+                    cost += boundary_costs[end - 1]
+
+            if cost < best[end]:
+                best[end] = cost
+                previous[end] = start
+
+    fragments = []
+    end = len(words)
+    while end > 0:
+        start = previous[end]
+        fragments.append({
+            "text": "".join(word.text for word in words[start:end]).strip(),
+            "start": words[start].start,
+            "end": words[end - 1].end
+        })
+        end = start
+
+    fragments.reverse()
+    return fragments
+
+
 def assign_fragments_to_sentences(sentence_fragments, full_sentences):
     """
     Assign each sentence fragment to its corresponding full sentence.
@@ -228,22 +556,29 @@ def assign_fragments_to_sentences(sentence_fragments, full_sentences):
     for frag in sentence_fragments:
         print(f"Fragment: {frag['text']}")
 
-    for full_sentence in full_sentences:
-
-        # List of fragments for this full sentence
-        full_sentence['sentence_frags'] = []
+    from .processing import IntervalIndex
+    fragment_index = IntervalIndex(
+        (frag['start'], frag['end'], frag_index)
+        for frag_index, frag in enumerate(sentence_fragments)
+    )
 
-        # Iterate over each sentence fragment
-        for frag in sentence_fragments:
-
-            # Check if the fragment belongs to the current full sentence
-            if (frag['start'] >= full_sentence['start'] and
-                    frag['end'] <= full_sentence['end']):
-
-                full_sentence['sentence_frags'].append(frag)
+    for full_sentence in full_sentences:
 
-                # Assign the full sentence text to the fragment
-                frag['full_sentence'] = full_sentence['text']
+        # Fragments lying within the current full sentence
+        # (in their original order)
+        frag_indices = sorted(
+            frag_index for _, _, frag_index in fragment_index.within(
+                full_sentence['start'],
+                full_sentence['end']
+            )
+        )
+        full_sentence['sentence_frags'] = [
+            sentence_fragments[frag_index] for frag_index in frag_indices
+        ]
+
+        # Assign the full sentence text to the fragments
+        for frag in full_sentence['sentence_frags']:
+            frag['full_sentence'] = full_sentence['text']
 
 
 def get_segments(segments):
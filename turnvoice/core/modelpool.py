@@ -0,0 +1,204 @@
+from collections import OrderedDict
+import threading
+import gc
+
+# rough memory footprint of whisper models in MB (float16)
+MODEL_MEMORY_MB = {
+    "tiny": 150,
+    "base": 300,
+    "small": 1000,
+    "medium": 2600,
+    "large": 5000,
+}
+
+# openai whisper based models (stable_whisper) need about twice
+# the memory of the ctranslate2 based faster_whisper models
+BACKEND_MEMORY_FACTOR = {
+    "faster_whisper": 1.0,
+    "stable_whisper": 2.0,
+}
+
+DEFAULT_MEMORY_BUDGET_MB = 12000
+
+
+def estimate_model_memory(backend: str, size: str) -> float:
+    """
+    Estimates the memory a model needs in MB.
+
+    Args:
+    backend (str): Name of the backend ('faster_whisper', 'stable_whisper').
+    size (str): Model size, for example 'large-v2' or 'tiny.en'.
+
+    Returns:
+    float: The estimated memory in MB.
+    """
+    size_base = size.split("-")[0].split(".")[0]
+    memory = MODEL_MEMORY_MB.get(size_base, MODEL_MEMORY_MB["large"])
+    return memory * BACKEND_MEMORY_FACTOR.get(backend, 1.0)
+
+
+class ModelPool:
+    """
+    Hands out shared model instances keyed by
+    (backend, size, device, compute type).
+
+    Models are reference counted. Models that are no longer referenced
+    stay loaded until the memory budget is exceeded, then the least
+    recently used ones get evicted.
+    """
+
+    def __init__(self, memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB):
+        """
+        Initializes the pool with a memory budget.
+
+        :param memory_budget_mb: Maximum memory in MB the pooled
+          models may use together.
+        """
+        self.memory_budget_mb = memory_budget_mb
+        self.loaders = {}
+        self.models = OrderedDict()
+        self.lock = threading.RLock()
+
+    def register_loader(self, backend: str, loader):
+        """
+        Registers the function used to load models of a backend.
+
+        :param backend: Name of the backend.
+        :param loader: Callable taking (size, device, compute_type)
+          and returning the loaded model.
+        """
+        self.loaders[backend] = loader
+
+    def acquire(self,
+                backend: str,
+                size: str,
+                device: str = "cuda",
+                compute_type: str = "float16"):
+        """
+        Returns a model instance, loading it if it is not in the pool yet.
+        Every acquire has to be paired with a release.
+
+        :param backend: Name of the backend.
+        :param size: Model size.
+        :param device: Device the model runs on.
+        :param compute_type: Compute type of the model.
+        :return: The model instance.
+        """
+        key = (backend, size, device, compute_type)
+
+        with self.lock:
+            if key in self.models:
+                self.models.move_to_end(key)
+            else:
+                memory = estimate_model_memory(backend, size)
+                self.make_room(memory)
+
+                print(f"Loading {backend} model {size} "
+                      f"({device}, {compute_type})...")
+                model = self.loaders[backend](size, device, compute_type)
+                self.models[key] = {
+                    "model": model,
+                    "references": 0,
+                    "memory": memory,
+                    "unload": False
+                }
+
+            entry = self.models[key]
+            entry["references"] += 1
+            entry["unload"] = False
+            return entry["model"]
+
+    def release(self,
+                backend: str,
+                size: str,
+                device: str = "cuda",
+                compute_type: str = "float16"):
+        """
+        Gives back a model acquired before. The model stays loaded
+        until it gets evicted or unloaded (a model unloaded while it was
+        in use gets evicted with its last release).
+        """
+        key = (backend, size, device, compute_type)
+
+        with self.lock:
+            entry = self.models.get(key)
+            if entry is None or entry["references"] == 0:
+                return
+
+            entry["references"] -= 1
+            if entry["references"] == 0 and entry["unload"]:
+                self.evict(key)
+
+    def memory_in_use(self) -> float:
+        """
+        Returns the estimated memory in MB of all loaded models.
+        """
+        return sum(entry["memory"] for entry in self.models.values())
+
+    def make_room(self, memory: float):
+        """
+        Evicts unreferenced models, least recently used first,
+        until a model with the given memory fits into the budget.
+        """
+        for key in list(self.models.keys()):
+            if self.memory_in_use() + memory <= self.memory_budget_mb:
+                return
+            if self.models[key]["references"] == 0:
+                self.evict(key)
+
+        if self.memory_in_use() + memory > self.memory_budget_mb:
+            print("Memory budget of model pool exceeded, all loaded "
+                  "models are in use.")
+
+    def evict(self, key):
+        """
+        Removes a model from the pool and frees its memory.
+        """
+        with self.lock:
+            entry = self.models.pop(key, None)
+            if entry is None:
+                return
+
+            backend, size, device, _ = key
+            del entry
+            gc.collect()
+            if device.startswith("cuda"):
+                import torch
+                torch.cuda.empty_cache()
+            print(f"{backend} model {size} unloaded successfully.")
+
+    def unload(self, backend: str = None, keep_sizes=()):
+        """
+        Unloads all models of a backend (or all models if no backend
+        is given), except the model sizes listed in keep_sizes.
+        Models still in use are unloaded with their last release.
+
+        :return: Number of unloaded models (including the ones still
+          in use).
+        """
+        with self.lock:
+            keys = [
+                key for key in self.models
+                if (backend is None or key[0] == backend)
+                and key[1] not in keep_sizes
+            ]
+            for key in keys:
+                if self.models[key]["references"] > 0:
+                    self.models[key]["unload"] = True
+                else:
+                    self.evict(key)
+            return len(keys)
+
+    def is_loaded(self,
+                  backend: str,
+                  size: str,
+                  device: str = "cuda",
+                  compute_type: str = "float16") -> bool:
+        """
+        Checks if a model is currently loaded in the pool.
+        """
+        return (backend, size, device, compute_type) in self.models
+
+
+# shared pool used by transcription and synthesis verification
+model_pool = ModelPool()
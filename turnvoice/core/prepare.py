@@ -25,7 +25,27 @@ def prepare_and_render(
         p_prepare: bool = False,
         p_render: str = None,
         p_use_faster_whisper: bool = False,
-        p_model: str = "large-v2"
+        p_model: str = "large-v2",
+        p_alignment: str = "refine",
+        p_quick_analysis: bool = False,
+        p_preview_model: str = None,
+        p_diarization_window: float = 0,
+        p_diarization_workers: int = 2,
+        p_speaker_index: str = None,
+        p_enroll: List[str] = None,
+        p_speech_map: bool = False,
+        p_segmentation: str = "segments",
+        p_speech_rate: float = 1.0,
+        p_prompt_workers: int = 4,
+        p_prompt_batch_tokens: int = 0,
+        p_prompt_candidates: int = 1,
+        p_translation_workers: int = 4,
+        p_translation_backend: str = "google",
+        p_translation_model: str = None,
+        p_synthesis_workers: int = 1,
+        p_synthesis_device: str = None,
+        p_skip_verification: bool = False,
+        p_keep_diarization_pipeline: bool = False
         ):
     """
     Video Processing Workflow covering downloading, audio extraction,
@@ -68,6 +88,55 @@ def prepare_and_render(
     p_render (str): Renders a prepared full script.
     p_use_faster_whisper (bool): Usage of faster_whisper for transcription.
     p_model (str): Model used for transcription.
+    p_alignment (str): Word alignment engine used after stable_whisper
+        transcription ('refine', 'ctc' or 'none').
+    p_quick_analysis (bool): Only performs speaker detection on the
+        original audio, prints the speakers and caches them for the
+        follow-up run.
+    p_preview_model (str): Small transcription model used by the quick
+        analysis to print a text preview for every speaker turn.
+    p_diarization_window (float): Window length in seconds for windowed
+        parallel diarization of long audio. 0 diarizes in one piece.
+    p_diarization_workers (int): Number of parallel diarization workers.
+    p_speaker_index (str): Speaker index file. Recognized speakers get
+        synthesized with the voice assigned to them in the index.
+    p_enroll (List[str]): Speakers to add to the speaker index in the
+        format speaker_number=name or speaker_number=name:voice.
+    p_speech_map (bool): Detects the speech regions once and limits
+        transcription and speaker detection to them.
+    p_segmentation (str): How the text is split into synthesized
+        fragments. 'segments' uses the transcription segments,
+        'duration' fits the fragments to their time slots to keep
+        time stretching low.
+    p_speech_rate (float): Speaking speed of the synthesis voices
+        relative to an average speaker, used by the 'duration'
+        segmentation to predict the synthesis duration.
+    p_prompt_workers (int): Number of concurrent requests for the
+        prompt style transformation.
+    p_prompt_batch_tokens (int): Token budget for packing several
+        sentences into one prompt request. 0 sends every sentence
+        on its own.
+    p_prompt_candidates (int): Number of parallel candidates requested
+        per sentence. The first one with correct fragment lengths is
+        taken instead of retrying sequentially.
+    p_translation_workers (int): Number of concurrent translation
+        requests.
+    p_translation_backend (str): Translation service, 'google' (online)
+        or 'marian' (local MarianMT models).
+    p_translation_model (str): Model of the 'marian' backend, a model
+        name or local model directory with {source} and {target}
+        placeholders for the language codes.
+    p_synthesis_workers (int): Number of worker processes synthesizing
+        sentences in parallel.
+    p_synthesis_device (str): Torch device of the coqui engine,
+        for example 'cpu' (synthesis verification then runs on the
+        cpu too).
+    p_skip_verification (bool): Synthesizes every sentence once without
+        verifying it with whisper (no whisper model per synthesis
+        worker).
+    p_keep_diarization_pipeline (bool): Keeps the diarization pipeline
+        loaded after this call, so following calls in the same process
+        (batch jobs) skip loading it again.
     """
     import time
     t_start = time.time()
@@ -113,8 +182,32 @@ def prepare_and_render(
           f"- render: {p_render}\n"
           f"- use faster: {p_use_faster_whisper}\n"
           f"- model: {p_model}\n"
+          f"- alignment: {p_alignment}\n"
+          f"- quick analysis: {p_quick_analysis}\n"
+          f"- preview model: {p_preview_model}\n"
+          f"- diarization window: {p_diarization_window}\n"
+          f"- diarization workers: {p_diarization_workers}\n"
+          f"- speaker index: {p_speaker_index}\n"
+          f"- enroll: {p_enroll}\n"
+          f"- speech map: {p_speech_map}\n"
+          f"- segmentation: {p_segmentation}\n"
+          f"- speech rate: {p_speech_rate}\n"
+          f"- prompt workers: {p_prompt_workers}\n"
+          f"- prompt batch tokens: {p_prompt_batch_tokens}\n"
+          f"- prompt candidates: {p_prompt_candidates}\n"
+          f"- translation workers: {p_translation_workers}\n"
+          f"- translation backend: {p_translation_backend}\n"
+          f"- translation model: {p_translation_model}\n"
+          f"- synthesis workers: {p_synthesis_workers}\n"
+          f"- synthesis device: {p_synthesis_device}\n"
+          f"- skip verification: {p_skip_verification}\n"
+          f"- keep diarization pipeline: {p_keep_diarization_pipeline}\n"
           )
 
+    if p_keep_diarization_pipeline:
+        from .diarize import set_pipeline_resident
+        set_pipeline_resident()
+
     # Download video (if no local video provided)
     # Extract audio from video
     if not p_render:
@@ -135,6 +228,10 @@ def prepare_and_render(
         from os.path import basename, join, splitext
         audio_file_name, _ = splitext(basename(audio_file))
         download_sub_directory = join(p_download_directory, audio_file_name)
+        diarization_cache_directory = join(
+            p_download_directory,
+            "diarization_cache"
+        )
         ensure_directories([download_sub_directory])
 
         # Determine processing start and end times
@@ -148,6 +245,31 @@ def prepare_and_render(
             duration
         )
 
+        # Quick speaker discovery on the original audio
+        # (no audio splitting, no full transcription)
+        if p_quick_analysis:
+            print(f"[{(time.time() - t_start):.1f}s] "
+                  "quick analysis of speakers..."
+                  )
+            from .analysis import quick_analysis
+            quick_analysis(
+                audio_file,
+                download_sub_directory,
+                p_num_speakers,
+                p_min_speakers,
+                p_max_speakers,
+                processing_start,
+                processing_end,
+                p_preview_model,
+                diarization_cache_directory,
+                limit_times
+            )
+
+            print(f"[{(time.time() - t_start):.1f}s] "
+                  "quick analysis finished."
+                  )
+            return
+
         # Split audio into vocals and accompaniment
         # if not clean audio requested
         if not p_clean_audio:
@@ -170,17 +292,34 @@ def prepare_and_render(
               f"splitting finished, vocal path is {vocal_path}..."
               )
 
-    if not p_analysis and not p_prepare:
+    if not p_analysis and not p_prepare and not p_quick_analysis:
         print(f"[{(time.time() - t_start):.1f}s] "
               "early start synthesis engine (grab vram)..."
               )
 
-        from .synthesis import Synthesis
-        synthesis = Synthesis(
-            language=p_target_language,
-            voices=p_voices,
-            engine_names=p_engines
-            )
+        if p_synthesis_workers > 1:
+            from .synthesispool import SynthesisPool, create_synthesis
+            from functools import partial
+            synthesis = SynthesisPool(
+                workers=p_synthesis_workers,
+                language=p_target_language,
+                voices=p_voices,
+                engine_names=p_engines,
+                device=p_synthesis_device,
+                synthesizer_factory=partial(
+                    create_synthesis,
+                    verify=not p_skip_verification
+                    )
+                )
+        else:
+            from .synthesis import Synthesis
+            synthesis = Synthesis(
+                language=p_target_language,
+                voices=p_voices,
+                engine_names=p_engines,
+                device=p_synthesis_device,
+                verify=not p_skip_verification
+                )
 
     # Render a prepared full script if requested
     import json
@@ -189,6 +328,11 @@ def prepare_and_render(
         with open(p_render, 'r', encoding='utf-8') as file:
             full_script = json.load(file)
 
+        # voices mapped by the speaker index during preparation
+        script_voices = full_script["metadata"].get("voices")
+        if not p_voices and script_voices and synthesis:
+            synthesis.set_voices(script_voices)
+
         from .render import render_video
         render_video(
             full_script["sentences"],
@@ -205,8 +349,73 @@ def prepare_and_render(
 
         return
 
-    # Transcribe audio to text
+    # Detect speech regions once, transcription and speaker
+    # detection skip everything else
+    speech_map = None
+    if p_speech_map:
+        print(f"[{(time.time() - t_start):.1f}s] creating speech map...")
+
+        from .vad import get_speech_map, intersect_ranges
+        speech_map = intersect_ranges(
+            limit_times,
+            get_speech_map(vocal_path, download_sub_directory)
+            )
+
+        if len(speech_map) == 0:
+            print(f"[{(time.time() - t_start):.1f}s] "
+                  "no speech detected, aborting..."
+                  )
+            if synthesis:
+                synthesis.close()
+            return
+
+    # When only a single speaker is to be turned, perform speaker detection
+    # (diarization) first and transcribe only the turns of that speaker.
+    # All other parts of the vocals get muted, so the voice activity
+    # detection of the transcription model skips them.
+    speakers = None
     transcription_audio = vocal_path
+    if len(p_speaker_number) > 0 and not p_analysis:
+        print(f"[{(time.time() - t_start):.1f}s] analyzing audio...")
+
+        from .processing import get_speakers
+        speakers = get_speakers(
+            vocal_path,
+            download_sub_directory,
+            p_num_speakers,
+            p_min_speakers,
+            p_max_speakers,
+            processing_start,
+            processing_end,
+            p_time_files,
+            diarization_cache_directory,
+            limit_times,
+            p_diarization_window,
+            p_diarization_workers,
+            speech_map,
+            audio_file
+            )
+
+        from .processing import get_speaker_time_ranges
+        speaker_ranges = get_speaker_time_ranges(p_speaker_number, speakers)
+
+        if len(speaker_ranges) == 0:
+            print(f"[{(time.time() - t_start):.1f}s] "
+                  f"speaker {p_speaker_number} not found, aborting..."
+                  )
+            if synthesis:
+                synthesis.close()
+            return
+
+        from .cut import mute_outside_ranges
+        transcription_audio = mute_outside_ranges(
+            vocal_path,
+            speaker_ranges,
+            join(download_sub_directory,
+                 f"vocals_speaker{p_speaker_number}.wav")
+            )
+
+    # Transcribe audio to text
     print(f"[{(time.time() - t_start):.1f}s] "
           f"transcribing audio {transcription_audio} with "
           "faster_whisper " if p_use_faster_whisper else "stable_whisper "
@@ -219,19 +428,67 @@ def prepare_and_render(
         transcription_audio,
         language=p_source_language,
         model=p_model,
-        use_faster=p_use_faster_whisper
+        use_faster=p_use_faster_whisper,
+        alignment=p_alignment,
+        speech_map=speech_map,
+        output_directory=download_sub_directory
         )
 
     # Determine synthesis and target language
     source_language = transcription_info.language
 
+    # Translations are remembered across jobs
+    translation_memory = None
+    translation_engine = None
+    if len(p_target_language) > 0 and source_language != p_target_language:
+        from .translate import create_translation_backend, TranslationEngine
+        from .cache import ResultCache
+        translation_memory = ResultCache(
+            join(p_download_directory, "translation_memory.sqlite")
+            )
+        translation_engine = TranslationEngine(
+            create_translation_backend(
+                p_translation_backend,
+                p_translation_model
+                ),
+            workers=p_translation_workers,
+            memory=translation_memory
+            )
+
+    # faster_whisper delivers segments lazily, so synthesizable fragments
+    # are created while transcribing and (if nothing changes their text
+    # before) translated in the background meanwhile
+    streamed_fragments = None
+    streaming_translation = None
+    fragment_callback = None
+    if p_use_faster_whisper and p_segmentation == "segments":
+        streamed_fragments = []
+        fragment_callback = streamed_fragments.append
+
+        if translation_engine and not p_prompt and not p_analysis:
+            # fragments outside the time limits get thrown away later,
+            # so only the ones the words time filter keeps are translated
+            from .processing import time_limit_filter
+            from .translate import StreamingTranslation
+            streaming_translation = StreamingTranslation(
+                translation_engine,
+                source_language,
+                p_target_language,
+                accept=time_limit_filter(limit_times, "forgiving", 0.2)
+                )
+
+            def fragment_callback(fragment):
+                streamed_fragments.append(fragment)
+                streaming_translation.add_fragment(fragment)
+
     # Extract words with precise timestamps from transcription
     from .processing import get_extracted_words
     words = get_extracted_words(
         transcribed_segments,
-        "words.txt",
+        "words.npz",
         download_sub_directory,
-        t_start
+        t_start,
+        fragment_callback=fragment_callback
         )
 
     if p_debug:
@@ -260,24 +517,64 @@ def prepare_and_render(
         print()
 
     # Perform speaker detection (diarization)
-    print(f"[{(time.time() - t_start):.1f}s] analyzing audio...")
-
-    from .diarize import diarize
-    speakers = diarize(
-        vocal_path,
-        p_num_speakers,
-        p_min_speakers,
-        p_max_speakers
+    # (if not already done before transcription and if speaker
+    # information is used at all)
+    from .processing import speaker_detection_required
+    speakers_required = speaker_detection_required(
+        p_speaker_number,
+        p_voices,
+        p_analysis,
+        p_prepare,
+        p_speaker_index
         )
 
-    from .diarize import filter_speakers
-    speakers = filter_speakers(speakers, processing_start, processing_end)
+    if speakers is None and not speakers_required:
+        print(f"[{(time.time() - t_start):.1f}s] "
+              "single voice synthesis, skipping speaker detection..."
+              )
+        speakers = []
+
+    if speakers is None:
+        print(f"[{(time.time() - t_start):.1f}s] analyzing audio...")
+
+        from .processing import get_speakers
+        speakers = get_speakers(
+            vocal_path,
+            download_sub_directory,
+            p_num_speakers,
+            p_min_speakers,
+            p_max_speakers,
+            processing_start,
+            processing_end,
+            p_time_files,
+            diarization_cache_directory,
+            limit_times,
+            p_diarization_window,
+            p_diarization_workers,
+            speech_map,
+            audio_file
+            )
+
+    # Recognize known speakers and map them to their voices
+    if p_speaker_index:
+        print(f"[{(time.time() - t_start):.1f}s] "
+              f"matching speakers against index {p_speaker_index}..."
+              )
+
+        from .speakerindex import apply_speaker_index
+        index_voices = apply_speaker_index(
+            vocal_path,
+            speakers,
+            p_speaker_index,
+            p_enroll,
+            assign_voices=not p_voices
+            )
+
+        if index_voices:
+            p_voices = index_voices
+            if synthesis:
+                synthesis.set_voices(p_voices)
 
-    from .diarize import print_speakers, speaker_files_exist
-    print_speakers(speakers)
-    if not p_time_files or not speaker_files_exist(speakers):
-        from .diarize import write_speaker_timefiles
-        write_speaker_timefiles(speakers, download_sub_directory)
     if p_analysis:
         return
 
@@ -318,9 +615,28 @@ def prepare_and_render(
           "creating synthesizable fragments..."
           )
 
-    from .fragtokenizer import get_segments
+    if p_segmentation == "duration":
+        from .fragtokenizer import create_duration_aware_fragments
+        sentence_fragments = create_duration_aware_fragments(
+            words,
+            source_language,
+            p_target_language,
+            p_speech_rate
+        )
+    elif streamed_fragments is not None:
+        # the lazy segments are consumed, fragments were built meanwhile
+        from .fragtokenizer import create_synthesizable_fragments
+        sentence_fragments = (
+            streamed_fragments or create_synthesizable_fragments(words)
+        )
+    else:
+        from .fragtokenizer import get_segments
+        sentence_fragments = get_segments(transcribed_segments)
 
-    sentence_fragments = get_segments(transcribed_segments)
+    # Apply the time and speaker filters to the fragments as well,
+    # so nothing outside gets prompted, translated or synthesized
+    from .processing import filter_fragments_by_words
+    sentence_fragments = filter_fragments_by_words(sentence_fragments, words)
 
     from .fragtokenizer import create_synthesizable_fragments
     from .fragtokenizer import start_full_sentence_characters
@@ -353,8 +669,22 @@ def prepare_and_render(
         print(f"[{(time.time() - t_start):.1f}s] "
               f"transforming sentences, applying \"{p_prompt}\"..."
               )
-        from .prompt import transform_sentences
-        transform_sentences(full_sentences, p_prompt)
+        from .prompt import transform_sentences, TransformEngine
+        from .cache import ResultCache
+        prompt_cache = ResultCache(
+            join(p_download_directory, "prompt_cache.sqlite")
+            )
+        transform_sentences(
+            full_sentences,
+            p_prompt,
+            TransformEngine(
+                workers=p_prompt_workers,
+                cache=prompt_cache,
+                batch_token_budget=p_prompt_batch_tokens,
+                candidates=p_prompt_candidates
+                )
+            )
+        prompt_cache.close()
 
     for sentence in full_sentences:
         print(f'{sentence["text"]} ({sentence["start"]:.1f}s - '
@@ -368,18 +698,39 @@ def prepare_and_render(
                   )
 
     # assign sentences to speakers based on best overlapping interval
-    from .processing import assign_sentence_to_speakers
-    assign_sentence_to_speakers(sentence_fragments, speakers)
-
+    if speakers_required:
+        from .processing import assign_sentence_to_speakers
+        assign_sentence_to_speakers(sentence_fragments, speakers)
+    else:
+        for sentence in sentence_fragments:
+            sentence["speaker_index"] = 0
+
+    # free the transcription model, but keep it loaded if
+    # synthesis verification is about to use the same model (synthesis
+    # workers verify in their own processes)
     from .transcribe import unload_model
-    unload_model(p_use_faster_whisper)
+    from .verify import VERIFICATION_MODEL, verification_device
+    keep_sizes = ()
+    if (p_use_faster_whisper and not p_prepare
+            and not p_skip_verification and p_synthesis_workers <= 1
+            and verification_device(p_synthesis_device) == (
+                "cuda", "float16")):
+        keep_sizes = (VERIFICATION_MODEL,)
+    unload_model(p_use_faster_whisper, keep_sizes)
+
+    # fragments translated during transcription are in the memory now
+    if streaming_translation:
+        streaming_translation.finish()
 
     from .translate import perform_translation
     perform_translation(
         sentence_fragments,
         source_language,
-        p_target_language
-    )
+        p_target_language,
+        translation_engine
+        )
+    if translation_memory:
+        translation_memory.close()
 
     # Determine and set synthesis language
     synthesis_language = (
@@ -422,6 +773,8 @@ def prepare_and_render(
         "prompt": p_prompt,
         "render": p_render,
         "use_faster": p_use_faster_whisper,
+        "alignment": p_alignment,
+        "segmentation": p_segmentation,
         "audio_file": audio_file,
         "accompaniment_path": accompaniment_path,
         "video_file_muted": video_file_muted,
@@ -9,16 +9,136 @@ from .diarize import (
     time_to_seconds
 )
 from .transcribe import (
-    extract_words
+    iter_words
 )
 from typing import List, Optional
 from os.path import exists, join
-from .word import Word
+from .word import Word, WordStore
+from bisect import bisect_left, bisect_right
+import heapq
+import numpy as np
 import time
 import json
 import os
 
 
+class IntervalIndex:
+    """
+    Sorted, array-backed index of (start, end, value) intervals.
+
+    Intervals are sorted by start time. Queries bisect into the start
+    times and only scan the window of intervals that can reach the
+    query (limited by the longest interval), so a query costs
+    O(log n + k) for k candidates instead of O(n).
+
+    Intervals much longer than the typical one (more than LONG_FACTOR
+    times the median length) go into a nested index of their own, so a
+    few long intervals (like one segment spanning the whole audio)
+    don't widen the scanned window of all the others. The nested index
+    is queried first, it is small and its intervals are the most
+    likely hits.
+    """
+
+    LONG_FACTOR = 4
+
+    def __init__(self, intervals):
+        """
+        :param intervals: Iterable of (start, end, value) tuples.
+        """
+        intervals = sorted(intervals, key=lambda interval: interval[0])
+        lengths = sorted(end - start for start, end, _ in intervals)
+        max_length = (
+            lengths[len(lengths) // 2] * self.LONG_FACTOR if lengths else 0
+        )
+
+        # at least half of the intervals stay on this level
+        long_intervals = [
+            interval for interval in intervals
+            if interval[1] - interval[0] > max_length
+        ]
+        self.long_index = None
+        if long_intervals:
+            self.long_index = IntervalIndex(long_intervals)
+            intervals = [
+                interval for interval in intervals
+                if interval[1] - interval[0] <= max_length
+            ]
+
+        self.starts = [start for start, _, _ in intervals]
+        self.ends = [end for _, end, _ in intervals]
+        self.values = [value for _, _, value in intervals]
+        # (small slack against rounding, candidates get checked exactly)
+        self.max_length = max(
+            (end - start for start, end, _ in intervals), default=0
+        ) + 1e-6
+
+    def __len__(self):
+        return len(self.starts) + len(self.long_index or ())
+
+    def _candidates(self, lowest_start, highest_start):
+        """
+        Positions of all intervals starting within the given bounds.
+        """
+        return range(
+            bisect_left(self.starts, lowest_start),
+            bisect_right(self.starts, highest_start)
+        )
+
+    def overlapping(self, start, end):
+        """
+        Yields (start, end, value) of all intervals sharing more than
+        a single point with the query interval.
+        """
+        if self.long_index:
+            yield from self.long_index.overlapping(start, end)
+
+        for index in self._candidates(start - self.max_length, end):
+            if self.starts[index] < end and self.ends[index] > start:
+                yield self.starts[index], self.ends[index], self.values[index]
+
+    def containing(self, point):
+        """
+        Yields (start, end, value) of all intervals containing the point
+        (bounds included).
+        """
+        if self.long_index:
+            yield from self.long_index.containing(point)
+
+        for index in self._candidates(point - self.max_length, point):
+            if self.ends[index] >= point:
+                yield self.starts[index], self.ends[index], self.values[index]
+
+    def covering(self, start, end):
+        """
+        Yields (start, end, value) of all intervals completely
+        covering the query interval (bounds included).
+        """
+        if self.long_index:
+            yield from self.long_index.covering(start, end)
+
+        for index in self._candidates(end - self.max_length, start):
+            if self.ends[index] >= end:
+                yield self.starts[index], self.ends[index], self.values[index]
+
+    def within(self, start, end):
+        """
+        Yields (start, end, value) of all intervals lying completely
+        inside the query interval (bounds included), sorted by start.
+        """
+        intervals = (
+            (self.starts[index], self.ends[index], self.values[index])
+            for index in self._candidates(start, end)
+            if self.ends[index] <= end
+        )
+        if self.long_index:
+            intervals = heapq.merge(
+                intervals,
+                self.long_index.within(start, end),
+                key=lambda interval: interval[0]
+            )
+        yield from intervals
+
+
 def calculate_interval_overlap(start1, end1, start2, end2):
     """
     Calculates the overlap duration between two time intervals.
@@ -40,37 +160,128 @@ def calculate_interval_overlap(start1, end1, start2, end2):
     return minimum_end_time - maximum_start_time
 
 
-def assign_sentence_to_speakers(sentence_fragments, speakers):
+def speaker_coverage(speakers, times):
     """
-    Assigns each sentence fragment to the most likely
-    speaker based on time overlap.
+    Computes how many seconds each speaker spoke up to the given times.
+
+    The segments of each speaker are merged and turned into cumulative
+    speech time, the coverage at a time then is a single searchsorted
+    lookup.
+
+    :param speakers: List of speakers, each with time segments.
+    :param times: Array of points in time.
+    :return: Array of shape (len(times), len(speakers)).
+    """
+    times = np.asarray(times, dtype=np.float64)
+    coverage = np.zeros((len(times), len(speakers)))
+
+    for speaker_index, speaker in enumerate(speakers):
+        merged = []
+        for segment in sorted(speaker["segments"],
+                              key=lambda segment: segment["start"]):
+            if merged and segment["start"] <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], segment["end"])
+            else:
+                merged.append([segment["start"], segment["end"]])
+
+        if not merged:
+            continue
+
+        starts, ends = np.array(merged).T
+        lengths = ends - starts
+        spoken_before = np.concatenate(([0.0], np.cumsum(lengths)[:-1]))
+
+        # last segment starting at or before each time
+        index = np.searchsorted(starts, times, side="right") - 1
+        inside = index >= 0
+        index = np.maximum(index, 0)
+
+        coverage[:, speaker_index] = np.where(
+            inside,
+            spoken_before[index] +
+            np.clip(times - starts[index], 0, lengths[index]),
+            0.0
+        )
+
+    return coverage
+
+
+def speaker_overlap_matrix(sentence_fragments, speakers):
+    """
+    Computes the overlap in seconds of every sentence with the speech
+    of every speaker.
 
     :param sentence_fragments: List of sentence fragments,
-    each with start and end times.
+      each with start and end times.
     :param speakers: List of speakers, each with time segments.
+    :return: Array of shape (len(sentence_fragments), len(speakers)).
     """
+    starts = [sentence["start"] for sentence in sentence_fragments]
+    ends = [sentence["end"] for sentence in sentence_fragments]
 
-    for sentence in sentence_fragments:
-        max_overlap = 0
-        assigned_speaker_index = 0
+    return np.maximum(
+        speaker_coverage(speakers, ends) - speaker_coverage(speakers, starts),
+        0.0
+    )
 
-        for speaker_index, speaker in enumerate(speakers):
-            for segment in speaker["segments"]:
 
-                overlap = calculate_interval_overlap(
-                    sentence["start"],
-                    sentence["end"],
-                    segment["start"],
-                    segment["end"]
-                    )
+def assign_sentence_to_speakers(sentence_fragments, speakers):
+    """
+    Assigns each sentence fragment to the most likely
+    speaker based on time overlap.
+
+    Besides the 'speaker_index' each sentence gets the share of its
+    duration covered by every speaker ('speaker_overlap') and the
+    share of the assigned speaker in the overlapping speech
+    ('speaker_confidence', low for overlapping speech).
 
-                if overlap > max_overlap:
-                    max_overlap = overlap
-                    assigned_speaker_index = speaker_index
+    :param sentence_fragments: List of sentence fragments,
+    each with start and end times.
+    :param speakers: List of speakers, each with time segments.
+    """
 
-        sentence["speaker_index"] = assigned_speaker_index
+    if len(sentence_fragments) == 0:
+        return
+
+    overlap = speaker_overlap_matrix(sentence_fragments, speakers)
+
+    durations = np.array([
+        sentence["end"] - sentence["start"]
+        for sentence in sentence_fragments
+    ])
+    shares = np.divide(
+        overlap,
+        durations[:, np.newaxis],
+        out=np.zeros_like(overlap),
+        where=durations[:, np.newaxis] > 0
+    )
+
+    # equal overlaps go to the lowest speaker index,
+    # sentences without any overlap to speaker 0
+    if len(speakers) > 0:
+        assigned = np.argmax(overlap, axis=1)
+        best_overlap = overlap[np.arange(len(overlap)), assigned]
+    else:
+        assigned = np.zeros(len(sentence_fragments), dtype=int)
+        best_overlap = np.zeros(len(sentence_fragments))
+
+    total_overlap = overlap.sum(axis=1)
+    confidence = np.divide(
+        best_overlap,
+        total_overlap,
+        out=np.zeros_like(best_overlap),
+        where=total_overlap > 0
+    )
+
+    for index, sentence in enumerate(sentence_fragments):
+        sentence["speaker_index"] = int(assigned[index])
+        sentence["speaker_overlap"] = [
+            round(float(share), 3) for share in shares[index]
+        ]
+        sentence["speaker_confidence"] = round(float(confidence[index]), 3)
         print(f"Assigning {sentence['text']} to "
-              f"speaker {assigned_speaker_index}"
+              f"speaker {sentence['speaker_index']} "
+              f"(confidence {sentence['speaker_confidence']:.2f})"
               )
 
 
@@ -115,22 +326,34 @@ def get_audio_and_muted_video(
 
 def get_extracted_words(
     transcribed_segments,
-    words_file="words.txt",
+    words_file="words.npz",
     download_sub_directory="downloads",
     processing_start_time=time.time(),
-    always_read=True
+    always_read=True,
+    fragment_callback=None
 ):
     """
     Extracts or loads words from a file, based on transcribed segments
     and specified conditions.
+
+    Words are stored in a columnar WordStore (binary npz file), files
+    not ending with .npz are read and written as JSON.
+
+    If fragment_callback is given, it gets called with every
+    synthesizable fragment as soon as the fragment is finished, while
+    lazily delivered segments (faster_whisper) are still transcribed.
     """
 
     words_file = join(download_sub_directory, words_file)
+    binary = words_file.endswith(".npz")
     if not always_read and exists(words_file):
 
         print(f"[{(time.time() - processing_start_time):.1f}s] "
               f"words already exist, loading from {words_file}..."
               )
+        if binary:
+            return WordStore.load(words_file)
+
         with open(words_file, 'r', encoding='utf-8') as f:
             words_dicts = json.load(f)
 
@@ -142,13 +365,21 @@ def get_extracted_words(
         print(f"[{(time.time() - processing_start_time):.1f}s] "
               f"extracting words...", end="", flush=True
               )
-        words = extract_words(transcribed_segments)
+        words = iter_words(transcribed_segments)
+        if fragment_callback:
+            from .fragtokenizer import tap_fragments
+            words = tap_fragments(words, fragment_callback)
+        words = WordStore.from_words(words)
+        print()
 
         print(f"[{(time.time() - processing_start_time):.1f}s] "
               f"saving words to {words_file}..."
               )
-        with open(words_file, "w", encoding='utf-8') as f:
-            json.dump([word.__dict__ for word in words], f, indent=4)
+        if binary:
+            words.save(words_file)
+        else:
+            with open(words_file, "w", encoding='utf-8') as f:
+                json.dump(words.to_dicts(), f, indent=4)
 
         print(f"[{(time.time() - processing_start_time):.1f}s] "
               "words saved successfully."
@@ -167,6 +398,40 @@ def intervals_overlap(t1start, t1end, t2start, t2end):
     return True
 
 
+def time_limit_filter(
+    limit_times,
+    time_handling_policy,
+    word_timestamp_correction,
+):
+    """
+    Returns a function taking (start, end) of a word or fragment and
+    checking it against the time limits with the given handling policy
+    (everything passes without time limits).
+    """
+
+    if not limit_times:
+        return lambda start, end: True
+
+    # forgiving and the default policy widen the time ranges
+    correction = (
+        0 if time_handling_policy in ("precise", "balanced")
+        else word_timestamp_correction
+    )
+    time_index = IntervalIndex(
+        (time_start - correction, time_end + correction, None)
+        for time_start, time_end in limit_times
+    )
+
+    # precise and the default policy need the word to lie
+    # completely inside a range, the others need any overlap
+    if time_handling_policy in ("forgiving", "balanced"):
+        query = time_index.overlapping
+    else:
+        query = time_index.covering
+
+    return lambda start, end: next(query(start, end), None) is not None
+
+
 def filter_by_time_limits(
     words,
     limit_times,
@@ -180,32 +445,16 @@ def filter_by_time_limits(
     if limit_times:
 
         print("filtering words by time file...")
-        new_words = []
 
-        for word in words:
-            for time_start, time_end in limit_times:
-                tstart = time_start
-                tend = time_end
-                tstartc = time_start - word_timestamp_correction
-                tendc = time_end + word_timestamp_correction
-
-                if time_handling_policy == "precise":
-                    if word.start >= tstart and word.end <= tend:
-                        new_words.append(word)
-                        break
-                elif time_handling_policy == "forgiving":
-                    if intervals_overlap(word.start, word.end, tstartc, tendc):
-                        new_words.append(word)
-                        break
-                elif time_handling_policy == "balanced":
-                    if intervals_overlap(word.start, word.end, tstart, tend):
-                        new_words.append(word)
-                        break
-                else:
-                    if word.start >= tstartc and word.end <= tendc:
-                        new_words.append(word)
-                        break
-        return new_words
+        in_time_limits = time_limit_filter(
+            limit_times,
+            time_handling_policy,
+            word_timestamp_correction
+        )
+        return [
+            word for word in words
+            if in_time_limits(word.start, word.end)
+        ]
     return words
 
 
@@ -227,16 +476,183 @@ def filter_by_speaker(
                 print("filtering words by speaker number "
                       f"{speaker_number}..."
                       )
+                segment_index = IntervalIndex(
+                    (segment["start"], segment["end"], None)
+                    for segment in speaker["segments"]
+                )
                 for word in words:
                     middle_word = (word.start + word.end) / 2
-                    for segment in speaker["segments"]:
-                        if segment["start"] <= middle_word <= segment["end"]:
-                            new_words.append(word)
-                            break
+                    if next(segment_index.containing(middle_word),
+                            None) is not None:
+                        new_words.append(word)
         return new_words
     return words
 
 
+def filter_fragments_by_words(sentence_fragments, words):
+    """
+    Keeps only the sentence fragments containing at least one of the
+    given words (word middle inside the fragment).
+
+    The words passed the time and speaker filters, so fragments dropped
+    here would otherwise be prompted, translated and synthesized only
+    to be thrown away.
+    """
+
+    middles = sorted((word.start + word.end) / 2 for word in words)
+
+    filtered_fragments = [
+        fragment for fragment in sentence_fragments
+        if bisect_right(middles, fragment["end"]) >
+        bisect_left(middles, fragment["start"])
+    ]
+
+    if len(filtered_fragments) < len(sentence_fragments):
+        print(f"filtered fragments by time and speaker, "
+              f"{len(filtered_fragments)} of {len(sentence_fragments)} "
+              "fragments left..."
+              )
+
+    return filtered_fragments
+
+
+def speaker_detection_required(
+    speaker_number,
+    voices,
+    analysis=False,
+    prepare=False,
+    speaker_index=None
+):
+    """
+    Checks whether speaker detection (diarization) can change the result.
+
+    Speaker information is unused for single voice synthesis without
+    speaker filter: every sentence gets synthesized with the one voice.
+    It is needed for speaker analysis, speaker filtering, speaker index
+    matching, multiple voices and prepared scripts (these can be
+    rendered with other voices later).
+    """
+
+    if analysis or prepare or speaker_index:
+        return True
+
+    if len(speaker_number) > 0:
+        return True
+
+    return voices is not None and len(voices) > 1
+
+
+def get_speakers(
+    vocal_path,
+    download_sub_directory,
+    num_speakers,
+    min_speakers,
+    max_speakers,
+    processing_start,
+    processing_end,
+    time_files=None,
+    cache_directory=None,
+    limit_times=None,
+    diarization_window=0,
+    diarization_workers=2,
+    speech_map=None,
+    source_audio_file=None
+):
+    """
+    Performs speaker detection (diarization) or takes the speakers
+    from a previous quick analysis, limits them to the processing time
+    window, prints them and writes the speaker time files.
+    Diarization results are cached in cache_directory (if given).
+    With limit_times only these time ranges get diarized. Otherwise long
+    audio is diarized in parallel windows of diarization_window seconds
+    (if set). A speech map (see vad.py) further limits the diarized
+    ranges to the speech regions. A quick analysis is only reused if it
+    was made of source_audio_file (the audio the vocals were split from).
+    """
+    from .analysis import load_analysis
+    speakers = load_analysis(
+        download_sub_directory,
+        source_audio_file or vocal_path,
+        num_speakers,
+        min_speakers,
+        max_speakers,
+        limit_times
+    )
+
+    if speakers is None and diarization_window > 0 and not limit_times:
+        from .windowdiarize import diarize_windowed
+        speakers = diarize_windowed(
+            vocal_path,
+            num_speakers,
+            min_speakers,
+            max_speakers,
+            cache_directory,
+            window_length=diarization_window,
+            workers=diarization_workers
+            )
+
+    if speakers is None:
+        from .vad import intersect_ranges
+        from .diarize import diarize
+        speakers = diarize(
+            vocal_path,
+            num_speakers,
+            min_speakers,
+            max_speakers,
+            cache_directory,
+            intersect_ranges(limit_times, speech_map)
+            )
+
+    from .diarize import filter_speakers
+    speakers = filter_speakers(speakers, processing_start, processing_end)
+
+    from .diarize import print_speakers, speaker_files_exist
+    print_speakers(speakers)
+    if not time_files or not speaker_files_exist(speakers):
+        from .diarize import write_speaker_timefiles
+        write_speaker_timefiles(speakers, download_sub_directory)
+
+    return speakers
+
+
+def get_speaker_time_ranges(
+    speaker_number,
+    speakers,
+    max_gap=1.0,
+    padding=0.2
+):
+    """
+    Returns the speaking turns of the specified speaker number as
+    a sorted list of (start, end) tuples.
+
+    Turns are widened by a small padding (word timestamps and diarization
+    boundaries don't match exactly) and merged when the gap between
+    them is smaller than max_gap.
+    """
+
+    if len(speaker_number) == 0:
+        return None
+
+    ranges = []
+    for speaker_index, speaker in enumerate(speakers, start=1):
+        if str(speaker_index) == speaker_number:
+            for segment in speaker["segments"]:
+                ranges.append((
+                    max(0, segment["start"] - padding),
+                    segment["end"] + padding
+                ))
+
+    merged_ranges = []
+    for start, end in sorted(ranges):
+        if merged_ranges and start - merged_ranges[-1][1] < max_gap:
+            start_prev, end_prev = merged_ranges[-1]
+            merged_ranges[-1] = (start_prev, max(end_prev, end))
+        else:
+            merged_ranges.append((start, end))
+
+    return merged_ranges
+
+
 def get_processing_times(
     time_files,
     download_sub_directory,
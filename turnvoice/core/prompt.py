@@ -1,15 +1,54 @@
-from pydantic import BaseModel, Field, AfterValidator
+from pydantic import (
+    BaseModel, Field, AfterValidator, ValidationInfo, ValidationError
+)
+from tenacity import Retrying, retry_if_exception_type, stop_after_attempt
+from instructor.exceptions import InstructorRetryException
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .ratelimit import TokenBucket, retry_with_backoff
 from typing_extensions import Annotated
 from openai import OpenAI
 from typing import List
 import instructor
+import openai
 import json
 
-# Patching the OpenAI client with instructor functionalities.
-client = instructor.patch(OpenAI())
+DEFAULT_MODEL = "gpt-4-1106-preview"
 
-# Global list to hold original sentence fragments.
-original_sentence_fragments = []
+# transient api errors worth another attempt
+RETRY_EXCEPTIONS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError
+)
+
+# OpenAI client patched with instructor functionalities
+# (created on first use, retries are handled by the TransformEngine)
+client = None
+
+
+def validation_retries(attempts: int) -> Retrying:
+    """
+    Retry policy for instructor requests: only invalid answers are
+    re-asked (up to attempts requests in total). Api errors like rate
+    limits are raised right away, so the TransformEngine retries them
+    with backoff and rate limiting.
+    """
+    return Retrying(
+        retry=retry_if_exception_type((ValidationError, json.JSONDecodeError)),
+        stop=stop_after_attempt(attempts)
+    )
+
+
+def get_client():
+    """
+    Returns the shared instructor patched OpenAI client.
+    """
+    global client
+
+    if client is None:
+        client = instructor.patch(OpenAI(max_retries=0))
+    return client
 
 
 class SentenceFragment(BaseModel):
@@ -20,24 +59,26 @@ class SentenceFragment(BaseModel):
     )
 
 
-def length_validator(
-    changed_fragments: List[SentenceFragment]
-) -> List[SentenceFragment]:
-    """
-    Validates that the length of the changed sentence fragments
-    is within acceptable limits compared to the original fragments.
+def fragments_length_error(original_fragments, changed_fragments):
     """
+    Checks that the length of the changed sentence fragments is within
+    acceptable limits compared to the original fragments.
 
-    global original_sentence_fragments
+    Returns:
+    - str: Description of the first problem found, None if all
+        fragments have a correct length.
+    """
 
-    if len(original_sentence_fragments) != len(changed_fragments):
-        raise ValueError("Number of sentence fragments must not change.")
+    if len(original_fragments) != len(changed_fragments):
+        return "Number of sentence fragments must not change."
 
     for index, changed_fragment in enumerate(changed_fragments):
-        original_fragment_text = original_sentence_fragments[index]
+        original_fragment_text = original_fragments[index]
         changed_fragment_text = changed_fragment.text_applied_tone
 
-        changefactor = len(changed_fragment_text) / len(original_fragment_text)
+        changefactor = (
+            len(changed_fragment_text) / max(len(original_fragment_text), 1)
+        )
 
         max_factor = 1.5
         min_factor = 0.666
@@ -49,20 +90,40 @@ def length_validator(
 
         if distance > ok_distance:
             if changefactor < min_factor:
-                return_msg = f"Fragment {index} is too short compared to the "
-                "original {original_fragment_text}. Make text "
-                f"'{changed_fragment_text}' longer."
-
-                print(return_msg)
-                raise ValueError(return_msg)
+                return (f"Fragment {index} is too short compared to the "
+                        f"original {original_fragment_text}. Make text "
+                        f"'{changed_fragment_text}' longer.")
 
             if changefactor > max_factor:
-                return_msg = f"Fragment {index} is too long compared to the "
-                f"original {original_fragment_text}. Make text "
-                f"'{changed_fragment_text}' shorter."
+                return (f"Fragment {index} is too long compared to the "
+                        f"original {original_fragment_text}. Make text "
+                        f"'{changed_fragment_text}' shorter.")
 
-                print(return_msg)
-                raise ValueError(return_msg)
+    return None
+
+
+def length_validator(
+    changed_fragments: List[SentenceFragment],
+    info: ValidationInfo
+) -> List[SentenceFragment]:
+    """
+    Validates that the length of the changed sentence fragments
+    is within acceptable limits compared to the original fragments.
+
+    The original fragments are passed per request in the validation
+    context ('original_fragments'), so requests can run concurrently.
+    """
+
+    if not info.context or "original_fragments" not in info.context:
+        return changed_fragments
+
+    error = fragments_length_error(
+        info.context["original_fragments"],
+        changed_fragments
+    )
+    if error:
+        print(error)
+        raise ValueError(error)
 
     print("All fragments have correct length.")
     return changed_fragments
@@ -75,20 +136,15 @@ class SentenceFragmentsResponse(BaseModel):
     ]
 
 
-def transform_fragments(
+def transform_messages(
     sentence_fragments: List[str],
     change_prompt: str,
     full_sentence: str
-) -> SentenceFragmentsResponse:
+):
     """
-    Transforms sentence fragments based on a given style or tone change,
-    while preserving the original length of each fragment.
+    Creates the chat messages of a style transformation request.
     """
-
-    global original_sentence_fragments
-
-    original_sentence_fragments = sentence_fragments
-    message_list = [
+    return [
         {
             "role": "system",
             "content": "Change the style or tone of the sentence fragments "
@@ -106,14 +162,468 @@ def transform_fragments(
         }
     ]
 
-    return client.chat.completions.create(
-        model="gpt-4-1106-preview",
-        max_retries=5,
-        messages=message_list,
+
+def transform_fragments(
+    sentence_fragments: List[str],
+    change_prompt: str,
+    full_sentence: str,
+    transform_client=None,
+    model: str = DEFAULT_MODEL
+) -> SentenceFragmentsResponse:
+    """
+    Transforms sentence fragments based on a given style or tone change,
+    while preserving the original length of each fragment.
+    """
+
+    return (transform_client or get_client()).chat.completions.create(
+        model=model,
+        max_retries=validation_retries(5),
+        messages=transform_messages(
+            sentence_fragments,
+            change_prompt,
+            full_sentence
+        ),
         response_model=SentenceFragmentsResponse,
+        validation_context={"original_fragments": sentence_fragments},
     )
 
 
+def generate_candidate(
+    sentence_fragments: List[str],
+    change_prompt: str,
+    full_sentence: str,
+    transform_client=None,
+    model: str = DEFAULT_MODEL
+) -> SentenceFragmentsResponse:
+    """
+    Requests a single transformation candidate without length validation
+    and retries (the caller checks the lengths locally).
+    """
+
+    return (transform_client or get_client()).chat.completions.create(
+        model=model,
+        max_retries=validation_retries(1),
+        temperature=1.0,
+        messages=transform_messages(
+            sentence_fragments,
+            change_prompt,
+            full_sentence
+        ),
+        response_model=SentenceFragmentsResponse,
+    )
+
+
+class BatchSentence(BaseModel):
+    sentence_fragments: List[SentenceFragment]
+
+
+def batch_structure_validator(
+    sentences: List[BatchSentence],
+    info: ValidationInfo
+) -> List[BatchSentence]:
+    """
+    Validates that a batch answer contains every sentence with the
+    original number of fragments (fragment lengths are checked per
+    sentence afterwards, so only failed sentences get re-requested).
+    """
+
+    if not info.context or "fragment_counts" not in info.context:
+        return sentences
+
+    fragment_counts = info.context["fragment_counts"]
+    if len(sentences) != len(fragment_counts):
+        raise ValueError(f"Expected {len(fragment_counts)} sentences, "
+                         f"got {len(sentences)}.")
+
+    for index, (sentence, count) in enumerate(
+            zip(sentences, fragment_counts)):
+        if len(sentence.sentence_fragments) != count:
+            raise ValueError(f"Sentence {index} must have {count} "
+                             "fragments.")
+
+    return sentences
+
+
+class SentenceBatchResponse(BaseModel):
+    sentences: Annotated[
+        List[BatchSentence],
+        AfterValidator(batch_structure_validator)
+    ]
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count estimation (about four characters per token).
+    """
+    return len(text) // 4 + 1
+
+
+def create_batches(requests, token_budget: int):
+    """
+    Packs consecutive requests into batches. The estimated tokens of
+    a batch (request plus expected answer) stay within the budget,
+    a single request exceeding it forms a batch of its own.
+
+    :param requests: List of (sentence_fragments, change_prompt,
+      full_sentence) tuples.
+    :param token_budget: Maximum estimated tokens per batch.
+    :return: List of request lists.
+    """
+    batches = []
+    batch_tokens = 0
+
+    for request in requests:
+        fragments, _, full_sentence = request
+
+        # the answer repeats the fragments
+        tokens = estimate_tokens(full_sentence) + \
+            2 * estimate_tokens(json.dumps(list(fragments)))
+
+        if not batches or batch_tokens + tokens > token_budget:
+            batches.append([])
+            batch_tokens = 0
+
+        batches[-1].append(request)
+        batch_tokens += tokens
+
+    return batches
+
+
+def transform_batch(
+    requests,
+    change_prompt: str,
+    transform_client=None,
+    model: str = DEFAULT_MODEL
+) -> SentenceBatchResponse:
+    """
+    Transforms several sentences with one request.
+
+    :param requests: List of (sentence_fragments, change_prompt,
+      full_sentence) tuples.
+    """
+
+    sentences = [
+        {"full_sentence": full_sentence, "fragments": list(fragments)}
+        for fragments, _, full_sentence in requests
+    ]
+
+    message_list = [
+        {
+            "role": "system",
+            "content": "Change the style or tone of the sentence fragments "
+                       "of every sentence while preserving their original "
+                       f"text length in this way: {change_prompt}. Consider "
+                       "the full sentence for context. Answer with all "
+                       "sentences in the given order.",
+        },
+        {
+            "role": "user",
+            "content": f"Sentences: \n{json.dumps(sentences)}",
+        }
+    ]
+
+    return (transform_client or get_client()).chat.completions.create(
+        model=model,
+        max_retries=validation_retries(2),
+        messages=message_list,
+        response_model=SentenceBatchResponse,
+        validation_context={
+            "fragment_counts": [len(fragments) for fragments, _, _ in requests]
+        },
+    )
+
+
+class TransformEngine:
+    """
+    Runs style transformations concurrently in a thread pool.
+
+    Requests are rate limited by a token bucket and retried with
+    exponential backoff on transient api errors (rate limits,
+    connection problems, server errors). With a ResultCache validated
+    results are stored and identical requests are served locally.
+    With a batch token budget consecutive sentences are packed into
+    batch requests, sentences failing the length validation are
+    re-requested (batched again, last attempt one by one).
+    With several candidates per sentence, parallel requests replace the
+    sequential validation retries.
+    """
+
+    def __init__(
+        self,
+        transform_client=None,
+        model: str = DEFAULT_MODEL,
+        workers: int = 4,
+        requests_per_second: float = 2.0,
+        burst: int = 4,
+        max_retries: int = 5,
+        backoff: float = 1.0,
+        cache=None,
+        batch_token_budget: int = 0,
+        batch_rounds: int = 2,
+        candidates: int = 1
+    ):
+        """
+        :param transform_client: Instructor patched OpenAI client
+          (optional, the shared client by default).
+        :param model: Model used for the transformation.
+        :param workers: Number of concurrent requests.
+        :param requests_per_second: Request rate limit (0 for no limit).
+        :param burst: Number of requests allowed at once.
+        :param max_retries: Retries on transient api errors.
+        :param backoff: Wait time in seconds before the first retry.
+        :param cache: ResultCache for validated results (optional).
+        :param batch_token_budget: Maximum estimated tokens of a batch
+          request (0 sends every sentence on its own).
+        :param batch_rounds: Number of batched attempts before failed
+          sentences are requested one by one.
+        :param candidates: Number of parallel candidate requests per
+          sentence, the first candidate with correct fragment lengths
+          is taken.
+        """
+        self.transform_client = transform_client
+        self.model = model
+        self.workers = workers
+        self.rate_limiter = TokenBucket(requests_per_second, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.cache = cache
+        self.batch_token_budget = batch_token_budget
+        self.batch_rounds = batch_rounds
+        self.candidates = candidates
+
+    def cache_key(self, sentence_fragments, change_prompt, full_sentence):
+        """
+        Cache key of a transformation request.
+        """
+        return self.cache.key(
+            "prompt",
+            change_prompt,
+            self.model,
+            full_sentence,
+            list(sentence_fragments)
+        )
+
+    def store(self, request, response):
+        """
+        Stores a validated response in the cache (if there is one).
+        """
+        if self.cache is not None:
+            self.cache.put(
+                self.cache_key(*request),
+                response.model_dump_json()
+            )
+
+    def request(self, function, *args):
+        """
+        Rate limited api request with retries on transient errors.
+        """
+        def rate_limited_request():
+            self.rate_limiter.acquire()
+            return function(*args, self.transform_client, self.model)
+
+        return retry_with_backoff(
+            rate_limited_request,
+            RETRY_EXCEPTIONS,
+            self.max_retries,
+            self.backoff
+        )
+
+    def transform_fragments(
+        self,
+        sentence_fragments: List[str],
+        change_prompt: str,
+        full_sentence: str
+    ) -> SentenceFragmentsResponse:
+        """
+        Rate limited transform_fragments with retries
+        (served from the cache if possible).
+        """
+        if self.cache is not None:
+            cached = self.cache.get(
+                self.cache_key(sentence_fragments, change_prompt,
+                               full_sentence)
+            )
+            if cached is not None:
+                return SentenceFragmentsResponse.model_validate_json(cached)
+
+        if self.candidates > 1:
+            response = self.transform_candidates(
+                list(sentence_fragments),
+                change_prompt,
+                full_sentence
+            )
+        else:
+            response = self.request(
+                transform_fragments,
+                list(sentence_fragments),
+                change_prompt,
+                full_sentence
+            )
+
+        self.store(
+            (sentence_fragments, change_prompt, full_sentence),
+            response
+        )
+        return response
+
+    def transform_candidates(
+        self,
+        sentence_fragments: List[str],
+        change_prompt: str,
+        full_sentence: str
+    ) -> SentenceFragmentsResponse:
+        """
+        Requests several candidates in parallel and returns the first one
+        with correct fragment lengths. Only if none fits, the sentence is
+        requested again with validation feedback.
+        """
+        executor = ThreadPoolExecutor(max_workers=self.candidates)
+        futures = [
+            executor.submit(
+                self.request,
+                generate_candidate,
+                sentence_fragments,
+                change_prompt,
+                full_sentence
+            )
+            for _ in range(self.candidates)
+        ]
+
+        try:
+            for future in as_completed(futures):
+                try:
+                    candidate = future.result()
+                except Exception as e:
+                    print(f"Candidate request failed: {e}")
+                    continue
+
+                error = fragments_length_error(
+                    sentence_fragments,
+                    candidate.sentence_fragments
+                )
+                if error is None:
+                    return candidate
+                print(error)
+        finally:
+            # don't wait for the remaining candidates
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        print("No candidate has correct fragment lengths, "
+              "retrying with validation feedback...")
+        return self.request(
+            transform_fragments,
+            sentence_fragments,
+            change_prompt,
+            full_sentence
+        )
+
+    def transform_batches(self, requests, results):
+        """
+        Transforms the requests in batches, stores the validated
+        responses in results.
+
+        :return: The requests that failed in every batched attempt.
+        """
+        pending = requests
+
+        for batch_round in range(self.batch_rounds):
+            if not pending:
+                break
+
+            batches = create_batches(pending, self.batch_token_budget)
+            print(f"Transforming {len(pending)} sentences in "
+                  f"{len(batches)} batch requests...")
+
+            def run(batch):
+                try:
+                    return self.request(transform_batch, batch, batch[0][1])
+                except Exception as e:
+                    return e
+
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                batch_responses = list(executor.map(run, batches))
+
+            pending = []
+            for batch, batch_response in zip(batches, batch_responses):
+                if isinstance(batch_response, Exception):
+                    print(f"Batch request failed: {batch_response}")
+                    pending.extend(batch)
+                    continue
+
+                for request, sentence in zip(batch,
+                                             batch_response.sentences):
+                    error = fragments_length_error(
+                        request[0],
+                        sentence.sentence_fragments
+                    )
+                    if error:
+                        print(error)
+                        pending.append(request)
+                        continue
+
+                    response = SentenceFragmentsResponse(
+                        sentence_fragments=sentence.sentence_fragments
+                    )
+                    results[request] = response
+                    self.store(request, response)
+
+        return pending
+
+    def transform_all(self, requests):
+        """
+        Transforms many sentences concurrently.
+
+        :param requests: List of (sentence_fragments, change_prompt,
+          full_sentence) tuples.
+        :return: List with a SentenceFragmentsResponse or the raised
+          exception for each request (in request order).
+        """
+        def run(request):
+            try:
+                return self.transform_fragments(*request)
+            except Exception as e:
+                return e
+
+        # identical requests (repeated sentences) are sent only once
+        unique_requests = list(dict.fromkeys(
+            (tuple(fragments), change_prompt, full_sentence)
+            for fragments, change_prompt, full_sentence in requests
+        ))
+
+        results = {}
+        pending = unique_requests
+
+        if self.batch_token_budget > 0:
+            if self.cache is not None:
+                cached = self.cache.get_many(
+                    self.cache_key(*request) for request in pending
+                )
+                for request in pending:
+                    value = cached.get(self.cache_key(*request))
+                    if value is not None:
+                        results[request] = \
+                            SentenceFragmentsResponse.model_validate_json(
+                                value
+                            )
+                pending = [
+                    request for request in pending
+                    if request not in results
+                ]
+
+            pending = self.transform_batches(pending, results)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results.update(zip(pending, executor.map(run, pending)))
+
+        if self.cache is not None:
+            print(f"Prompt cache: {self.cache.stats()}")
+
+        return [
+            results[(tuple(fragments), change_prompt, full_sentence)]
+            for fragments, change_prompt, full_sentence in requests
+        ]
+
+
 def frags_to_list(sentence_fragments) -> List[str]:
     """
     Converts a list of sentence fragment dictionaries to a list of strings.
@@ -121,40 +631,53 @@ def frags_to_list(sentence_fragments) -> List[str]:
     return [fragment["text"] for fragment in sentence_fragments]
 
 
-def transform_sentences(sentences, change_prompt: str):
+def transform_sentences(sentences, change_prompt: str, engine=None):
     """
     Transforms a list of sentences based on a specified style or tone change,
     modifying each fragment while keeping their lengths consistent.
+
+    Sentences are sent concurrently through the TransformEngine.
     """
 
     print(f"Starting to transform {len(sentences)} sentences.")
     print(f"Change prompt: {change_prompt}")
 
-    for sentence_index, sentence in enumerate(sentences):
-        frags_list = frags_to_list(sentence["sentence_frags"])
-
-        try:
-            frags = transform_fragments(
-                frags_list,
-                change_prompt,
-                sentence["text"]
-            )
-
-            for index, fragment in enumerate(frags.sentence_fragments):
-
-                print(f"Transformed fragment {index} from "
-                      f'{sentence["sentence_frags"][index]["text"]}'
-                      f'to {fragment.text_applied_tone}'
-                      )
+    engine = engine or TransformEngine()
+    sentences = [
+        sentence for sentence in sentences if sentence["sentence_frags"]
+    ]
+    results = engine.transform_all([
+        (frags_to_list(sentence["sentence_frags"]),
+         change_prompt,
+         sentence["text"])
+        for sentence in sentences
+    ])
 
-                new_text = fragment.text_applied_tone
-                sentence["sentence_frags"][index]["text"] = new_text
+    for sentence_index, (sentence, frags) in enumerate(
+            zip(sentences, results)):
 
-        except ValueError as e:
+        if isinstance(frags, (ValueError, InstructorRetryException)):
             print(f'Error while transforming sentence {sentence_index} '
-                  f'with text {sentence["text"]}: {e}'
+                  f'with text {sentence["text"]}: {frags}'
                   )
             print("Probably not possible to apply style change without"
                   "changing the length of the sentence fragment.")
             print("Sentence frags keep unchanged.")
             continue
+
+        if isinstance(frags, Exception):
+            print(f'Error while transforming sentence {sentence_index} '
+                  f'with text {sentence["text"]}: {frags}'
+                  )
+            print("Sentence frags keep unchanged.")
+            continue
+
+        for index, fragment in enumerate(frags.sentence_fragments):
+
+            print(f"Transformed fragment {index} from "
+                  f'{sentence["sentence_frags"][index]["text"]}'
+                  f'to {fragment.text_applied_tone}'
+                  )
+
+            new_text = fragment.text_applied_tone
+            sentence["sentence_frags"][index]["text"] = new_text
@@ -0,0 +1,78 @@
+import threading
+import random
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+
+    Holds up to capacity tokens and refills them at a constant rate.
+    Every request takes one token and waits while the bucket is empty.
+    """
+
+    def __init__(self, rate: float, capacity: int = 1):
+        """
+        :param rate: Tokens added per second (0 disables the limit).
+        :param capacity: Maximum number of tokens (allowed burst size).
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        """
+        Takes tokens from the bucket, waits until enough are available.
+        """
+        if self.rate <= 0:
+            return
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.last_refill) * self.rate
+                )
+                self.last_refill = now
+
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+
+                wait_time = (tokens - self.tokens) / self.rate
+
+            time.sleep(wait_time)
+
+
+def retry_with_backoff(
+    function,
+    retry_exceptions,
+    max_retries: int = 5,
+    backoff: float = 1.0,
+    max_backoff: float = 60.0
+):
+    """
+    Calls function and retries it on the given exceptions with
+    exponentially growing, jittered waits in between.
+
+    :param function: Callable without arguments.
+    :param retry_exceptions: Exception type or tuple of types to retry on.
+    :param max_retries: Number of retries before the exception is raised.
+    :param backoff: Wait time in seconds before the first retry.
+    :param max_backoff: Upper limit for a single wait.
+    :return: The return value of function.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return function()
+        except retry_exceptions as e:
+            if attempt == max_retries:
+                raise
+
+            wait_time = min(backoff * 2 ** attempt, max_backoff)
+            wait_time *= random.uniform(0.5, 1.0)
+            print(f"Request failed ({e}), retrying in {wait_time:.1f}s...")
+            time.sleep(wait_time)
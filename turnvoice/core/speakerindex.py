@@ -0,0 +1,317 @@
+from os.path import exists
+import numpy as np
+import os
+
+access_token = os.getenv("HF_ACCESS_TOKEN")
+
+# speaker embedding model used by pyannote/speaker-diarization-3.1
+EMBEDDING_MODEL = "pyannote/wespeaker-voxceleb-resnet34-LM"
+
+# minimum cosine similarity to recognize a known speaker
+MATCH_THRESHOLD = 0.5
+
+
+class SpeakerIndex:
+    """
+    Persistent index of known speakers (identities) with their speaker
+    embeddings and assigned voices. An identity can hold several
+    embeddings (for example one per enrolled episode).
+    """
+
+    def __init__(self, index_file: str = "speaker_index.npz"):
+        """
+        Loads the index from index_file if it exists.
+
+        :param index_file: Path of the npz file holding the index
+          (np.savez appends .npz if missing).
+        """
+        if not index_file.endswith(".npz"):
+            index_file += ".npz"
+        self.index_file = index_file
+        self.names = np.array([], dtype=str)
+        self.voices = {}
+        self.embeddings = None
+
+        if exists(index_file):
+            with np.load(index_file) as data:
+                self.names = data["names"]
+                self.embeddings = data["embeddings"]
+                self.voices = {
+                    str(name): str(voice) for name, voice
+                    in zip(data["voice_names"], data["voice_files"])
+                }
+            print(f"Loaded speaker index {index_file} with "
+                  f"{len(set(self.names))} speakers.")
+
+    def add(self, name: str, embedding, voice: str = None):
+        """
+        Adds an embedding for a speaker identity.
+
+        :param name: Name of the speaker.
+        :param embedding: Speaker embedding vector.
+        :param voice: Voice to synthesize this speaker with (optional,
+          keeps the previously assigned voice if not given).
+        """
+        embedding = normalize(np.asarray(embedding, dtype=np.float32))
+
+        if self.embeddings is None:
+            self.embeddings = embedding[np.newaxis, :]
+        else:
+            self.embeddings = np.vstack([self.embeddings, embedding])
+        self.names = np.append(self.names, name)
+
+        if voice:
+            self.voices[name] = voice
+
+    def save(self):
+        """
+        Writes the index to disk.
+        """
+        np.savez(
+            self.index_file,
+            names=self.names,
+            embeddings=self.embeddings,
+            voice_names=np.array(list(self.voices.keys()), dtype=str),
+            voice_files=np.array(list(self.voices.values()), dtype=str)
+        )
+        print(f"Speaker index saved to {self.index_file}")
+
+    def match(self, embeddings, threshold: float = MATCH_THRESHOLD):
+        """
+        Finds the known identity for each of the given embeddings.
+
+        Similarities of all query embeddings against all stored
+        embeddings are computed in one matrix product. Every identity
+        is assigned at most once, best matches first.
+
+        :param embeddings: Array of shape (speakers, dimension).
+        :param threshold: Minimum cosine similarity for a match.
+        :return: List of (name, similarity) tuples, name is None
+          for unknown speakers.
+        """
+        matches = [(None, 0.0)] * len(embeddings)
+        if self.embeddings is None or len(embeddings) == 0:
+            return matches
+
+        queries = normalize(np.asarray(embeddings, dtype=np.float32))
+        similarity = queries @ self.embeddings.T
+
+        # best similarity per query and identity
+        identities, identity_indices = np.unique(
+            self.names, return_inverse=True
+        )
+        identity_similarity = np.full(
+            (len(queries), len(identities)), -np.inf
+        )
+        for identity_index in range(len(identities)):
+            identity_similarity[:, identity_index] = similarity[
+                :, identity_indices == identity_index
+            ].max(axis=1)
+
+        identity_similarity = np.nan_to_num(identity_similarity, nan=-np.inf)
+        taken = set()
+        for flat_index in np.argsort(-identity_similarity, axis=None):
+            query_index, identity_index = np.unravel_index(
+                flat_index, identity_similarity.shape
+            )
+            value = identity_similarity[query_index, identity_index]
+            if value < threshold:
+                break
+            if matches[query_index][0] is not None or identity_index in taken:
+                continue
+            matches[query_index] = (str(identities[identity_index]),
+                                    float(value))
+            taken.add(identity_index)
+
+        return matches
+
+
+def normalize(vectors):
+    """
+    Scales vectors (or the rows of a matrix) to unit length.
+    """
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+def compute_speaker_embeddings(audio_file, speakers, max_duration=60.0):
+    """
+    Computes one embedding per speaker from its longest turns.
+
+    Parameters:
+    - audio_file (str): Path to the audio file.
+    - speakers (list): Speakers as returned by diarize.
+    - max_duration (float): Seconds of speech used per speaker.
+
+    Returns:
+    - numpy.ndarray: Array of shape (speakers, dimension), rows of
+        speakers without usable turns are NaN.
+    """
+    from pyannote.audio import Inference, Model
+    from pyannote.core import Segment
+
+    model = Model.from_pretrained(EMBEDDING_MODEL, use_auth_token=access_token)
+    inference = Inference(model, window="whole")
+
+    embeddings = []
+    for speaker in speakers:
+        segments = sorted(
+            speaker["segments"],
+            key=lambda segment: segment["end"] - segment["start"],
+            reverse=True
+        )
+
+        speaker_embeddings = []
+        weights = []
+        used_duration = 0.0
+        for segment in segments:
+            duration = segment["end"] - segment["start"]
+            if duration < 0.5 or used_duration >= max_duration:
+                break
+            embedding = inference.crop(
+                audio_file,
+                Segment(segment["start"], segment["end"])
+            )
+            speaker_embeddings.append(np.asarray(embedding).reshape(-1))
+            weights.append(duration)
+            used_duration += duration
+
+        if speaker_embeddings:
+            embeddings.append(
+                np.average(speaker_embeddings, axis=0, weights=weights)
+            )
+        else:
+            embeddings.append(None)
+
+    dimension = next(
+        (len(embedding) for embedding in embeddings
+         if embedding is not None), 1
+    )
+    return np.stack([
+        embedding if embedding is not None
+        else np.full(dimension, np.nan)
+        for embedding in embeddings
+    ])
+
+
+def parse_enrollment(enrollment):
+    """
+    Parses an enrollment entry 'speaker_number=name' or
+    'speaker_number=name:voice'.
+
+    Returns:
+    - tuple: Speaker number (starting at 1), name and voice (None if
+        not given).
+
+    Raises:
+    - ValueError: If the entry does not follow the format.
+    """
+    speaker_number, separator, identity = enrollment.partition("=")
+    name, _, voice = identity.partition(":")
+
+    if (not separator or not speaker_number.strip().isdigit() or
+            int(speaker_number) < 1 or not name.strip()):
+        raise ValueError(
+            f"Invalid enrollment '{enrollment}', expected "
+            "speaker_number=name or speaker_number=name:voice "
+            "(for example 1=alice:alice.wav)"
+        )
+
+    return int(speaker_number), name.strip(), voice.strip() or None
+
+
+def enroll_speakers(index, embeddings, enrollments):
+    """
+    Adds diarized speakers to the index.
+
+    Parameters:
+    - index (SpeakerIndex): The speaker index.
+    - embeddings (numpy.ndarray): Speaker embeddings (speaker order).
+    - enrollments (list of str): Entries in the format
+        'speaker_number=name' or 'speaker_number=name:voice'.
+    """
+    for enrollment in enrollments:
+        try:
+            speaker_number, name, voice = parse_enrollment(enrollment)
+        except ValueError as e:
+            print(e)
+            continue
+        speaker_index = speaker_number - 1
+
+        if speaker_index >= len(embeddings) or \
+                not np.all(np.isfinite(embeddings[speaker_index])):
+            print(f"Can't enroll speaker {speaker_number} as {name}, "
+                  "no speaker embedding available.")
+            continue
+
+        print(f"Enrolling speaker {speaker_number} as {name}"
+              f"{f' with voice {voice}' if voice else ''}")
+        index.add(name, embeddings[speaker_index], voice)
+
+
+def map_voices(index, embeddings, threshold=MATCH_THRESHOLD):
+    """
+    Maps diarized speakers to the voices of their known identities.
+
+    Returns:
+    - list: One voice per speaker (speaker order), None for speakers
+        that are unknown or have no voice assigned.
+    """
+    voices = []
+    for speaker_number, (name, similarity) in enumerate(
+            index.match(embeddings, threshold), start=1):
+        voice = index.voices.get(name) if name else None
+        if name:
+            print(f"Speaker {speaker_number} recognized as {name} "
+                  f"(similarity {similarity:.2f}), voice: {voice}")
+        else:
+            print(f"Speaker {speaker_number} is unknown.")
+        voices.append(voice)
+
+    return voices
+
+
+def apply_speaker_index(
+    audio_file,
+    speakers,
+    index_file,
+    enrollments=None,
+    assign_voices=True,
+    threshold=MATCH_THRESHOLD
+):
+    """
+    Enrolls diarized speakers into the speaker index and maps the
+    speakers to the voices of their recognized identities.
+
+    Parameters:
+    - audio_file (str): Path to the diarized audio file.
+    - speakers (list): Speakers as returned by diarize.
+    - index_file (str): Path of the speaker index file.
+    - enrollments (list of str, optional): Speakers to enroll
+        ('speaker_number=name' or 'speaker_number=name:voice').
+    - assign_voices (bool): Whether to map the speakers to voices.
+    - threshold (float): Minimum cosine similarity for a match.
+
+    Returns:
+    - list: One voice per speaker (None for unknown speakers) or None
+        if no voices were assigned.
+    """
+    if len(speakers) == 0:
+        return None
+
+    index = SpeakerIndex(index_file)
+    embeddings = compute_speaker_embeddings(audio_file, speakers)
+
+    if enrollments:
+        enroll_speakers(index, embeddings, enrollments)
+        index.save()
+
+    if not assign_voices:
+        return None
+
+    voices = map_voices(index, embeddings, threshold)
+    if not any(voices):
+        print("No known speaker with an assigned voice found.")
+        return None
+
+    return voices
@@ -21,7 +21,9 @@ class Synthesis:
     def __init__(self,
                  language="en",
                  voices=None,
-                 engine_names=["coqui"]
+                 engine_names=["coqui"],
+                 device=None,
+                 verify=True
                  ):
         """
         Initializes the Synthesis class with language, voices, and TTS engines.
@@ -29,6 +31,11 @@ class Synthesis:
         :param language: Language code, defaults to 'en'.
         :param voices: List of voices, defaults to ['male.wav'].
         :param engine_names: List of engine names, defaults to ['coqui'].
+        :param device: Torch device for the coqui engine (for example
+          'cpu'), defaults to the engine's choice. Synthesis
+          verification runs on the cpu too if it is 'cpu'.
+        :param verify: Verifies every synthesis with whisper and retries
+          failed ones, otherwise every sentence is synthesized once.
         """
 
         self.language = "zh-cn" if language == "zh" else language
@@ -38,12 +45,26 @@ class Synthesis:
         self.current_voice = 0
         self.engines = {}
         self.engine_names = engine_names
+        self.device = device
+        self.verify = verify
         self.engine = self.set_engine_by_index(0)
-        if self.voices:
+        if self.voices[self.current_voice]:
             self.engine.set_voice(self.voices[self.current_voice])
 
         self.stream = TextToAudioStream(self.engine)
 
+    def set_voices(self, voices):
+        """
+        Replaces the voices (for example after the speakers got mapped
+        to voices). Speakers with voice None are not synthesized.
+
+        :param voices: List of voices, one per speaker.
+        """
+        self.voices = voices
+        self.current_voice = 0
+        if self.voices[self.current_voice]:
+            self.engine.set_voice(self.voices[self.current_voice])
+
     def create_engine(self, engine_name):
         """
         Creates a TTS engine based on the specified name.
@@ -67,6 +88,8 @@ class Synthesis:
                 )
         if engine_name == "coqui":
             print(f"Language: {self.language}")
+            if self.device:
+                return CoquiEngine(language=self.language, device=self.device)
             return CoquiEngine(language=self.language)
         if engine_name == "openai":
             return OpenAIEngine()
@@ -93,7 +116,7 @@ class Synthesis:
         :param engine_index: Index of the engine in the engine list.
         """
 
-        if engine_index >= len(self.engines):
+        if engine_index >= len(self.engine_names):
             print(f"No engine specified for voice {engine_index + 1}. "
                   f"Using first/default engine {self.engine_names[0]}")
             engine_index = 0
@@ -128,10 +151,16 @@ class Synthesis:
         :param speaker_index: Index of the speaker voice to use.
         """
 
-        if speaker_index != self.current_engine_index:
-            self.set_engine_by_index(speaker_index)
+        engine_switched = False
+        engine_index = (
+            speaker_index if speaker_index < len(self.engine_names) else 0
+        )
+        if engine_index != self.current_engine_index:
+            self.engine = self.set_engine_by_index(engine_index)
+            self.stream.load_engine(self.engine)
+            engine_switched = True
 
-        if speaker_index != self.current_voice:
+        if speaker_index != self.current_voice or engine_switched:
             print(f"Switching speaker to {speaker_index} with "
                   f"voice {self.voices[speaker_index]}"
                   )
@@ -173,6 +202,12 @@ class Synthesis:
         if os.path.exists(filename):
             os.remove(filename)
 
+        if not self.verify:
+            synthesis_attempt = f"{filename}_synthesis_0.wav"
+            self.synthesize(text, synthesis_attempt, speed, speaker_index)
+            strip_silence(synthesis_attempt, filename)
+            return filename
+
         best_attempt = None
         best_average_distance = -1
         attempts_data = []
@@ -196,7 +231,8 @@ class Synthesis:
                     filename_trimmed, text,
                     levenshtein_threshold=max_levenshtein_distance,
                     jaro_winkler_threshold=max_jaro_winkler_distance,
-                    last_word_threshold=max_last_word_distance)
+                    last_word_threshold=max_last_word_distance,
+                    device=self.device)
 
                 # store all attempts for later
                 print(f"Synthesis attempt {attempt + 1}: "
@@ -409,7 +445,8 @@ class Synthesis:
 
             sentence["speaker_index"] = int(sentence["speaker_index"])
 
-            if sentence["speaker_index"] >= number_of_voices:
+            if (sentence["speaker_index"] >= number_of_voices or
+                    not self.voices[sentence["speaker_index"]]):
                 print(f"Skipping synthesis for sentence {index}, "
                       f"no voice for speaker {sentence['speaker_index']} "
                       "defined"
@@ -452,4 +489,5 @@ class Synthesis:
               )
 
     def close(self):
-        self.engine.shutdown()
+        for engine in self.engines.values():
+            engine.shutdown()
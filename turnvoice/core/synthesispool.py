@@ -0,0 +1,223 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+import time
+import os
+
+# synthesizer of the current worker process
+worker_synthesizer = None
+
+
+def create_synthesis(language, voices, engine_names, device, verify=True):
+    """
+    Creates the Synthesis instance of a worker process.
+
+    Every worker verifies with its own whisper model, bind verify=False
+    (functools.partial) to synthesize without verification.
+    """
+    from .synthesis import Synthesis
+
+    synthesis = Synthesis(
+        language=language,
+        voices=voices,
+        engine_names=engine_names,
+        device=device,
+        verify=verify
+    )
+    synthesis.set_language(language)
+    return synthesis
+
+
+def initialize_worker(synthesizer_factory, language, voices,
+                      engine_names, device):
+    """
+    Creates the engines once per worker process.
+    """
+    global worker_synthesizer
+    worker_synthesizer = synthesizer_factory(
+        language,
+        voices,
+        engine_names,
+        device
+    )
+
+
+def synthesize_in_worker(index, text, filename, duration, speaker_index):
+    """
+    Synthesizes one sentence in a worker process.
+
+    Returns:
+    tuple: Sentence index and whether the audio file was created.
+    """
+    worker_synthesizer.synthesize_duration(
+        text=text,
+        base_filename=filename,
+        desired_duration=duration,
+        speaker_index=speaker_index
+    )
+    return index, os.path.exists(filename)
+
+
+class SynthesisPool:
+    """
+    Synthesizes sentences in parallel on several worker processes,
+    each with its own engine instances.
+
+    Offers the interface of Synthesis used by the renderer, so it can
+    replace it. Sentences are dispatched longest first (so a long sentence
+    doesn't end up alone on one worker at the end), the results are
+    collected in the original sentence order.
+    """
+
+    def __init__(self,
+                 workers=2,
+                 language="en",
+                 voices=None,
+                 engine_names=["coqui"],
+                 device=None,
+                 synthesizer_factory=create_synthesis
+                 ):
+        """
+        :param workers: Number of worker processes.
+        :param language: Language code, defaults to 'en'.
+        :param voices: List of voices, one per speaker.
+        :param engine_names: List of engine names, one per speaker
+          (speakers without an engine use the first one).
+        :param device: Torch device for the coqui engine, for example
+          'cpu' to run many workers on a many-core machine.
+        :param synthesizer_factory: Picklable callable taking (language,
+          voices, engine_names, device) and returning an object with
+          Synthesis' synthesize_duration method.
+        """
+        self.workers = workers
+        self.language = language
+        self.voices = voices or ["male.wav"]
+        self.engine_names = engine_names
+        self.device = device
+        self.synthesizer_factory = synthesizer_factory
+        self.executor = None
+
+    def start(self):
+        """
+        Starts the worker processes (they load their engines right away).
+        """
+        if self.executor:
+            return
+
+        # spawn, forked processes can't reinitialize cuda
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=initialize_worker,
+            initargs=(
+                self.synthesizer_factory,
+                self.language,
+                self.voices,
+                self.engine_names,
+                self.device
+            )
+        )
+
+    def set_voices(self, voices):
+        """
+        Replaces the voices. Speakers with voice None are not synthesized.
+        """
+        if voices != self.voices:
+            self.close()
+        self.voices = voices
+
+    def set_language(self, language):
+        """
+        Sets the language for synthesis.
+        """
+        if language != self.language:
+            self.close()
+        self.language = language
+
+    def synthesize_sentences(self, sentences, synthesis_dir, start_time):
+        """
+        Synthesizes audio for each sentence fragment.
+
+        Successful syntheses end up as sentence0.wav, sentence1.wav, ...
+        in sentence order, like with Synthesis.synthesize_sentences.
+
+        Parameters:
+        sentences (list): List of sentence fragments with timing information.
+        synthesis_dir (str): Directory to save synthesized audio files.
+        start_time (float): Time when the synthesis started.
+        """
+        def sentence_filename(name):
+            if synthesis_dir:
+                return os.path.join(synthesis_dir, name)
+            return name
+
+        number_of_voices = len(self.voices)
+        tasks = []
+
+        for index, sentence in enumerate(sentences):
+            sentence["synthesis_result"] = False
+
+            if "speaker_index" not in sentence or number_of_voices == 1:
+                sentence["speaker_index"] = 0
+            sentence["speaker_index"] = int(sentence["speaker_index"])
+
+            if (sentence["speaker_index"] >= number_of_voices or
+                    not self.voices[sentence["speaker_index"]]):
+                print(f"Skipping synthesis for sentence {index}, "
+                      f"no voice for speaker {sentence['speaker_index']} "
+                      "defined"
+                      )
+                continue
+
+            tasks.append((
+                index,
+                sentence["text"],
+                sentence_filename(f"pool_sentence{index}.wav"),
+                sentence["end"] - sentence["start"],
+                sentence["speaker_index"]
+            ))
+
+        # longest first, short sentences fill the gaps at the end
+        tasks.sort(key=lambda task: len(task[1]), reverse=True)
+
+        print(f"[{(time.time() - start_time):.1f}s] "
+              f"Synthesizing {len(tasks)} sentences "
+              f"on {self.workers} workers...")
+
+        self.start()
+        futures = [
+            self.executor.submit(synthesize_in_worker, *task)
+            for task in tasks
+        ]
+
+        for finished, future in enumerate(as_completed(futures)):
+            try:
+                index, success = future.result()
+            except Exception as e:
+                print(f"Synthesis failed: {e}")
+                continue
+
+            sentences[index]["synthesis_result"] = success
+            print(f"[{(time.time() - start_time):.1f}s] "
+                  f"Synthesized sentence {index} "
+                  f"({finished + 1}/{len(tasks)}): {sentences[index]['text']}"
+                  )
+
+        # number the results like the serial synthesis does
+        successful_synthesis = 0
+        for index, sentence in enumerate(sentences):
+            if not sentence["synthesis_result"]:
+                continue
+
+            os.replace(
+                sentence_filename(f"pool_sentence{index}.wav"),
+                sentence_filename(f"sentence{successful_synthesis}.wav")
+            )
+            successful_synthesis += 1
+
+    def close(self):
+        """
+        Shuts the worker processes down.
+        """
+        if self.executor:
+            self.executor.shutdown()
+            self.executor = None
@@ -1,13 +1,8 @@
+from .modelpool import model_pool
+from .align import align
 from .word import Word
-import torch
-import gc
 import os
 
-faster_model = None
-faster_model_size = None
-stable_model = None
-stable_model_size = None
-
 LANGUAGES = {
     "en": "english",
     "zh": "chinese",
@@ -117,120 +112,216 @@ class TranscriptionInfo:
         self.language = language
 
 
-def unload_faster_model():
+def load_faster_model(size, device="cuda", compute_type="float16"):
     """
-    Unloads the 'faster_model' from memory. It clears the model,
-    empties the CUDA cache, and resets the GPU device.
+    Loads a faster_whisper model (used as loader of the model pool).
     """
-    global faster_model
-    if faster_model:
-        del faster_model
-        torch.cuda.empty_cache()
-        gc.collect()
-        from numba import cuda
-        device = cuda.get_current_device()
-        device.reset()
-        faster_model = None
-        print("faster_whisper model unloaded successfully.")
-    else:
+    import faster_whisper
+
+    return faster_whisper.WhisperModel(
+        size,
+        device=device,
+        compute_type=compute_type
+        )
+
+
+def load_stable_model(size, device="cuda", compute_type="float16"):
+    """
+    Loads a stable_whisper model (used as loader of the model pool).
+    """
+    import stable_whisper
+
+    return stable_whisper.load_model(size, device=device)
+
+
+model_pool.register_loader("faster_whisper", load_faster_model)
+model_pool.register_loader("stable_whisper", load_stable_model)
+
+
+def unload_faster_model(keep_sizes=()):
+    """
+    Unloads all faster_whisper models from the model pool
+    (except the sizes listed in keep_sizes) and frees their memory.
+    """
+    if not model_pool.unload("faster_whisper", keep_sizes):
         print("faster_whisper is not loaded.")
 
 
-def unload_stable_model():
+def unload_stable_model(keep_sizes=()):
     """
-    Unloads the 'stable_model' from memory. It clears the model,
-    empties the CUDA cache, and resets the GPU device.
+    Unloads all stable_whisper models from the model pool
+    (except the sizes listed in keep_sizes) and frees their memory.
     """
-    global stable_model
-    if stable_model:
-        del stable_model
-        torch.cuda.empty_cache()
-        gc.collect()
-        from numba import cuda
-        device = cuda.get_current_device()
-        device.reset()
-        stable_model = None
-        print("Stable model unloaded successfully.")
-    else:
+    if not model_pool.unload("stable_whisper", keep_sizes):
         print("Stable is not loaded.")
 
 
-def faster_transcribe(file_name, language=None, model="medium", vad=True):
+class PooledSegments:
+    """
+    Iterates the lazily decoded segments of faster_whisper.
+
+    Decoding runs while the segments get consumed, so the model pool
+    reference is held until the last segment was delivered (or the
+    iterator got closed or garbage collected).
+    """
+
+    def __init__(self, segments, release):
+        """
+        :param segments: Segment generator of the model.
+        :param release: Callable giving the model back to the pool.
+        """
+        self.segments = segments
+        self.release = release
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.segments is None:
+            raise StopIteration
+        try:
+            return next(self.segments)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        """
+        Stops decoding and gives the model back to the pool.
+        """
+        if self.segments is not None:
+            self.segments = None
+            self.release()
+
+    def __del__(self):
+        self.close()
+
+
+def faster_transcribe(
+        file_name,
+        language=None,
+        model="medium",
+        vad=True,
+        device="cuda",
+        compute_type="float16",
+        speech_map=None
+        ):
     """
     Transcribes a audio file with faster_whisper,
     returns transcript and word timestamps.
-    """
 
-    global faster_model, faster_model_size
+    The model is taken from the shared model pool, so transcription
+    and synthesis verification use the same loaded model. It stays
+    referenced until the returned segments are consumed.
+    With a speech map (see vad.py) only the speech regions get
+    transcribed and the internal voice activity detection is skipped.
+    """
 
-    if faster_model_size and faster_model_size != model:
-        unload_faster_model()
+    faster_model = model_pool.acquire(
+        "faster_whisper", model, device, compute_type
+        )
 
-    if faster_model is None:
-        import faster_whisper
+    if language is not None and language == "":
+        language = None
 
-        faster_model = faster_whisper.WhisperModel(
-            model,
-            device="cuda",
-            compute_type="float16"
+    options = {}
+    if speech_map is not None:
+        from .vad import clip_timestamps
+        options["clip_timestamps"] = clip_timestamps(speech_map)
+        vad = False
+
+    def release():
+        model_pool.release("faster_whisper", model, device, compute_type)
+
+    try:
+        segments, info = faster_model.transcribe(
+            file_name,
+            language=language,
+            beam_size=5,
+            word_timestamps=True,
+            vad_filter=vad,
+            **options
             )
+    except BaseException:
+        release()
+        raise
 
-        faster_model_size = model
+    # segments are decoded lazily, keep the model until they are consumed
+    return PooledSegments(segments, release), info
 
-    if language is not None and language == "":
-        language = None
 
-    return faster_model.transcribe(
+def stable_transcribe(
         file_name,
-        language=language,
-        beam_size=5,
-        word_timestamps=True,
-        vad_filter=vad
-        )
-
-
-def stable_transcribe(file_name, language=None, model="large-v3", vad=True):
+        language=None,
+        model="large-v3",
+        vad=True,
+        device="cuda",
+        alignment="refine",
+        speech_map=None,
+        output_directory=None
+        ):
     """
     Transcribes a audio file with stable_whisper,
     returns transcript and word timestamps.
-    """
-    global stable_model, stable_model_size
-
-    if stable_model_size and stable_model_size != model:
-        unload_stable_model()
 
-    if stable_model is None:
-        import stable_whisper
+    Word timestamps are tightened afterwards with the selected
+    alignment engine ('refine', 'ctc' or 'none', see align.py).
+    With a speech map (see vad.py) everything outside the speech
+    regions gets muted (and skipped as nonspeech by stable_whisper)
+    and the internal voice activity detection is skipped. The muted
+    audio is written to output_directory (next to the input file if
+    not given).
+    """
+    if speech_map is not None:
+        from .cut import mute_outside_ranges
+        speech_file = (
+            f"{os.path.splitext(os.path.basename(file_name))[0]}_speech.wav"
+        )
+        file_name = mute_outside_ranges(
+            file_name,
+            speech_map,
+            os.path.join(
+                output_directory or os.path.dirname(file_name),
+                speech_file
+            )
+            )
+        vad = False
 
-        stable_model = stable_whisper.load_model(model)
-        stable_model_size = model
+    stable_model = model_pool.acquire(
+        "stable_whisper", model, device, "float16"
+        )
 
     if language is not None and language == "":
         language = None
 
-    # result = stable_model.transcribe(
-    #     file_name,
-    #     word_timestamps=True,
-    #     vad=vad,
-    #     language=language,
-    #     regroup=False  # disable default regrouping logic
-    #     )
+    try:
+        # result = stable_model.transcribe(
+        #     file_name,
+        #     word_timestamps=True,
+        #     vad=vad,
+        #     language=language,
+        #     regroup=False  # disable default regrouping logic
+        #     )
+
+        result = stable_model.transcribe(
+            file_name,
+            word_timestamps=True,
+            vad=vad,
+            language=language,
+            suppress_silence=True,
+            #ts_num=16,
+            regroup=False  # disable default regrouping logic
+            )
 
-    result = stable_model.transcribe(
-        file_name,
-        word_timestamps=True,
-        vad=vad,
-        language=language,
-        suppress_silence=True,
-        #ts_num=16,
-        regroup=False  # disable default regrouping logic
+        print(f"Aligning word timestamps with {alignment} alignment...")
+        result = align(
+            alignment,
+            file_name,
+            result,
+            stable_model=stable_model
         )
-
-    result = stable_model.refine(
-        file_name,
-        result,
-        precision=0.05,
-    )
+    finally:
+        model_pool.release("stable_whisper", model, device, "float16")
 
     # apply our own regrouping logic (currently same as default)
     result = (
@@ -260,27 +351,46 @@ def stable_transcribe(file_name, language=None, model="large-v3", vad=True):
     return result, info
 
 
-def extract_words(segments):
+def iter_words(segments):
     """
-    Extracts words from segments.
+    Yields words from segments one by one.
+
+    Segments delivered lazily by faster_whisper are consumed only as far
+    as the caller asks for words, so downstream processing can start
+    while transcription is still running.
     """
-    words = []
     for segment in segments:
         for segword in segment.words:
-            print(".", end="", flush=True)
-            word = Word(
+            yield Word(
                 text=segword.word,
                 start=segword.start,
                 end=segword.end,
                 probability=segword.probability
                 )
-            words.append(word)
+
+        # one progress dot per segment
+        print(".", end="", flush=True)
+
+
+def extract_words(segments):
+    """
+    Extracts words from segments.
+    """
+    words = list(iter_words(segments))
 
     print()
     return words
 
 
-def transcribe(file_name, language=None, model="large-v3", use_faster=False):
+def transcribe(
+        file_name,
+        language=None,
+        model="large-v3",
+        use_faster=False,
+        alignment="refine",
+        speech_map=None,
+        output_directory=None
+        ):
     """
     Transcribes the given audio file using the specified model.
     Chooses between stable and faster transcription models based
@@ -290,23 +400,43 @@ def transcribe(file_name, language=None, model="large-v3", use_faster=False):
     :param model: Model version to use for transcription (default
       is 'large-v3').
     :param use_stable: Boolean flag to choose between stable or faster model.
+    :param alignment: Word alignment engine for stable_whisper
+      ('refine', 'ctc' or 'none').
+    :param speech_map: Speech regions as (start, end) tuples. Only these
+      get transcribed (optional).
+    :param output_directory: Directory for intermediate audio files
+      (optional, defaults to the directory of the audio file).
     :return: Transcription result.
     """
     if use_faster:
-        return faster_transcribe(file_name, language, model)
+        return faster_transcribe(
+            file_name,
+            language,
+            model,
+            speech_map=speech_map
+        )
     else:
-        return stable_transcribe(file_name, language, model)
+        return stable_transcribe(
+            file_name,
+            language,
+            model,
+            alignment=alignment,
+            speech_map=speech_map,
+            output_directory=output_directory
+        )
 
 
-def unload_model(use_faster=False):
+def unload_model(use_faster=False, keep_sizes=()):
     """
     Unloads the transcription model from memory.
     Chooses between unloading the stable or faster model based on 'use_stable'
     flag.
     :param use_stable: Boolean flag to choose between unloading stable or
       faster model.
+    :param keep_sizes: Model sizes to keep loaded (for example the model
+      shared with synthesis verification).
     """
     if use_faster:
-        unload_faster_model()
+        unload_faster_model(keep_sizes)
     else:
-        unload_stable_model()
+        unload_stable_model(keep_sizes)
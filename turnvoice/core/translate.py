@@ -1,4 +1,20 @@
-from deep_translator import GoogleTranslator
+from concurrent.futures import ThreadPoolExecutor
+from abc import ABC, abstractmethod
+from .ratelimit import TokenBucket, retry_with_backoff
+from .cache import ResultCache
+from typing import List
+import threading
+
+MAX_BATCH_CHARACTERS = 4500
+
+
+def language_code(language: str) -> str:
+    """
+    Maps a language code to the code used by the translation services.
+    """
+    if language == "zh":
+        return "zh-CN"
+    return language
 
 
 def translate(text: str, source: str = "en", target: str = "de") -> str:
@@ -14,12 +30,12 @@ def translate(text: str, source: str = "en", target: str = "de") -> str:
     Returns:
     str: The translated text.
     """
+    from deep_translator import GoogleTranslator
+
     # Create an instance of GoogleTranslator with specified source
     # and target languages
-    if source == "zh":
-        source = "zh-CN"
-    if target == "zh":
-        target = "zh-CN"
+    source = language_code(source)
+    target = language_code(target)
 
     print(f"Translating with deep_translator from {source} to {target}...")
     translator = GoogleTranslator(source=source, target=target)
@@ -33,7 +49,435 @@ def translate(text: str, source: str = "en", target: str = "de") -> str:
     return translated_text
 
 
-def perform_translation(sentence_fragments, source_language, target_language):
+class TranslationBackend(ABC):
+    """
+    Interface of a translation service used by the TranslationEngine.
+
+    A backend translates a batch of texts at once and returns exactly one
+    translation per text, in the same order.
+    """
+    name = "base"
+    max_batch_characters = MAX_BATCH_CHARACTERS
+    retry_exceptions = (ConnectionError, TimeoutError)
+
+    @abstractmethod
+    def translate_batch(
+        self,
+        texts: List[str],
+        source: str,
+        target: str
+    ) -> List[str]:
+        """
+        Translates the texts and returns one translation per text.
+        """
+
+
+class GoogleBackend(TranslationBackend):
+    """
+    Translates with deep_translator's GoogleTranslator.
+
+    A batch is sent as one request with the texts on separate lines. If
+    the line structure does not survive the translation, the texts of
+    that batch are translated one by one.
+    """
+    name = "google"
+
+    def __init__(self):
+        from deep_translator.exceptions import RequestError, TooManyRequests
+        from requests.exceptions import RequestException
+
+        self.retry_exceptions = (
+            RequestError,
+            TooManyRequests,
+            RequestException
+        )
+
+        # GoogleTranslator keeps request parameters in the instance,
+        # so every worker thread gets its own translator per language pair
+        self.local = threading.local()
+
+    def translator(self, source: str, target: str):
+        """
+        Returns the translator of the calling thread for a language pair.
+        """
+        from deep_translator import GoogleTranslator
+
+        if not hasattr(self.local, "translators"):
+            self.local.translators = {}
+
+        pair = (language_code(source), language_code(target))
+        if pair not in self.local.translators:
+            self.local.translators[pair] = GoogleTranslator(
+                source=pair[0],
+                target=pair[1]
+            )
+        return self.local.translators[pair]
+
+    def translate_batch(
+        self,
+        texts: List[str],
+        source: str,
+        target: str
+    ) -> List[str]:
+        translator = self.translator(source, target)
+
+        if len(texts) > 1:
+            translated = translator.translate("\n".join(texts))
+            lines = [line.strip() for line in translated.split("\n")]
+            if len(lines) == len(texts):
+                return lines
+
+        return [translator.translate(text) for text in texts]
+
+
+class MarianBackend(TranslationBackend):
+    """
+    Translates offline with MarianMT models (Helsinki-NLP/opus-mt-*)
+    from transformers, so no network access is needed once the model
+    for a language pair has been downloaded. Machines without network
+    access load the models from local directories instead.
+    """
+    name = "marian"
+    max_batch_characters = 2000
+    retry_exceptions = ()
+
+    def __init__(
+        self,
+        device: str = "cpu",
+        model_template: str = "Helsinki-NLP/opus-mt-{source}-{target}",
+        num_beams: int = 2
+    ):
+        """
+        :param device: Torch device the models run on.
+        :param model_template: Model of a language pair, a model name or
+          local model directory, {source} and {target} are replaced by
+          the language codes.
+        :param num_beams: Beam size, 1 is greedy decoding (fastest).
+        """
+        self.device = device
+        self.model_template = model_template
+        self.num_beams = num_beams
+        self.models = {}
+
+        # one batch at a time, torch parallelizes inside the batch
+        self.lock = threading.Lock()
+
+    def model(self, source: str, target: str):
+        """
+        Returns the tokenizer and model of a language pair
+        (loaded on first use).
+        """
+        from transformers import MarianMTModel, MarianTokenizer
+
+        model_name = self.model_template.format(source=source, target=target)
+        if model_name not in self.models:
+            print(f"Loading translation model {model_name}...")
+            tokenizer = MarianTokenizer.from_pretrained(model_name)
+            model = MarianMTModel.from_pretrained(model_name).to(self.device)
+            model.eval()
+            self.models[model_name] = (tokenizer, model)
+        return self.models[model_name]
+
+    def translate_batch(
+        self,
+        texts: List[str],
+        source: str,
+        target: str
+    ) -> List[str]:
+        import torch
+
+        with self.lock:
+            tokenizer, model = self.model(source, target)
+            inputs = tokenizer(
+                texts,
+                return_tensors="pt",
+                padding=True,
+                truncation=True
+            ).to(self.device)
+
+            with torch.no_grad():
+                outputs = model.generate(**inputs, num_beams=self.num_beams)
+
+        return tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+
+TRANSLATION_BACKENDS = {
+    "google": GoogleBackend,
+    "marian": MarianBackend,
+}
+
+
+def create_translation_backend(
+    name: str = "google",
+    model: str = None
+) -> TranslationBackend:
+    """
+    Creates the translation backend with the given name.
+
+    Args:
+    name (str): Name of the backend.
+    model (str): Model of a backend running local models (see
+      MarianBackend's model_template), the default model if not given.
+    """
+    if name not in TRANSLATION_BACKENDS:
+        raise ValueError(
+            f"Unknown translation backend {name}, "
+            f"choose from {', '.join(TRANSLATION_BACKENDS)}"
+        )
+    if not model:
+        return TRANSLATION_BACKENDS[name]()
+    if name != "marian":
+        raise ValueError(f"Translation backend {name} has no model option")
+    return TRANSLATION_BACKENDS[name](model_template=model)
+
+
+def create_text_batches(texts: List[str], max_characters: int):
+    """
+    Packs consecutive texts into batches that stay below the character
+    limit (a single longer text gets a batch of its own).
+
+    Returns:
+    list: Lists of indices into texts.
+    """
+    batches = []
+    batch = []
+    batch_characters = 0
+
+    for index, text in enumerate(texts):
+        characters = len(text) + 1
+        if batch and batch_characters + characters > max_characters:
+            batches.append(batch)
+            batch = []
+            batch_characters = 0
+        batch.append(index)
+        batch_characters += characters
+
+    if batch:
+        batches.append(batch)
+
+    return batches
+
+
+class TranslationEngine:
+    """
+    Translates many texts with few requests.
+
+    Texts are deduplicated and looked up in the translation memory, the
+    remaining ones are packed into batches that are sent concurrently
+    with rate limiting and retries. Results are returned in the order
+    of the input texts.
+    """
+
+    def __init__(
+        self,
+        backend: TranslationBackend = None,
+        workers: int = 4,
+        requests_per_second: float = 5.0,
+        burst: int = 4,
+        max_retries: int = 5,
+        backoff: float = 1.0,
+        memory: ResultCache = None
+    ):
+        """
+        :param backend: Translation backend (GoogleBackend if not given).
+        :param workers: Number of concurrent requests.
+        :param requests_per_second: Request rate limit (0 disables it).
+        :param burst: Number of requests allowed at once before the rate
+          limit kicks in.
+        :param max_retries: Retries of a failed request.
+        :param backoff: Wait time in seconds before the first retry.
+        :param memory: Translation memory, stores every translation
+          under source language, target language, backend and text.
+        """
+        self.backend = backend or GoogleBackend()
+        self.workers = workers
+        self.bucket = TokenBucket(requests_per_second, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.memory = memory
+
+    def memory_key(self, text: str, source: str, target: str) -> str:
+        """
+        Key of a translation in the translation memory.
+        """
+        return ResultCache.key(
+            "translation",
+            source,
+            target,
+            self.backend.name,
+            text
+        )
+
+    def translate_batch(self, texts: List[str], source: str, target: str):
+        """
+        Translates one batch with rate limiting and retries.
+        """
+        def request():
+            self.bucket.acquire()
+            return self.backend.translate_batch(texts, source, target)
+
+        translations = retry_with_backoff(
+            request,
+            self.backend.retry_exceptions,
+            self.max_retries,
+            self.backoff
+        )
+
+        if len(translations) != len(texts):
+            raise ValueError(
+                f"Backend {self.backend.name} returned {len(translations)} "
+                f"translations for {len(texts)} texts"
+            )
+        return translations
+
+    def translate(
+        self,
+        texts: List[str],
+        source: str,
+        target: str
+    ) -> List[str]:
+        """
+        Translates all texts and returns the translations in input order.
+        """
+        # line breaks would break the boundaries of joined batches
+        texts = [" ".join(text.split()) for text in texts]
+        unique_texts = list(dict.fromkeys(text for text in texts if text))
+
+        translations = {}
+        if self.memory is not None:
+            keys = {
+                text: self.memory_key(text, source, target)
+                for text in unique_texts
+            }
+            remembered = self.memory.get_many(keys.values())
+            translations = {
+                text: remembered[key]
+                for text, key in keys.items()
+                if key in remembered
+            }
+
+        pending_texts = [
+            text for text in unique_texts if text not in translations
+        ]
+        batches = [
+            [pending_texts[index] for index in batch]
+            for batch in create_text_batches(
+                pending_texts,
+                self.backend.max_batch_characters
+            )
+        ]
+
+        print(f"Translating {len(pending_texts)} texts in {len(batches)} "
+              f"batches with {self.backend.name}...")
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = executor.map(
+                lambda batch: self.translate_batch(batch, source, target),
+                batches
+            )
+            for batch, batch_translations in zip(batches, results):
+                translations.update(zip(batch, batch_translations))
+                if self.memory is not None:
+                    self.memory.put_many({
+                        self.memory_key(text, source, target): translation
+                        for text, translation in zip(
+                            batch,
+                            batch_translations
+                        )
+                    })
+
+        if self.memory is not None:
+            print(f"Translation memory: {self.memory.stats()}")
+
+        return [translations.get(text, text) for text in texts]
+
+
+class StreamingTranslation:
+    """
+    Translates texts in the background while they are still produced,
+    for example fragments streamed out of a running transcription.
+
+    Texts are collected until a batch is full and then translated by the
+    engine on a background thread. The translations end up in the
+    engine's translation memory, so a later translation of the final
+    fragments finds them there.
+    """
+
+    def __init__(
+        self,
+        engine: TranslationEngine,
+        source: str,
+        target: str,
+        accept=None
+    ):
+        """
+        :param engine: Engine with a translation memory.
+        :param source: Source language code.
+        :param target: Target language code.
+        :param accept: Function taking (start, end) of a fragment,
+          fragments it rejects (for example outside the time limits)
+          are not translated.
+        """
+        self.engine = engine
+        self.source = source
+        self.target = target
+        self.accept = accept
+        self.pending = []
+        self.pending_characters = 0
+        self.futures = []
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def add(self, text: str):
+        """
+        Adds a text, a full batch gets sent right away.
+        """
+        self.pending.append(text)
+        self.pending_characters += len(text) + 1
+        if self.pending_characters >= self.engine.backend.max_batch_characters:
+            self.submit()
+
+    def add_fragment(self, fragment: dict):
+        """
+        Adds the text of a fragment if the fragment is accepted.
+        """
+        if self.accept and not self.accept(fragment["start"], fragment["end"]):
+            return
+        self.add(fragment["text"])
+
+    def submit(self):
+        """
+        Sends the collected texts.
+        """
+        if self.pending:
+            self.futures.append(self.executor.submit(
+                self.engine.translate,
+                self.pending,
+                self.source,
+                self.target
+            ))
+        self.pending = []
+        self.pending_characters = 0
+
+    def finish(self):
+        """
+        Sends the remaining texts and waits for all translations.
+        Failed batches are left to the final translation.
+        """
+        self.submit()
+        for future in self.futures:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Background translation failed: {e}")
+        self.executor.shutdown()
+
+
+def perform_translation(
+    sentence_fragments,
+    source_language,
+    target_language,
+    engine: TranslationEngine = None
+):
     """
     Perform translation of multiple sentence fragments from the source
     language to the target language.
@@ -43,6 +487,8 @@ def perform_translation(sentence_fragments, source_language, target_language):
       dictionary contains the 'text' key with sentence to translate.
     source_language (str): The source language code.
     target_language (str): The target language code.
+    engine (TranslationEngine): Engine performing the translation
+      (batched Google translation if not given).
 
     The function modifies the 'text' key in each dictionary in the list to the
     translated text.
@@ -51,15 +497,15 @@ def perform_translation(sentence_fragments, source_language, target_language):
     if len(target_language) > 0 and source_language != target_language:
         print(f"Translating from {source_language} to {target_language}...")
 
-        for sentence in sentence_fragments:
-            # Log the sentence being translated
-            print(f"Translating \"{sentence['text']}\" from "
-                  f"{source_language} to {target_language}...")
+        engine = engine or TranslationEngine()
+        translations = engine.translate(
+            [sentence["text"] for sentence in sentence_fragments],
+            source_language,
+            target_language
+        )
 
-            # Perform the translation and update the sentence in the list
-            translated_sentence = translate(
-                sentence["text"],
-                source=source_language,
-                target=target_language
-            )
+        for sentence, translated_sentence in zip(
+            sentence_fragments,
+            translations
+        ):
             sentence["text"] = translated_sentence
@@ -53,6 +53,18 @@ def main():
         help='Prints transcription and speaker analysis, then aborts '
              'without synthesizing and rendering. (Optional)'
     )
+    parser.add_argument(
+        '-qa', '--quick_analysis', action='store_true',
+        help='Fast speaker discovery. Only performs speaker detection on '
+             'the original audio, prints the speakers and caches them for '
+             'the follow-up run. (Optional)'
+    )
+    parser.add_argument(
+        '-pm', '--preview_model', type=str,
+        help="Small transcription model (like 'tiny') used by the quick "
+             'analysis to print a text preview for every speaker turn. '
+             '(Optional)'
+    )
     parser.add_argument(
         '-from', '--from', dest='_from', type=str,
         help='Time to start processing the video from. (Optional)'
@@ -141,10 +153,127 @@ def main():
              "'small.en', 'medium', 'medium.en', 'large-v1', 'large-v2', "
              "'large-v3', or 'large'. (Optional)"
     )
+    parser.add_argument(
+        '-align', '--alignment', type=str, default='refine',
+        choices=['refine', 'ctc', 'none'],
+        help='Word timestamp alignment after stable_whisper transcription. '
+             "'refine' is precise but slow, 'ctc' uses fast CTC forced "
+             "alignment on cpu, 'none' keeps the transcription timestamps. "
+             '(Optional, uses refine as default)'
+    )
+    parser.add_argument(
+        '-dw', '--diarization_window', type=float, default=0,
+        help='Window length in seconds for diarization of long audio. '
+             'Overlapping windows are processed in parallel and speakers '
+             'are linked across windows. (Optional, 0 processes the audio '
+             'in one piece)'
+    )
+    parser.add_argument(
+        '-dwk', '--diarization_workers', type=int, default=2,
+        help='Number of parallel workers for windowed diarization. '
+             '(Optional)'
+    )
+    parser.add_argument(
+        '-pw', '--prompt_workers', type=int, default=4,
+        help='Number of concurrent requests for the prompt style '
+             'transformation. (Optional)'
+    )
+    parser.add_argument(
+        '-pbt', '--prompt_batch_tokens', type=int, default=0,
+        help='Packs consecutive sentences into one prompt request up to '
+             'this estimated token count (for example 2000). (Optional, '
+             '0 sends every sentence on its own)'
+    )
+    parser.add_argument(
+        '-pcand', '--prompt_candidates', type=int, default=1,
+        help='Number of parallel candidates requested per sentence for '
+             'the prompt style transformation, the first one with correct '
+             'fragment lengths is taken. (Optional)'
+    )
+    parser.add_argument(
+        '-sw', '--synthesis_workers', type=int, default=1,
+        help='Number of worker processes synthesizing sentences in '
+             'parallel, each with its own engines. (Optional)'
+    )
+    parser.add_argument(
+        '-sdev', '--synthesis_device', type=str, default=None,
+        help="Torch device of the coqui engine, for example 'cpu' to run "
+             "several synthesis workers on a many-core machine. "
+             "Synthesis verification then runs on the cpu too. (Optional)"
+    )
+    parser.add_argument(
+        '-sv', '--skip_verification', action='store_true',
+        help='Synthesizes every sentence once without verifying it with '
+             'whisper. Saves one whisper model per synthesis worker. '
+             '(Optional)'
+    )
+    parser.add_argument(
+        '-tw', '--translation_workers', type=int, default=4,
+        help='Number of concurrent translation requests. (Optional)'
+    )
+    parser.add_argument(
+        '-tb', '--translation_backend', type=str, default='google',
+        choices=['google', 'marian'],
+        help="Translation service. 'google' translates online, 'marian' "
+             "runs MarianMT models locally without network access. "
+             "(Optional)"
+    )
+    parser.add_argument(
+        '-tm', '--translation_model', type=str, default=None,
+        help="Model of the 'marian' translation backend, a model name or "
+             "a local model directory. {source} and {target} are replaced "
+             "by the language codes, for example "
+             "'/models/opus-mt-{source}-{target}'. (Optional)"
+    )
+    parser.add_argument(
+        '-seg', '--segmentation', type=str, default='segments',
+        choices=['segments', 'duration'],
+        help="How the text is split for synthesis. 'segments' uses the "
+             "transcription segments, 'duration' picks fragments fitting "
+             'their time slots (less time stretching). (Optional)'
+    )
+    parser.add_argument(
+        '-sr', '--speech_rate', type=float, default=1.0,
+        help='Speaking speed of the synthesis voices relative to an '
+             "average speaker (for example 1.2 for a fast voice), used by "
+             "'-seg duration'. (Optional)"
+    )
+    parser.add_argument(
+        '-vad', '--speech_map', action='store_true',
+        help='Detects the speech regions once (stored with the downloads) '
+             'and limits transcription and speaker detection to them. '
+             '(Optional)'
+    )
+    parser.add_argument(
+        '-si', '--speaker_index', type=str,
+        help='Speaker index file (npz). Speakers recognized from earlier '
+             'videos are synthesized with their assigned voice, unknown '
+             'speakers are left untouched. (Optional)'
+    )
+    parser.add_argument(
+        '-enroll', '--enroll', nargs='*', type=str,
+        help='Adds detected speakers to the speaker index, format: '
+             'speaker_number=name or speaker_number=name:voice '
+             "(for example 1=alice:alice.wav). (Optional)"
+    )
 
     # Parse the arguments provided by the user
     args = parser.parse_args()
 
+    if args.enroll:
+        if not args.speaker_index:
+            parser.error("-enroll needs a speaker index file (-si)")
+
+        from .speakerindex import parse_enrollment
+        for enrollment in args.enroll:
+            try:
+                parse_enrollment(enrollment)
+            except ValueError as e:
+                parser.error(str(e))
+
+    if args.translation_model and args.translation_backend != "marian":
+        parser.error("-tm needs the marian translation backend (-tb marian)")
+
     # Determine the input video source and target language for translation
     input_video = args.source if args.source is not None else args.inputvideo
     language = (
@@ -179,7 +308,26 @@ def main():
         p_prepare=args.prepare,
         p_render=args.render,
         p_use_faster_whisper=args.use_faster,
-        p_model=args.model
+        p_model=args.model,
+        p_alignment=args.alignment,
+        p_quick_analysis=args.quick_analysis,
+        p_preview_model=args.preview_model,
+        p_diarization_window=args.diarization_window,
+        p_diarization_workers=args.diarization_workers,
+        p_speaker_index=args.speaker_index,
+        p_enroll=args.enroll,
+        p_speech_map=args.speech_map,
+        p_segmentation=args.segmentation,
+        p_speech_rate=args.speech_rate,
+        p_prompt_workers=args.prompt_workers,
+        p_prompt_batch_tokens=args.prompt_batch_tokens,
+        p_prompt_candidates=args.prompt_candidates,
+        p_translation_workers=args.translation_workers,
+        p_translation_backend=args.translation_backend,
+        p_translation_model=args.translation_model,
+        p_synthesis_workers=args.synthesis_workers,
+        p_synthesis_device=args.synthesis_device,
+        p_skip_verification=args.skip_verification
     )
 
 
@@ -0,0 +1,163 @@
+from os.path import basename, exists, getsize, join
+import json
+
+SPEECH_MAP_FILE = "speech_map.json"
+SAMPLING_RATE = 16000
+
+
+def detect_speech(
+    audio_file,
+    threshold=0.5,
+    min_silence_duration=1.0,
+    speech_pad=0.4
+):
+    """
+    Detects speech regions with the silero voice activity detection
+    shipped with faster_whisper (runs fast on cpu).
+
+    Parameters:
+    - audio_file (str): Path to the audio file.
+    - threshold (float): Speech probability threshold.
+    - min_silence_duration (float): Minimum silence in seconds
+        separating two speech regions.
+    - speech_pad (float): Padding in seconds added to each region.
+
+    Returns:
+    - list: Sorted list of (start, end) tuples in seconds.
+    """
+    from faster_whisper.audio import decode_audio
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+    audio = decode_audio(audio_file, sampling_rate=SAMPLING_RATE)
+    options = VadOptions(
+        threshold=threshold,
+        min_silence_duration_ms=int(min_silence_duration * 1000),
+        speech_pad_ms=int(speech_pad * 1000)
+    )
+
+    return [
+        (timestamp["start"] / SAMPLING_RATE, timestamp["end"] / SAMPLING_RATE)
+        for timestamp in get_speech_timestamps(audio, options)
+    ]
+
+
+def get_speech_map(
+    audio_file,
+    directory,
+    threshold=0.5,
+    min_silence_duration=1.0,
+    speech_pad=0.4
+):
+    """
+    Returns the speech regions of the audio file. They are computed once
+    and stored in the job directory, so every processing stage (and every
+    follow-up run) can skip the non-speech parts of the audio.
+
+    Returns:
+    - list: Sorted list of (start, end) tuples in seconds.
+    """
+    speech_map_file = join(directory, SPEECH_MAP_FILE)
+    settings = {
+        "audio_file": basename(audio_file),
+        "audio_size": getsize(audio_file),
+        "threshold": threshold,
+        "min_silence_duration": min_silence_duration,
+        "speech_pad": speech_pad
+    }
+
+    if exists(speech_map_file):
+        with open(speech_map_file, 'r', encoding='utf-8') as f:
+            speech_map = json.load(f)
+
+        if speech_map["settings"] == settings:
+            print(f"Using speech map {speech_map_file}")
+            return [(start, end) for start, end in speech_map["speech"]]
+
+    print(f"Detecting speech in {audio_file}...")
+    speech = detect_speech(
+        audio_file,
+        threshold,
+        min_silence_duration,
+        speech_pad
+    )
+
+    with open(speech_map_file, 'w', encoding='utf-8') as f:
+        json.dump(
+            {
+                "settings": settings,
+                "speech": [[start, end] for start, end in speech]
+            },
+            f,
+            indent=4
+        )
+
+    print(f"Speech map with {len(speech)} regions "
+          f"({speech_duration(speech):.1f}s of speech) "
+          f"saved to {speech_map_file}")
+
+    return speech
+
+
+def speech_duration(ranges):
+    """
+    Total duration of the given (start, end) ranges in seconds.
+    """
+    return sum(end - start for start, end in ranges)
+
+
+def merge_ranges(ranges):
+    """
+    Sorts (start, end) ranges and merges overlapping and touching ones
+    (empty ranges are dropped).
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+
+    return merged
+
+
+def intersect_ranges(ranges, other_ranges):
+    """
+    Intersects two lists of (start, end) ranges. The result is sorted
+    and free of overlaps, the inputs don't need to be.
+
+    If one of the lists is None (no restriction) the other one
+    is returned.
+    """
+    if ranges is None:
+        return other_ranges
+    if other_ranges is None:
+        return ranges
+
+    ranges = merge_ranges(ranges)
+    other_ranges = merge_ranges(other_ranges)
+
+    intersection = []
+    index = other_index = 0
+    while index < len(ranges) and other_index < len(other_ranges):
+        start, end = ranges[index]
+        other_start, other_end = other_ranges[other_index]
+
+        if min(end, other_end) > max(start, other_start):
+            intersection.append((max(start, other_start), min(end, other_end)))
+
+        if end < other_end:
+            index += 1
+        else:
+            other_index += 1
+
+    return intersection
+
+
+def clip_timestamps(ranges):
+    """
+    Converts ranges into the flat clip_timestamps list
+    of faster_whisper (start, end, start, end, ...).
+    """
+    return [time for start, end in ranges for time in (start, end)]
@@ -3,6 +3,21 @@ from moviepy.editor import AudioFileClip
 import textdistance
 import re
 
+# whisper model size used for synthesis verification (shared with
+# transcription through the model pool when the sizes match)
+VERIFICATION_MODEL = "large-v2"
+
+
+def verification_device(device: str = None):
+    """
+    Returns device and compute type of the verification model for a
+    synthesis device. Synthesis on the cpu verifies on the cpu (int8),
+    everything else on cuda (float16) like the transcription.
+    """
+    if device and device.startswith("cpu"):
+        return "cpu", "int8"
+    return "cuda", "float16"
+
 
 def normalize_text(text: str) -> str:
     """
@@ -29,7 +44,8 @@ def verify_synthesis(
     expected_text,
     levenshtein_threshold=0.85,
     jaro_winkler_threshold=0.85,
-    last_word_threshold=0.5
+    last_word_threshold=0.5,
+    device=None
 ):
     """
     Verify that the input text was synthesized correctly.
@@ -37,15 +53,20 @@ def verify_synthesis(
     Args:
     input_file (str): Path to the input WAV file.
     expected_text (str): The expected text that was synthesized.
+    device (str): Device the text was synthesized on (see
+      verification_device).
     """
 
     # transcribe text
     print(f"Using faster transcribe for verification of {input_file}")
+    model_device, compute_type = verification_device(device)
     segs, _ = faster_transcribe(
         input_file,
         language=None,
-        model="large-v2",
-        vad=False
+        model=VERIFICATION_MODEL,
+        vad=False,
+        device=model_device,
+        compute_type=compute_type
         )
 
     words = extract_words(segs)
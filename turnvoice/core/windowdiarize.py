@@ -0,0 +1,352 @@
+from .diarize import (
+    diarization_cache_file,
+    diarize,
+    load_pipeline,
+    load_regions,
+    read_rttm,
+    results_to_speakers,
+    write_rttm
+)
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import numpy as np
+import os
+
+# minimum cosine similarity of two window speakers to be linked to the
+# same global speaker (pyannote 3.1 clusters below ~0.7 cosine distance)
+LINK_SIMILARITY_THRESHOLD = 0.3
+
+
+def get_windows(duration, window_length=1800.0, overlap=60.0):
+    """
+    Splits the audio duration into overlapping windows.
+
+    Raises:
+    - ValueError: If the overlap is not shorter than the window.
+
+    Returns:
+    - list: List of (start, end, core_start, core_end) tuples. The core
+        of a window reaches to the middle of the overlaps with its
+        neighbours, every point in time belongs to exactly one core.
+    """
+    if overlap < 0 or overlap >= window_length:
+        raise ValueError(
+            f"Window overlap {overlap}s must be shorter than the "
+            f"window length {window_length}s"
+        )
+
+    step = window_length - overlap
+    starts = [0.0]
+    while starts[-1] + window_length < duration:
+        starts.append(starts[-1] + step)
+
+    windows = []
+    for index, start in enumerate(starts):
+        end = min(start + window_length, duration)
+        core_start = start + overlap / 2 if index > 0 else 0.0
+        core_end = end - overlap / 2 if index < len(starts) - 1 else duration
+        windows.append((start, end, core_start, core_end))
+
+    return windows
+
+
+def diarize_window(audio_file, window, max_speakers=0):
+    """
+    Diarizes a single window (runs in a worker process).
+
+    Returns:
+    - tuple: List of (start, end, label) tuples in source time,
+        limited to the window core, and a dictionary mapping each
+        label to its speaker embedding centroid.
+    """
+    start, end, core_start, core_end = window
+
+    print(f"Diarizing window {start:.0f}s - {end:.0f}s of {audio_file}...")
+    diarization_pipeline = load_pipeline()
+    file = load_regions(audio_file, [(start, end, 0.0)])
+
+    options = {}
+    if max_speakers > 0:
+        options['max_speakers'] = max_speakers
+
+    diarization, centroids = diarization_pipeline(
+        file,
+        return_embeddings=True,
+        **options
+    )
+
+    results = []
+    for turn, _, label in diarization.itertracks(yield_label=True):
+        turn_start = max(start + turn.start, core_start)
+        turn_end = min(start + turn.end, core_end)
+        if turn_end > turn_start:
+            results.append((turn_start, turn_end, label))
+
+    window_centroids = {}
+    if centroids is not None:
+        for label, centroid in zip(diarization.labels(), centroids):
+            window_centroids[label] = np.asarray(centroid)
+
+    return results, window_centroids
+
+
+def normalize_rows(vectors):
+    """
+    Scales each row to unit length (zero rows stay zero).
+    """
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+def has_embedding(centroid):
+    """
+    Tells if a centroid can be compared by cosine similarity
+    (finite and not all zero).
+    """
+    return bool(np.all(np.isfinite(centroid)) and np.any(centroid))
+
+
+def assign_global_speakers(window_centroids, threshold):
+    """
+    Assigns the speakers of all windows to global speakers, window by
+    window (see link_window_speakers).
+
+    Returns:
+    - tuple: Sum of the normalized centroids per global speaker (zero
+        for speakers without embedding) and one dictionary per window
+        mapping labels to global speaker indices.
+    """
+    global_sums = []
+    mappings = []
+
+    for centroids in window_centroids:
+        mapping = {}
+        labels = [
+            label for label, centroid in centroids.items()
+            if has_embedding(centroid)
+        ]
+        linkable = [
+            index for index, global_sum in enumerate(global_sums)
+            if np.any(global_sum)
+        ]
+
+        if linkable and labels:
+            local = normalize_rows(
+                np.stack([centroids[label] for label in labels])
+            )
+            known = normalize_rows(
+                np.stack([global_sums[index] for index in linkable])
+            )
+            similarity = local @ known.T
+
+            # best matches first, each global speaker once per window
+            for flat_index in np.argsort(-similarity, axis=None):
+                local_index, known_index = np.unravel_index(
+                    flat_index, similarity.shape
+                )
+                if similarity[local_index, known_index] < threshold:
+                    break
+                label = labels[local_index]
+                global_index = linkable[known_index]
+                if label in mapping or global_index in mapping.values():
+                    continue
+                mapping[label] = global_index
+
+        for label in labels:
+            centroid = centroids[label] / np.linalg.norm(centroids[label])
+            if label not in mapping:
+                mapping[label] = len(global_sums)
+                global_sums.append(centroid.copy())
+            else:
+                global_sums[mapping[label]] += centroid
+
+        # speakers without a usable embedding get their own speaker
+        for label in centroids:
+            if label not in mapping:
+                mapping[label] = len(global_sums)
+                global_sums.append(np.zeros(len(centroids[label])))
+
+        mappings.append(mapping)
+
+    return global_sums, mappings
+
+
+def link_window_speakers(
+    window_centroids,
+    threshold=LINK_SIMILARITY_THRESHOLD,
+    num_speakers=0,
+    min_speakers=0
+):
+    """
+    Links the speakers of all windows to global speakers by cosine
+    similarity of their embedding centroids.
+
+    Speakers of the same window are always kept apart. Each window
+    speaker joins the most similar global speaker above the threshold
+    or opens a new one. Speakers without a usable embedding (zero or
+    not finite centroid) always open a new global speaker and are never
+    merged with others.
+
+    Parameters:
+    - window_centroids (list): One dictionary per window mapping
+        labels to centroids.
+    - threshold (float): Minimum cosine similarity for linking.
+    - num_speakers (int): If set, the most similar global speakers get
+        merged until at most this number is left.
+    - min_speakers (int): If set, the threshold is raised until at least
+        this number of global speakers is found (or no more links
+        are left to undo).
+
+    Returns:
+    - list: One dictionary per window mapping labels to global
+        speaker indices.
+    """
+    global_sums, mappings = assign_global_speakers(
+        window_centroids,
+        threshold
+    )
+
+    while len(global_sums) < min_speakers and threshold < 1.0:
+        threshold = min(1.0, threshold + 0.1)
+        global_sums, mappings = assign_global_speakers(
+            window_centroids,
+            threshold
+        )
+
+    if num_speakers > 0:
+        merge_global_speakers(global_sums, mappings, num_speakers)
+
+    return mappings
+
+
+def merge_global_speakers(global_sums, mappings, num_speakers):
+    """
+    Merges the two most similar global speakers until only
+    num_speakers are left (updates the mappings in place). Speakers
+    without embedding can't be compared and are left as they are.
+    """
+    remaining = [
+        index for index, global_sum in enumerate(global_sums)
+        if np.any(global_sum)
+    ]
+
+    while len(remaining) > num_speakers:
+        known = normalize_rows(
+            np.stack([global_sums[index] for index in remaining])
+        )
+        similarity = known @ known.T
+        np.fill_diagonal(similarity, -np.inf)
+
+        first, second = sorted(np.unravel_index(
+            np.argmax(similarity), similarity.shape
+        ))
+        keep, drop = remaining[first], remaining[second]
+
+        global_sums[keep] = global_sums[keep] + global_sums[drop]
+        remaining.remove(drop)
+        for mapping in mappings:
+            for label, global_index in mapping.items():
+                if global_index == drop:
+                    mapping[label] = keep
+
+
+def diarize_windowed(
+    audio_file,
+    num_speakers=0,
+    min_speakers=0,
+    max_speakers=0,
+    cache_directory=None,
+    window_length=1800.0,
+    overlap=60.0,
+    workers=2
+):
+    """
+    Speaker diarization for multi-hour audio. Processes overlapping
+    windows in parallel worker processes and links the speakers across
+    windows through the similarity of their speaker embeddings.
+
+    Audio shorter than one window is diarized in one piece with diarize.
+
+    Parameters:
+    - audio_file (str): Path to the audio file.
+    - num_speakers, min_speakers, max_speakers (int): Speaker count hints.
+    - cache_directory (str, optional): Directory for cached results.
+    - window_length (float): Length of a window in seconds.
+    - overlap (float): Overlap of neighbouring windows in seconds
+        (at most half the window length).
+    - workers (int): Number of parallel worker processes.
+
+    Returns:
+    - list: A sorted list of dictionaries with speaker information
+        ('name', 'total_time', 'segments').
+    """
+    from pyannote.audio import Audio
+    duration = Audio().get_duration(audio_file)
+
+    if duration <= window_length:
+        return diarize(
+            audio_file,
+            num_speakers,
+            min_speakers,
+            max_speakers,
+            cache_directory
+        )
+
+    # short windows get a proportionally short overlap
+    overlap = min(overlap, window_length / 2)
+
+    cache_file = None
+    if cache_directory:
+        if not os.path.exists(cache_directory):
+            os.makedirs(cache_directory)
+
+        cache_file = diarization_cache_file(
+            cache_directory,
+            audio_file,
+            num_speakers,
+            min_speakers,
+            max_speakers,
+            suffix=f"_window{window_length:.0f}_{overlap:.0f}"
+        )
+
+        if os.path.exists(cache_file):
+            print(f"Using cached diarization {cache_file} "
+                  f"for {audio_file}...")
+            return results_to_speakers(read_rttm(cache_file))
+
+    windows = get_windows(duration, window_length, overlap)
+    print(f"Running windowed diarization on {audio_file} "
+          f"({duration:.0f}s in {len(windows)} windows, "
+          f"{workers} workers)...")
+
+    # a window can't contain more speakers than the whole audio
+    window_max_speakers = num_speakers or max_speakers
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        window_results = list(executor.map(
+            diarize_window,
+            [audio_file] * len(windows),
+            windows,
+            [window_max_speakers] * len(windows)
+        ))
+
+    mappings = link_window_speakers(
+        [centroids for _, centroids in window_results],
+        num_speakers=num_speakers or max_speakers,
+        min_speakers=min_speakers
+    )
+
+    results = sorted(
+        (start, end, f"SPEAKER_{mapping[label]:02d}")
+        for (window_turns, _), mapping in zip(window_results, mappings)
+        for start, end, label in window_turns
+    )
+
+    if cache_file:
+        write_rttm(results, cache_file)
+        print(f"Diarization cached in {cache_file}")
+
+    return results_to_speakers(results)
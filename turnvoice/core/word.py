@@ -1,9 +1,13 @@
+import numpy as np
+
+
 class Word:
     """
     Represents a word with start and end times and a probability score.
     """
+    __slots__ = ("text", "start", "end", "probability")
 
-    def __init__(self, 
+    def __init__(self,
                  text: str,
                  start: float,
                  end: float,
@@ -35,3 +39,170 @@ class Word:
         Creates a Word object from a dictionary.
         """
         return Word(**data)
+
+
+class WordView:
+    """
+    Lightweight read-only view of a single word inside a WordStore.
+    Offers the same attributes as Word.
+    """
+    __slots__ = ("store", "index")
+
+    def __init__(self, store, index: int):
+        self.store = store
+        self.index = index
+
+    @property
+    def text(self):
+        return self.store.text(self.index)
+
+    @property
+    def start(self):
+        return float(self.store.starts[self.index])
+
+    @property
+    def end(self):
+        return float(self.store.ends[self.index])
+
+    @property
+    def probability(self):
+        return float(self.store.probabilities[self.index])
+
+    def to_dict(self):
+        """
+        Returns a dictionary representation of the word.
+        """
+        return {
+            'text': self.text,
+            'start': self.start,
+            'end': self.end,
+            'probability': self.probability
+        }
+
+
+class WordStore:
+    """
+    Columnar container for many words.
+
+    Timestamps and probabilities are kept in NumPy arrays, the texts in
+    one UTF-8 buffer with offsets. Saves to and loads from a single npz
+    file without per word parsing.
+    """
+
+    def __init__(self, starts, ends, probabilities, text_buffer, offsets):
+        """
+        :param starts: Start times (float64 array).
+        :param ends: End times (float64 array).
+        :param probabilities: Probabilities (float64 array).
+        :param text_buffer: UTF-8 encoded texts of all words (uint8 array).
+        :param offsets: Start offset of each text in the buffer plus the
+          end offset of the last text (int64 array, one longer than
+          the number of words).
+        """
+        self.starts = starts
+        self.ends = ends
+        self.probabilities = probabilities
+        self.text_buffer = text_buffer
+        self.offsets = offsets
+
+    @classmethod
+    def from_words(cls, words):
+        """
+        Creates a store from Word objects (or anything with text, start,
+        end and probability attributes).
+        """
+        words = list(words)
+        encoded = [word.text.encode("utf-8") for word in words]
+
+        offsets = np.zeros(len(words) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(text) for text in encoded])
+
+        return cls(
+            np.array([word.start for word in words], dtype=np.float64),
+            np.array([word.end for word in words], dtype=np.float64),
+            np.array([word.probability for word in words], dtype=np.float64),
+            np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            offsets
+        )
+
+    @classmethod
+    def load(cls, file_name):
+        """
+        Loads a store saved with save.
+        """
+        with np.load(file_name) as data:
+            return cls(
+                data["starts"],
+                data["ends"],
+                data["probabilities"],
+                data["text_buffer"],
+                data["offsets"]
+            )
+
+    def save(self, file_name):
+        """
+        Saves the store as npz file.
+        """
+        np.savez(
+            file_name,
+            starts=self.starts,
+            ends=self.ends,
+            probabilities=self.probabilities,
+            text_buffer=self.text_buffer,
+            offsets=self.offsets
+        )
+
+    def text(self, index: int):
+        """
+        Returns the text of the word at the given index.
+        """
+        return self.text_buffer[
+            self.offsets[index]:self.offsets[index + 1]
+        ].tobytes().decode("utf-8")
+
+    def select(self, indices):
+        """
+        Returns a new store with the words at the given indices
+        (or boolean mask).
+        """
+        indices = np.arange(len(self))[indices]
+        lengths = self.offsets[indices + 1] - self.offsets[indices]
+
+        offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(lengths)
+
+        # positions of all selected bytes in the old buffer
+        byte_positions = (
+            np.repeat(self.offsets[indices] - offsets[:-1], lengths) +
+            np.arange(offsets[-1])
+        )
+
+        return WordStore(
+            self.starts[indices],
+            self.ends[indices],
+            self.probabilities[indices],
+            self.text_buffer[byte_positions],
+            offsets
+        )
+
+    def to_dicts(self):
+        """
+        Returns a list of dictionaries (one per word).
+        """
+        return [word.to_dict() for word in self]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        if isinstance(index, (slice, list, np.ndarray)):
+            return self.select(index)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("word index out of range")
+        return WordView(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield WordView(self, index)
@@ -0,0 +1,4 @@
+cd ..
+cd ..
+python -m turnvoice.tests.benchmark_translation
+cmd
\ No newline at end of file
@@ -0,0 +1,4 @@
+cd ..
+cd ..
+python -m unittest turnvoice.tests.tests.TestPromptEngine
+cmd
\ No newline at end of file
@@ -0,0 +1,4 @@
+cd ..
+cd ..
+python -m unittest turnvoice.tests.tests.TestSynthesisPool
+cmd
\ No newline at end of file
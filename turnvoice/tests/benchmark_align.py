@@ -0,0 +1,111 @@
+"""
+Compares the word alignment engines by timestamp error against wall time.
+
+Usage:
+    python -m turnvoice.tests.benchmark_align [audio_file] [-r reference.json]
+
+Without a reference file, stable_whisper refine with a precision of 20ms
+serves as reference. A reference file is either a word store (like the
+words.npz of a prepared video) or a JSON list of word dictionaries with
+'text', 'start' and 'end' keys.
+"""
+from turnvoice.core.align import (
+    align,
+    refine_alignment,
+    timestamp_error,
+    ALIGNMENT_ENGINES
+)
+from turnvoice.core.transcribe import stable_transcribe
+from turnvoice.core.modelpool import model_pool
+from turnvoice.core.word import WordStore
+import argparse
+import copy
+import json
+import time
+
+
+def result_words(result):
+    """
+    Returns (text, start, end) tuples of all words
+    of a stable_whisper result.
+    """
+    return [
+        (word.word, word.start, word.end)
+        for segment in result.segments
+        for word in segment.words
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks word alignment engines."
+    )
+    parser.add_argument(
+        'audio_file', nargs='?', type=str,
+        default="turnvoice/tests/audio/testaudio.wav"
+    )
+    parser.add_argument('-r', '--reference', type=str)
+    parser.add_argument('-model', '--model', type=str, default="large-v2")
+    args = parser.parse_args()
+
+    # transcription without alignment as common starting point
+    base_result, _ = stable_transcribe(
+        args.audio_file,
+        model=args.model,
+        alignment="none"
+    )
+
+    stable_model = model_pool.acquire("stable_whisper", args.model)
+
+    if args.reference:
+        if args.reference.endswith(".npz"):
+            reference_words = [
+                (word.text, word.start, word.end)
+                for word in WordStore.load(args.reference)
+            ]
+        else:
+            with open(args.reference, 'r', encoding='utf-8') as f:
+                reference_words = [
+                    (word["text"], word["start"], word["end"])
+                    for word in json.load(f)
+                ]
+    else:
+        print("Creating reference with refine at 20ms precision...")
+        reference = refine_alignment(
+            stable_model,
+            args.audio_file,
+            copy.deepcopy(base_result),
+            precision=0.02
+        )
+        reference_words = result_words(reference)
+
+    results = []
+    for engine in ALIGNMENT_ENGINES:
+        result = copy.deepcopy(base_result)
+
+        start_time = time.time()
+        result = align(
+            engine,
+            args.audio_file,
+            result,
+            stable_model=stable_model
+        )
+        wall_time = time.time() - start_time
+
+        error, matched = timestamp_error(
+            result_words(result),
+            reference_words
+        )
+        results.append((engine, wall_time, error, matched))
+
+    model_pool.release("stable_whisper", args.model)
+
+    print(f"\n{'engine':<10}{'wall time':>12}{'mean error':>14}"
+          f"{'matched words':>16}")
+    for engine, wall_time, error, matched in results:
+        print(f"{engine:<10}{wall_time:>11.2f}s{error * 1000:>12.0f}ms"
+              f"{matched:>10}/{len(reference_words)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Measures the scaling of the interval based word, segment and speaker
+operations on synthetic data.
+
+Usage:
+    python -m turnvoice.tests.benchmark_intervals [-w words] [-s segments]
+
+Words, segments and sentences grow together, near-linear behaviour shows
+as a constant time per word over all sizes. The last row repeats the
+largest size with one additional segment spanning the whole audio
+(marked with +1), which must not slow the other queries down.
+"""
+from turnvoice.core.processing import (
+    assign_sentence_to_speakers,
+    filter_by_speaker,
+    filter_by_time_limits
+)
+from turnvoice.core.fragtokenizer import assign_fragments_to_sentences
+from turnvoice.core.word import Word
+import contextlib
+import argparse
+import random
+import time
+import io
+
+
+def create_words(number_of_words):
+    """
+    Creates consecutive words of 0.1 - 0.5s with small gaps.
+    """
+    words = []
+    position = 0.0
+    for index in range(number_of_words):
+        start = position + random.uniform(0.0, 0.2)
+        end = start + random.uniform(0.1, 0.5)
+        words.append(Word(f"word{index}", start, end))
+        position = end
+    return words
+
+
+def create_speakers(duration, number_of_segments, number_of_speakers=4):
+    """
+    Creates alternating speaker turns covering the duration.
+    """
+    speakers = [
+        {"name": f"SPEAKER_{index:02d}", "segments": []}
+        for index in range(number_of_speakers)
+    ]
+    turn_length = duration / number_of_segments
+    for index in range(number_of_segments):
+        start = index * turn_length
+        speakers[random.randrange(number_of_speakers)]["segments"].append({
+            "start": start,
+            "end": start + turn_length * random.uniform(0.8, 1.1)
+        })
+    return speakers
+
+
+def create_sentences(words, words_per_sentence):
+    """
+    Groups the words into sentences with start and end times.
+    """
+    return [
+        {
+            "text": "sentence",
+            "start": words[index].start,
+            "end": words[min(index + words_per_sentence, len(words)) - 1].end
+        }
+        for index in range(0, len(words), words_per_sentence)
+    ]
+
+
+def measure(function, *args):
+    """
+    Returns the wall time of a call (with its output suppressed).
+    """
+    start_time = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        function(*args)
+    return time.time() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the interval index operations."
+    )
+    parser.add_argument('-w', '--words', type=int, default=100000)
+    parser.add_argument('-s', '--segments', type=int, default=10000)
+    args = parser.parse_args()
+
+    random.seed(0)
+
+    print(f"{'words':>8}{'segments':>10}{'time filter':>14}"
+          f"{'speaker filter':>16}{'assign speakers':>17}"
+          f"{'assign fragments':>18}{'us/word':>10}")
+
+    cases = [
+        (args.words // fraction, args.segments // fraction, False)
+        for fraction in (8, 4, 2, 1)
+    ]
+    cases.append((args.words, args.segments, True))
+
+    for number_of_words, number_of_segments, skewed in cases:
+        words = create_words(number_of_words)
+        duration = words[-1].end
+        speakers = create_speakers(duration, number_of_segments)
+        if skewed:
+            speakers[0]["segments"].append({"start": 0.0, "end": duration})
+        limit_times = [
+            (segment["start"], segment["end"])
+            for segment in speakers[0]["segments"]
+        ]
+        sentences = create_sentences(words, 15)
+        fragments = create_sentences(words, 5)
+
+        times = [
+            measure(filter_by_time_limits, words, limit_times,
+                    "forgiving", 0.2),
+            measure(filter_by_speaker, "1", words, speakers),
+            measure(assign_sentence_to_speakers, sentences, speakers),
+            measure(assign_fragments_to_sentences, fragments, sentences)
+        ]
+
+        segments_label = f"{number_of_segments}{'+1' if skewed else ''}"
+        print(f"{number_of_words:>8}{segments_label:>10}"
+              f"{times[0]:>13.3f}s{times[1]:>15.3f}s{times[2]:>16.3f}s"
+              f"{times[3]:>17.3f}s"
+              f"{sum(times) / number_of_words * 1e6:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Measures the translation throughput of the translation backends in
+sentences per second.
+
+Usage:
+    python -m turnvoice.tests.benchmark_translation [-b google marian]
+        [-n sentences] [-s source] [-t target] [-w workers]
+
+Every sentence is made unique, so neither deduplication nor a
+translation memory can hide the backend latency.
+"""
+from turnvoice.core.translate import (
+    create_translation_backend,
+    TranslationEngine
+)
+import contextlib
+import argparse
+import time
+import io
+
+SENTENCES = [
+    "Welcome back to the channel, today we are building a small garden.",
+    "First we need to measure the space between the two fences.",
+    "The soil here is quite heavy, so we mix in some sand.",
+    "Don't forget to water the seedlings right after planting them.",
+    "If you liked this video, please leave a comment below.",
+    "The weather forecast says it will rain for the rest of the week.",
+    "This tool costs less than ten dollars and lasts for years.",
+    "Let me know which plants you would like to see next time.",
+]
+
+
+def create_sentences(number_of_sentences):
+    """
+    Creates unique sentences by numbering the example sentences.
+    """
+    return [
+        f"{SENTENCES[index % len(SENTENCES)]} Step {index + 1}."
+        for index in range(number_of_sentences)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the translation backends."
+    )
+    parser.add_argument('-b', '--backends', nargs='*',
+                        default=['google', 'marian'])
+    parser.add_argument('-n', '--sentences', type=int, default=200)
+    parser.add_argument('-s', '--source', type=str, default='en')
+    parser.add_argument('-t', '--target', type=str, default='de')
+    parser.add_argument('-w', '--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    sentences = create_sentences(args.sentences)
+
+    print(f"{'backend':>10}{'sentences':>11}{'warmup':>10}"
+          f"{'time':>10}{'sentences/s':>13}")
+
+    for backend_name in args.backends:
+        engine = TranslationEngine(
+            create_translation_backend(backend_name),
+            workers=args.workers,
+            requests_per_second=0
+        )
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            # model loading and connection setup are not part of the run
+            start_time = time.time()
+            engine.translate(["Hello."], args.source, args.target)
+            warmup_time = time.time() - start_time
+
+            start_time = time.time()
+            engine.translate(sentences, args.source, args.target)
+            run_time = time.time() - start_time
+
+        print(f"{backend_name:>10}{len(sentences):>11}"
+              f"{warmup_time:>9.2f}s{run_time:>9.2f}s"
+              f"{len(sentences) / run_time:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,31 @@
 from moviepy.editor import AudioFileClip
-from turnvoice.core.fragtokenizer import create_synthesizable_fragments, merge_short_sentences
-from turnvoice.core.transcribe import faster_transcribe, extract_words
+from turnvoice.core.fragtokenizer import create_synthesizable_fragments, merge_short_sentences, FragmentTokenizer, create_duration_aware_fragments, tap_fragments, assign_fragments_to_sentences, fragment_stretch_cost, synthesis_characters_per_second
+from turnvoice.core.transcribe import faster_transcribe, extract_words, PooledSegments
 from turnvoice.core.silence import strip_silence
 from turnvoice.core.download import fetch_youtube_extract
 from turnvoice.core.synthesis import Synthesis
-from turnvoice.core.word import Word
-from turnvoice.core.verify import verify_synthesis
+from turnvoice.core.synthesispool import SynthesisPool
+from turnvoice.core.word import Word, WordStore
+from turnvoice.core.verify import verify_synthesis, verification_device
+from turnvoice.core.modelpool import ModelPool
+from turnvoice.core.align import timestamp_error
+from turnvoice.core.analysis import save_analysis, load_analysis
+from turnvoice.core.windowdiarize import get_windows, link_window_speakers
+from turnvoice.core.processing import IntervalIndex, speaker_coverage, speaker_overlap_matrix, assign_sentence_to_speakers, filter_fragments_by_words, time_limit_filter
+from turnvoice.core.vad import merge_ranges, intersect_ranges, clip_timestamps
+from turnvoice.core.speakerindex import SpeakerIndex, enroll_speakers, map_voices, parse_enrollment
+from turnvoice.core.prompt import TransformEngine, transform_sentences
+from turnvoice.core.cache import ResultCache
+from turnvoice.core.translate import TranslationBackend, GoogleBackend, TranslationEngine, StreamingTranslation, perform_translation, create_translation_backend
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pydub import AudioSegment
+from openai import OpenAI
+import instructor
+from functools import partial
+import numpy as np
+import threading
 import unittest
+import time
 import shutil
 import json
 import os
@@ -126,6 +144,90 @@ class TestFrag(unittest.TestCase):
 
         self.assertEqual(sentences, expected_sentences)
 
+    def test_incremental_fragmentation(self):
+        # Setup: Create a list of Word objects
+        words = [
+            Word(" Hello", 0.0, 0.5), Word(" world!", 0.6, 1.1), Word(" This", 1.5, 2.0),
+            Word(" is", 2.1, 2.5), Word(" a", 2.6, 3.0), Word(" test", 3.1, 3.5),
+            Word(" again", 5.0, 5.5)
+        ]
+
+        # Execution: Feed the words one by one
+        tokenizer = FragmentTokenizer()
+        emitted = [tokenizer.feed(word) for word in words]
+
+        # Verification: Fragments are emitted as soon as their end is certain
+        self.assertEqual(emitted[1], [{"text": "Hello world!", "start": 0.0, "end": 1.1}])
+        self.assertEqual(emitted[5], [])
+        self.assertEqual(emitted[6], [{"text": "This is a test", "start": 1.5, "end": 3.5}])
+        self.assertEqual(tokenizer.flush(), [{"text": "again", "start": 5.0, "end": 5.5}])
+
+    def test_tap_fragments(self):
+        # Words pass through unchanged, fragments arrive while words are still consumed
+        words = [
+            Word(" Hello", 0.0, 0.5), Word(" world!", 0.6, 1.1), Word(" This", 1.5, 2.0),
+            Word(" is", 2.1, 2.5), Word(" a", 2.6, 3.0), Word(" test.", 3.1, 3.5)
+        ]
+        fragments = []
+        stream = tap_fragments(iter(words), fragments.append)
+
+        self.assertEqual([next(stream), next(stream)], words[:2])
+        self.assertEqual(fragments, [{"text": "Hello world!", "start": 0.0, "end": 1.1}])
+
+        self.assertEqual(list(stream), words[2:])
+        self.assertEqual(fragments, create_synthesizable_fragments(words))
+
+    def test_duration_aware_fragmentation(self):
+        # All words are kept, big gaps always break
+        words = [
+            Word(" Hello", 0.0, 0.5), Word(" world!", 0.6, 1.1), Word(" This", 1.5, 2.0),
+            Word(" is", 2.1, 2.5), Word(" a", 2.6, 3.0), Word(" test", 3.1, 3.5),
+            Word(" again", 5.0, 5.5)
+        ]
+        fragments = create_duration_aware_fragments(words)
+
+        self.assertEqual(" ".join(fragment["text"] for fragment in fragments),
+                         "Hello world! This is a test again")
+        self.assertEqual(fragments[-1], {"text": "again", "start": 5.0, "end": 5.5})
+
+    def test_duration_aware_boundaries(self):
+        # Too long for one fragment at a steady speech rate: the split goes to the comma (cheapest boundary)
+        words = [Word(" word", index * 0.35, index * 0.35 + 0.33) for index in range(34)]
+        words[16] = Word(" word,", words[16].start, words[16].end)
+        words[-1] = Word(" word.", words[-1].start, words[-1].end)
+
+        fragments = create_duration_aware_fragments(words)
+        self.assertEqual([fragment["text"] for fragment in fragments],
+                         [" ".join(["word"] * 16) + " word,", " ".join(["word"] * 16) + " word."])
+        self.assertEqual(fragments[1]["start"], words[17].start)
+
+        # both fragments fit their slots almost perfectly
+        chars_per_second = synthesis_characters_per_second("en")
+        costs = [fragment_stretch_cost(fragment["text"], fragment["end"] - fragment["start"], chars_per_second)
+                 for fragment in fragments]
+        self.assertLess(max(costs), 0.01)
+
+        # a twice as fast voice would need heavy slowing down
+        self.assertGreater(fragment_stretch_cost(fragments[0]["text"], fragments[0]["end"] - fragments[0]["start"],
+                                                 synthesis_characters_per_second("en", "en", 2.0)), 0.4)
+
+    def test_duration_aware_sentence_ends(self):
+        # A fragment never spans the end of a full sentence, even if it would fit better
+        words = [Word(" It", 0.0, 0.2), Word(" is", 0.2, 0.4), Word(" done.", 0.4, 1.2),
+                 Word(" Now", 1.3, 1.5), Word(" go.", 1.5, 1.7)]
+        fragments = create_duration_aware_fragments(words)
+        self.assertEqual([fragment["text"] for fragment in fragments], ["It is done.", "Now go."])
+
+        full_sentences = create_synthesizable_fragments(words, break_characters=('.', '!', '?', '。'))
+        assign_fragments_to_sentences(fragments, full_sentences)
+        self.assertEqual([len(sentence["sentence_frags"]) for sentence in full_sentences], [1, 1])
+
+    def test_synthesis_speech_rate(self):
+        # Longer translations and slower voices mean fewer source characters per second
+        self.assertAlmostEqual(synthesis_characters_per_second("en"), 14.0)
+        self.assertAlmostEqual(synthesis_characters_per_second("en", "de"), 10.0)
+        self.assertAlmostEqual(synthesis_characters_per_second("en", "", 2.0), 28.0)
+
     def test_merge(self):
         # Setup: Create a list of sentence dictionaries
         sentences = [
@@ -242,4 +344,838 @@ class TestVerifySynthesis(unittest.TestCase):
 
         assert last_word_is_fine
         assert levenshtein_is_fine
-        assert jaro_winkler_is_fine
\ No newline at end of file
+        assert jaro_winkler_is_fine
+
+    def test_verification_device(self):
+        # Cpu synthesis verifies on the cpu, everything else on cuda
+        self.assertEqual(verification_device("cpu"), ("cpu", "int8"))
+        self.assertEqual(verification_device("cuda:1"), ("cuda", "float16"))
+        self.assertEqual(verification_device(None), ("cuda", "float16"))
+
+
+class TestModelPool(unittest.TestCase):
+
+    def setUp(self):
+        self.loaded = []
+
+        def loader(size, device, compute_type):
+            self.loaded.append(size)
+            return f"model_{size}"
+
+        self.pool = ModelPool(memory_budget_mb=6000)
+        self.pool.register_loader("faster_whisper", loader)
+
+    def test_shared_model(self):
+        # Two users of the same model share one loaded instance
+        model1 = self.pool.acquire("faster_whisper", "large-v2", "cpu", "int8")
+        model2 = self.pool.acquire("faster_whisper", "large-v2", "cpu", "int8")
+
+        self.assertEqual(model1, model2)
+        self.assertEqual(self.loaded, ["large-v2"])
+
+    def test_size_switch_keeps_models(self):
+        # Switching sizes within the budget does not reload from disk
+        for size in ["tiny", "large-v2", "tiny", "large-v2"]:
+            self.pool.acquire("faster_whisper", size, "cpu", "int8")
+            self.pool.release("faster_whisper", size, "cpu", "int8")
+
+        self.assertEqual(self.loaded, ["tiny", "large-v2"])
+
+    def test_lru_eviction(self):
+        # Exceeding the budget evicts the least recently used free model
+        self.pool.acquire("faster_whisper", "large-v1", "cpu", "int8")
+        self.pool.release("faster_whisper", "large-v1", "cpu", "int8")
+        self.pool.acquire("faster_whisper", "large-v2", "cpu", "int8")
+
+        self.assertFalse(
+            self.pool.is_loaded("faster_whisper", "large-v1", "cpu", "int8"))
+        self.assertTrue(
+            self.pool.is_loaded("faster_whisper", "large-v2", "cpu", "int8"))
+
+    def test_referenced_model_not_evicted(self):
+        # Models in use are never evicted
+        self.pool.acquire("faster_whisper", "large-v1", "cpu", "int8")
+        self.pool.acquire("faster_whisper", "large-v2", "cpu", "int8")
+
+        self.assertTrue(
+            self.pool.is_loaded("faster_whisper", "large-v1", "cpu", "int8"))
+
+        # unloading waits for the last release
+        self.assertEqual(self.pool.unload("faster_whisper"), 2)
+        self.assertTrue(
+            self.pool.is_loaded("faster_whisper", "large-v1", "cpu", "int8"))
+
+        self.pool.release("faster_whisper", "large-v1", "cpu", "int8")
+        self.assertFalse(
+            self.pool.is_loaded("faster_whisper", "large-v1", "cpu", "int8"))
+        self.assertTrue(
+            self.pool.is_loaded("faster_whisper", "large-v2", "cpu", "int8"))
+
+    def test_lazy_segments_keep_model(self):
+        # The model stays referenced until the lazy segments are consumed
+        key = ("faster_whisper", "large-v1", "cpu", "int8")
+        self.pool.acquire(*key)
+        segments = PooledSegments(iter(["segment1", "segment2"]), lambda: self.pool.release(*key))
+
+        self.assertEqual(next(segments), "segment1")
+        self.assertEqual(self.pool.models[key]["references"], 1)
+
+        # a model in use can't be evicted while decoding
+        self.pool.acquire("faster_whisper", "large-v2", "cpu", "int8")
+        self.assertTrue(self.pool.is_loaded(*key))
+
+        self.assertEqual(list(segments), ["segment2"])
+        self.assertEqual(self.pool.models[key]["references"], 0)
+
+        # releasing happens only once
+        segments.close()
+        self.assertEqual(self.pool.models[key]["references"], 0)
+
+
+class TestWordStore(unittest.TestCase):
+
+    def setUp(self):
+        self.words = [
+            Word(" Hello", 0.0, 0.5, 0.9), Word(" wörld!", 0.6, 1.1, 0.8),
+            Word(" This", 1.5, 2.0), Word(" is", 2.1, 2.5)
+        ]
+        self.file_name = "test_words.npz"
+
+    def tearDown(self):
+        if os.path.exists(self.file_name):
+            os.remove(self.file_name)
+
+    def test_roundtrip(self):
+        # Words survive saving and loading unchanged
+        WordStore.from_words(self.words).save(self.file_name)
+        store = WordStore.load(self.file_name)
+
+        self.assertEqual(store.to_dicts(),
+                         [word.to_dict() for word in self.words])
+
+    def test_views(self):
+        # Views and selections behave like the original words
+        store = WordStore.from_words(self.words)
+
+        self.assertEqual(store[1].text, " wörld!")
+        self.assertEqual(store[-1].start, 2.1)
+        self.assertEqual([word.text for word in store[store.starts > 1.0]],
+                         [" This", " is"])
+
+
+class StubChatHandler(BaseHTTPRequestHandler):
+    """
+    OpenAI compatible chat completions endpoint answering style transform
+    requests with the uppercased fragments. The first rate_limited
+    requests are answered with 429.
+    """
+
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+
+        with server.lock:
+            server.requests += 1
+            rate_limited = server.rate_limited > 0
+            if rate_limited:
+                server.rate_limited -= 1
+            else:
+                server.active += 1
+                server.max_active = max(server.max_active, server.active)
+
+        if rate_limited:
+            body = json.dumps({"error": {"message": "Rate limit reached", "type": "requests",
+                                         "code": "rate_limit_exceeded"}}).encode("utf-8")
+            self.send_response(429)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        time.sleep(0.2)
+        name = request["tools"][0]["function"]["name"]
+        content = json.loads(request["messages"][-1]["content"].split("\n", 1)[1])
+        if name == "SentenceBatchResponse":
+            arguments = {"sentences": [
+                {"sentence_fragments": self.transform(sentence["fragments"])} for sentence in content
+            ]}
+        else:
+            arguments = {"sentence_fragments": self.transform(content)}
+        response = {
+            "id": "stub", "object": "chat.completion", "created": 0, "model": request["model"],
+            "choices": [{
+                "index": 0, "finish_reason": "stop",
+                "message": {"role": "assistant", "content": None, "tool_calls": [{
+                    "id": "call", "type": "function",
+                    "function": {"name": name, "arguments": json.dumps(arguments)}
+                }]}
+            }],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+        }
+
+        with server.lock:
+            server.active -= 1
+
+        body = json.dumps(response).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def transform(self, fragments):
+        # fragments starting with "long" come back too long the first time
+        transformed = []
+        for fragment in fragments:
+            with self.server.lock:
+                too_long = fragment.startswith("long") and fragment not in self.server.answered
+                self.server.answered.add(fragment)
+            transformed.append({"text_applied_tone": fragment.upper() * (3 if too_long else 1)})
+        return transformed
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestPromptEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubChatHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = self.server.active = self.server.max_active = 0
+        self.server.rate_limited = 0
+        self.server.answered = set()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.client = instructor.patch(OpenAI(
+            base_url=f"http://127.0.0.1:{self.server.server_port}/v1",
+            api_key="stub",
+            max_retries=0
+        ))
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_concurrent_transform(self):
+        # All sentences get transformed, several requests run at once
+        sentences = [
+            {"text": f"Sentence {index}.", "sentence_frags": [{"text": f"fragment {index}"}]}
+            for index in range(8)
+        ]
+        engine = TransformEngine(self.client, workers=4, requests_per_second=0)
+        transform_sentences(sentences, "uppercase", engine)
+
+        self.assertEqual([sentence["sentence_frags"][0]["text"] for sentence in sentences],
+                         [f"FRAGMENT {index}" for index in range(8)])
+        self.assertEqual(self.server.requests, 8)
+        self.assertGreater(self.server.max_active, 1)
+
+    def test_rate_limit(self):
+        # The token bucket spaces the requests out
+        sentences = [
+            {"text": f"Sentence {index}.", "sentence_frags": [{"text": f"fragment {index}"}]}
+            for index in range(4)
+        ]
+        engine = TransformEngine(self.client, workers=4, requests_per_second=5, burst=1)
+
+        start_time = time.time()
+        transform_sentences(sentences, "uppercase", engine)
+
+        self.assertGreaterEqual(time.time() - start_time, 0.6)
+
+    def test_cache(self):
+        # Repeated sentences and repeated runs are served from the cache
+        cache_file = "test_prompt_cache.sqlite"
+        if os.path.exists(cache_file):
+            os.remove(cache_file)
+
+        def create_sentences():
+            return [
+                {"text": "Same sentence.", "sentence_frags": [{"text": "same fragment"}]}
+                for _ in range(3)
+            ]
+
+        cache = ResultCache(cache_file)
+        engine = TransformEngine(self.client, requests_per_second=0, cache=cache)
+
+        sentences = create_sentences()
+        transform_sentences(sentences, "uppercase", engine)
+        transform_sentences(create_sentences(), "uppercase", engine)
+        cache.close()
+
+        self.assertEqual(sentences[2]["sentence_frags"][0]["text"], "SAME FRAGMENT")
+        self.assertEqual(self.server.requests, 1)
+        os.remove(cache_file)
+
+    def test_batching(self):
+        # Sentences are packed into one request, only failed ones are re-requested
+        sentences = [
+            {"text": f"Sentence {index}.", "sentence_frags": [{"text": f"fragment {index}"}, {"text": "more"}]}
+            for index in range(9)
+        ]
+        sentences.append({"text": "Long one.", "sentence_frags": [{"text": "long fragment here"}]})
+
+        engine = TransformEngine(self.client, requests_per_second=0, batch_token_budget=4000)
+        transform_sentences(sentences, "uppercase", engine)
+
+        self.assertEqual(sentences[0]["sentence_frags"][1]["text"], "MORE")
+        self.assertEqual(sentences[9]["sentence_frags"][0]["text"], "LONG FRAGMENT HERE")
+        self.assertEqual(self.server.requests, 2)
+
+    def test_candidates(self):
+        # A fitting candidate is taken without sequential retries
+        sentences = [{"text": "Long one.", "sentence_frags": [{"text": "long fragment here"}]}]
+
+        engine = TransformEngine(self.client, requests_per_second=0, candidates=3)
+        transform_sentences(sentences, "uppercase", engine)
+
+        self.assertEqual(sentences[0]["sentence_frags"][0]["text"], "LONG FRAGMENT HERE")
+        self.assertLessEqual(self.server.requests, 3)
+
+    def test_rate_limit_errors(self):
+        # 429 answers must reach the engine's backoff instead of being
+        # re-asked by instructor until its attempts run out
+        engine = TransformEngine(self.client, requests_per_second=0, max_retries=5, backoff=0.001)
+
+        for batch_token_budget, candidates in [(0, 1), (4000, 1), (0, 2)]:
+            self.server.requests = 0
+            self.server.rate_limited = 5
+            engine.batch_token_budget = batch_token_budget
+            engine.candidates = candidates
+
+            sentences = [{"text": "Sentence.", "sentence_frags": [{"text": f"fragment {batch_token_budget} {candidates}"}]}]
+            transform_sentences(sentences, "uppercase", engine)
+
+            self.assertEqual(sentences[0]["sentence_frags"][0]["text"], f"FRAGMENT {batch_token_budget} {candidates}")
+            self.assertEqual(self.server.requests, 5 + candidates)
+
+
+class StubTranslationBackend(TranslationBackend):
+    """
+    Uppercases texts, counts batches and concurrent requests.
+    """
+    name = "stub"
+    max_batch_characters = 100
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.batches = self.active = self.max_active = 0
+        self.texts = []
+
+    def translate_batch(self, texts, source, target):
+        with self.lock:
+            self.batches += 1
+            self.texts.extend(texts)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.05)
+        with self.lock:
+            self.active -= 1
+        return [text.upper() for text in texts]
+
+
+class CollapsingTranslator:
+    """
+    Stands in for GoogleTranslator, joins the lines of a text into one
+    like the service sometimes does.
+    """
+    def __init__(self):
+        self.requests = []
+
+    def translate(self, text):
+        self.requests.append(text)
+        return " ".join(text.split("\n")).upper()
+
+
+class TestTranslationEngine(unittest.TestCase):
+
+    def test_batched_translation(self):
+        # Order and boundaries are kept, fragments share few requests
+        fragments = [{"text": f"fragment number {index}"} for index in range(40)]
+        fragments.append({"text": "fragment number 0"})
+
+        backend = StubTranslationBackend()
+        engine = TranslationEngine(backend, workers=4, requests_per_second=0)
+        perform_translation(fragments, "en", "de", engine)
+
+        self.assertEqual([fragment["text"] for fragment in fragments],
+                         [f"FRAGMENT NUMBER {index}" for index in range(40)] + ["FRAGMENT NUMBER 0"])
+        self.assertLess(backend.batches, 40)
+        self.assertGreater(backend.max_active, 1)
+        self.assertLessEqual(backend.max_active, 4)
+
+    def test_same_language(self):
+        # Nothing gets translated without a different target language
+        fragments = [{"text": "fragment"}]
+        backend = StubTranslationBackend()
+        perform_translation(fragments, "en", "en", TranslationEngine(backend))
+
+        self.assertEqual(fragments[0]["text"], "fragment")
+        self.assertEqual(backend.batches, 0)
+
+    def test_translation_memory(self):
+        # Known fragments are taken from the memory instead of the backend
+        memory_file = "test_translation_memory.sqlite"
+        if os.path.exists(memory_file):
+            os.remove(memory_file)
+
+        backend = StubTranslationBackend()
+        memory = ResultCache(memory_file, table="translations")
+        engine = TranslationEngine(backend, requests_per_second=0, memory=memory)
+
+        perform_translation([{"text": "intro"}, {"text": "first"}], "en", "de", engine)
+        self.assertEqual(backend.batches, 1)
+
+        fragments = [{"text": "intro"}, {"text": "second"}]
+        perform_translation(fragments, "en", "de", engine)
+        self.assertEqual([fragment["text"] for fragment in fragments], ["INTRO", "SECOND"])
+        self.assertEqual(backend.batches, 2)
+        self.assertEqual((memory.hits, memory.misses), (1, 3))
+
+        # Another target language is translated again
+        perform_translation([{"text": "intro"}], "en", "fr", engine)
+        self.assertEqual(backend.batches, 3)
+
+        memory.close()
+        os.remove(memory_file)
+
+    def test_streaming_translation(self):
+        # Texts translated in the background are taken from the memory afterwards
+        memory_file = "test_streaming_translation.sqlite"
+        if os.path.exists(memory_file):
+            os.remove(memory_file)
+
+        backend = StubTranslationBackend()
+        memory = ResultCache(memory_file, table="translations")
+        engine = TranslationEngine(backend, requests_per_second=0, memory=memory)
+
+        streaming = StreamingTranslation(engine, "en", "de")
+        for index in range(20):
+            streaming.add(f"fragment number {index}")
+        streaming.finish()
+        batches = backend.batches
+        self.assertGreater(batches, 1)
+
+        fragments = [{"text": f"fragment number {index}"} for index in range(20)]
+        perform_translation(fragments, "en", "de", engine)
+
+        self.assertEqual(backend.batches, batches)
+        self.assertEqual(fragments[3]["text"], "FRAGMENT NUMBER 3")
+
+        memory.close()
+        os.remove(memory_file)
+
+    def test_google_line_fallback(self):
+        # Collapsed lines fall back to one request per text, keeping order and boundaries
+        translator = CollapsingTranslator()
+        backend = GoogleBackend()
+        backend.translator = lambda source, target: translator
+
+        fragments = [{"text": f"fragment number {index}"} for index in range(5)]
+        perform_translation(fragments, "en", "de", TranslationEngine(backend, requests_per_second=0))
+
+        self.assertEqual([fragment["text"] for fragment in fragments],
+                         [f"FRAGMENT NUMBER {index}" for index in range(5)])
+        self.assertEqual(translator.requests[0], "\n".join(f"fragment number {index}" for index in range(5)))
+        self.assertEqual(translator.requests[1:], [f"fragment number {index}" for index in range(5)])
+
+    def test_streaming_time_limits(self):
+        # A limited job only translates the streamed fragments inside its time range
+        words = [Word(f" Sentence {index}.", index * 3.0, index * 3.0 + 1.0) for index in range(10)]
+
+        backend = StubTranslationBackend()
+        engine = TranslationEngine(backend, requests_per_second=0)
+        streaming = StreamingTranslation(engine, "en", "de", accept=time_limit_filter([(9.0, 16.0)], "forgiving", 0.2))
+
+        fragments = []
+
+        def fragment_callback(fragment):
+            fragments.append(fragment)
+            streaming.add_fragment(fragment)
+
+        self.assertEqual(len(list(tap_fragments(iter(words), fragment_callback))), 10)
+        streaming.finish()
+
+        self.assertEqual(len(fragments), 10)
+        self.assertEqual(backend.texts, ["Sentence 3.", "Sentence 4.", "Sentence 5."])
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            create_translation_backend("unknown")
+
+    def test_incomplete_backend(self):
+        # A backend without translate_batch fails when it is created
+        class IncompleteBackend(TranslationBackend):
+            name = "incomplete"
+
+        with self.assertRaises(TypeError):
+            IncompleteBackend()
+
+    def test_translation_model(self):
+        # Local model directories replace the default model names
+        backend = create_translation_backend("marian", "/models/opus-mt-{source}-{target}")
+        self.assertEqual(backend.model_template.format(source="en", target="de"), "/models/opus-mt-en-de")
+
+        with self.assertRaises(ValueError):
+            create_translation_backend("google", "/models/opus-mt-{source}-{target}")
+
+
+class StubSynthesizer:
+    """
+    Writes the text and speaker of a sentence instead of audio.
+    """
+    def __init__(self, language, voices, engine_names, device, verify=True):
+        self.voices = voices
+        self.verify = verify
+
+    def synthesize_duration(self, text, base_filename, desired_duration, speaker_index=0):
+        time.sleep(0.01 * len(text))
+        with open(base_filename, "w", encoding="utf-8") as f:
+            f.write(f"{text}|{self.voices[speaker_index]}|{os.getpid()}|{self.verify}")
+
+
+class TestSynthesisPool(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = "test_synthesis_pool"
+        if os.path.exists(self.directory):
+            shutil.rmtree(self.directory)
+        os.makedirs(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_ordered_results(self):
+        # Results are numbered in sentence order, speakers without voice are skipped
+        sentences = [
+            {"text": "short" * (index % 3 + 1) + str(index), "start": index, "end": index + 1,
+             "speaker_index": index % 3}
+            for index in range(12)
+        ]
+        pool = SynthesisPool(workers=3, voices=["a.wav", "b.wav", None],
+                             synthesizer_factory=StubSynthesizer)
+        pool.synthesize_sentences(sentences, self.directory, time.time())
+        pool.close()
+
+        synthesized = [sentence for sentence in sentences if sentence["synthesis_result"]]
+        self.assertEqual(len(synthesized), 8)
+
+        pids = set()
+        for index, sentence in enumerate(synthesized):
+            with open(os.path.join(self.directory, f"sentence{index}.wav"), encoding="utf-8") as f:
+                text, voice, pid, _ = f.read().split("|")
+            self.assertEqual(text, sentence["text"])
+            self.assertEqual(voice, "ab"[sentence["speaker_index"]] + ".wav")
+            pids.add(pid)
+        self.assertGreater(len(pids), 1)
+
+    def test_factory_options(self):
+        # Options bound to the factory reach every worker (like verify=False)
+        sentences = [{"text": f"sentence {index}", "start": index, "end": index + 1} for index in range(4)]
+        pool = SynthesisPool(workers=2, synthesizer_factory=partial(StubSynthesizer, verify=False))
+        pool.synthesize_sentences(sentences, self.directory, time.time())
+        pool.close()
+
+        for index in range(4):
+            with open(os.path.join(self.directory, f"sentence{index}.wav"), encoding="utf-8") as f:
+                self.assertEqual(f.read().split("|")[3], "False")
+
+
+class TestAlign(unittest.TestCase):
+
+    def test_timestamp_error(self):
+        # Mean of start and end errors over all words
+        words = [(" Hello", 0.1, 0.5), (" world", 0.6, 1.3)]
+        reference = [("hello", 0.0, 0.5), ("World!", 0.6, 1.0)]
+
+        error, matched = timestamp_error(words, reference)
+        self.assertAlmostEqual(error, 0.1)
+        self.assertEqual(matched, 2)
+
+    def test_timestamp_error_matches_by_text(self):
+        # Missing and extra words don't shift the comparison
+        words = [(" Hello", 0.0, 0.5), (" big", 0.5, 0.6), (" world", 0.6, 1.0), (" again", 2.0, 2.5)]
+        reference = [("Hello", 0.0, 0.5), ("world", 0.7, 1.1), ("again", 2.0, 2.5)]
+
+        error, matched = timestamp_error(words, reference)
+        self.assertAlmostEqual(error, 0.1 / 3)
+        self.assertEqual(matched, 3)
+
+        self.assertEqual(timestamp_error([], reference), (0, 0))
+
+
+class TestAnalysis(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = "test_analysis"
+        if os.path.exists(self.directory):
+            shutil.rmtree(self.directory)
+        os.makedirs(self.directory)
+        self.audio_file = os.path.join(self.directory, "audio.wav")
+        with open(self.audio_file, "wb") as f:
+            f.write(b"audio")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_reuse_for_same_audio(self):
+        speakers = [{"speaker": "SPEAKER_00", "segments": [[0.0, 1.0]]}]
+        save_analysis(speakers, self.audio_file, self.directory, 2, 0, 0, [(0, 10)])
+
+        self.assertEqual(load_analysis(self.directory, self.audio_file, 2, 0, 0, [(0, 10)]), speakers)
+        self.assertIsNone(load_analysis(self.directory, self.audio_file, 3, 0, 0, [(0, 10)]))
+        self.assertIsNone(load_analysis(self.directory, self.audio_file, 2, 0, 0, None))
+
+    def test_other_audio_not_reused(self):
+        # An analysis of other audio (another file, or the file changed since) is ignored
+        speakers = [{"speaker": "SPEAKER_00", "segments": [[0.0, 1.0]]}]
+        save_analysis(speakers, self.audio_file, self.directory)
+
+        other_file = os.path.join(self.directory, "other.wav")
+        shutil.copy(self.audio_file, other_file)
+        self.assertIsNone(load_analysis(self.directory, other_file))
+
+        with open(self.audio_file, "ab") as f:
+            f.write(b"more audio")
+        self.assertIsNone(load_analysis(self.directory, self.audio_file))
+
+
+class TestWindowDiarize(unittest.TestCase):
+
+    def test_windows(self):
+        # The window cores cover the audio without gaps or overlaps
+        windows = get_windows(100.0, window_length=40.0, overlap=10.0)
+        self.assertEqual([window[:2] for window in windows], [(0.0, 40.0), (30.0, 70.0), (60.0, 100.0)])
+        self.assertEqual(windows[0][2], 0.0)
+        self.assertEqual(windows[-1][3], 100.0)
+        for previous, following in zip(windows, windows[1:]):
+            self.assertEqual(previous[3], following[2])
+
+        self.assertEqual(len(get_windows(30.0, window_length=40.0, overlap=10.0)), 1)
+
+    def test_overlap_longer_than_window(self):
+        with self.assertRaises(ValueError):
+            get_windows(100.0, window_length=30.0, overlap=60.0)
+        with self.assertRaises(ValueError):
+            get_windows(100.0, window_length=30.0, overlap=30.0)
+
+    def test_link_speakers(self):
+        # Similar speakers get linked across windows, speakers of one window stay apart
+        alice, bob = np.array([1.0, 0.1, 0.0]), np.array([0.0, 1.0, 0.1])
+        mappings = link_window_speakers([
+            {"A": alice, "B": bob},
+            {"X": bob * 2, "Y": alice * 0.5},
+            {"Z": alice + bob * 0.2, "W": alice},
+        ])
+        self.assertEqual(mappings[0], {"A": 0, "B": 1})
+        self.assertEqual(mappings[1], {"X": 1, "Y": 0})
+        # the closer one of two similar speakers takes the link
+        self.assertEqual(mappings[2], {"W": 0, "Z": 2})
+
+    def test_link_speakers_without_embedding(self):
+        # Zero and NaN centroids get their own speaker and are never merged
+        alice, bob = np.array([1.0, 0.0]), np.array([0.0, 1.0])
+        mappings = link_window_speakers([
+            {"A": alice, "Z": np.zeros(2)},
+            {"B": bob, "N": np.array([np.nan, np.nan])},
+            {"C": alice},
+        ], num_speakers=1)
+        self.assertEqual(mappings[0]["A"], mappings[1]["B"])
+        self.assertEqual(mappings[2]["C"], mappings[0]["A"])
+        speakers = {mappings[0]["A"], mappings[0]["Z"], mappings[1]["N"]}
+        self.assertEqual(len(speakers), 3)
+
+    def test_link_min_speakers(self):
+        # A raised threshold keeps moderately similar speakers apart
+        first, second = np.array([1.0, 0.0]), np.array([0.6, 0.8])
+        self.assertEqual(link_window_speakers([{"A": first}, {"B": second}]), [{"A": 0}, {"B": 0}])
+        self.assertEqual(link_window_speakers([{"A": first}, {"B": second}], min_speakers=2), [{"A": 0}, {"B": 1}])
+
+
+class TestSpeakerIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index_file = "test_speaker_index.npz"
+        if os.path.exists(self.index_file):
+            os.remove(self.index_file)
+
+    def tearDown(self):
+        if os.path.exists(self.index_file):
+            os.remove(self.index_file)
+
+    def test_save_and_load(self):
+        index = SpeakerIndex(self.index_file)
+        index.add("alice", [3.0, 0.0, 0.0], "alice.wav")
+        index.add("bob", [0.0, 2.0, 0.0])
+        index.add("alice", [0.0, 0.0, 1.0])
+        index.save()
+
+        loaded = SpeakerIndex(self.index_file)
+        self.assertEqual(list(loaded.names), ["alice", "bob", "alice"])
+        self.assertEqual(loaded.voices, {"alice": "alice.wav"})
+        np.testing.assert_allclose(loaded.embeddings[0], [1.0, 0.0, 0.0])
+
+    def test_save_and_load_without_suffix(self):
+        # np.savez appends .npz, the index is found again under the name given without it
+        index = SpeakerIndex(self.index_file[:-len(".npz")])
+        index.add("alice", [1.0, 0.0, 0.0], "alice.wav")
+        index.save()
+
+        loaded = SpeakerIndex(self.index_file[:-len(".npz")])
+        self.assertEqual(loaded.index_file, self.index_file)
+        self.assertEqual(list(loaded.names), ["alice"])
+
+    def test_match(self):
+        # Best matches first, every identity at most once, unknown below the threshold
+        index = SpeakerIndex(self.index_file)
+        index.add("alice", [1.0, 0.0, 0.0])
+        index.add("alice", [0.0, 0.0, 1.0])
+        index.add("bob", [0.0, 1.0, 0.0])
+
+        matches = index.match(np.array([
+            [0.1, 0.0, 1.0],
+            [0.9, 0.1, 0.0],
+            [0.0, 2.0, 0.1],
+            [-1.0, -1.0, -1.0],
+            [np.nan, np.nan, np.nan],
+        ]))
+        self.assertEqual([name for name, _ in matches], ["alice", None, "bob", None, None])
+        self.assertGreater(matches[0][1], 0.99)
+
+    def test_enroll(self):
+        # Enrolled speakers get recognized with their voice, invalid entries are skipped
+        index = SpeakerIndex(self.index_file)
+        embeddings = np.array([[1.0, 0.0], [0.0, 1.0], [np.nan, np.nan]])
+        enroll_speakers(index, embeddings, ["2=bob:bob.wav", "3=carol", "4=dave", "x=eve"])
+
+        self.assertEqual(list(index.names), ["bob"])
+        self.assertEqual(map_voices(index, np.array([[0.1, 1.0], [1.0, 0.0]])), ["bob.wav", None])
+
+    def test_parse_enrollment(self):
+        self.assertEqual(parse_enrollment("1=alice"), (1, "alice", None))
+        self.assertEqual(parse_enrollment("2=bob:voices/bob.wav"), (2, "bob", "voices/bob.wav"))
+        for enrollment in ["alice", "0=alice", "one=alice", "1=", "1=:bob.wav"]:
+            with self.assertRaises(ValueError):
+                parse_enrollment(enrollment)
+
+
+class TestSpeechRanges(unittest.TestCase):
+
+    def test_merge_ranges(self):
+        self.assertEqual(merge_ranges([(5, 6), (0, 2), (1, 3), (3, 4), (7, 7)]), [(0, 4), (5, 6)])
+        self.assertEqual(merge_ranges([]), [])
+
+    def test_intersect_ranges(self):
+        speech = [(0.0, 2.0), (3.0, 8.0), (9.0, 12.0)]
+        self.assertEqual(intersect_ranges(speech, [(1.0, 4.0), (7.0, 10.0)]),
+                         [(1.0, 2.0), (3.0, 4.0), (7.0, 8.0), (9.0, 10.0)])
+        self.assertEqual(intersect_ranges(speech, None), speech)
+        self.assertIsNone(intersect_ranges(None, None))
+        self.assertEqual(intersect_ranges(speech, [(2.0, 3.0)]), [])
+
+    def test_intersect_overlapping_ranges(self):
+        # Unsorted and overlapping time ranges (like several time files) yield every region once
+        limit_times = [(6.0, 11.0), (1.0, 4.0), (2.0, 7.0)]
+        self.assertEqual(intersect_ranges(limit_times, [(0.0, 5.0), (5.0, 10.0)]), [(1.0, 10.0)])
+        self.assertEqual(intersect_ranges([(0.0, 10.0)], limit_times), [(1.0, 10.0)])
+
+    def test_clip_timestamps(self):
+        self.assertEqual(clip_timestamps([(1.0, 2.5), (4.0, 6.0)]), [1.0, 2.5, 4.0, 6.0])
+        self.assertEqual(clip_timestamps([]), [])
+
+
+class TestIntervalIndex(unittest.TestCase):
+
+    def setUp(self):
+        # short segments plus long ones ending up in the nested index
+        self.intervals = [(index * 1.0, index * 1.0 + 0.5, index) for index in range(100)]
+        self.intervals += [(0.0, 100.0, "all"), (10.0, 40.0, "long"), (20.2, 20.2, "empty")]
+        self.index = IntervalIndex(self.intervals)
+
+    def test_queries(self):
+        self.assertEqual(len(self.index), 103)
+        self.assertEqual(sorted(self.index.containing(50.25), key=str), [(0.0, 100.0, "all"), (50.0, 50.5, 50)])
+        self.assertEqual(sorted(self.index.overlapping(39.6, 39.9), key=str), [(0.0, 100.0, "all"), (10.0, 40.0, "long")])
+        self.assertEqual(sorted(self.index.covering(12.0, 13.0), key=str), [(0.0, 100.0, "all"), (10.0, 40.0, "long")])
+        self.assertEqual(list(self.index.within(19.0, 21.0)),
+                         [(19.0, 19.5, 19), (20.0, 20.5, 20), (20.2, 20.2, "empty")])
+
+        # long intervals get merged into the start order
+        within = list(self.index.within(9.0, 41.0))
+        self.assertEqual(len(within), 34)
+        self.assertIn((10.0, 40.0, "long"), within)
+        self.assertEqual([start for start, _, _ in within], sorted(start for start, _, _ in within))
+
+    def test_matches_full_scan(self):
+        for start, end in [(-1.0, 0.0), (5.5, 5.7), (9.9, 12.3), (40.0, 40.0), (99.0, 101.0)]:
+            self.assertEqual(
+                sorted(self.index.overlapping(start, end), key=str),
+                sorted((interval for interval in self.intervals
+                        if interval[0] < end and interval[1] > start), key=str)
+            )
+            self.assertEqual(
+                sorted(self.index.containing(start), key=str),
+                sorted((interval for interval in self.intervals
+                        if interval[0] <= start <= interval[1]), key=str)
+            )
+
+
+class TestSpeakerOverlap(unittest.TestCase):
+
+    def setUp(self):
+        self.speakers = [
+            {"segments": [{"start": 4.0, "end": 6.0}, {"start": 0.0, "end": 2.0}, {"start": 1.0, "end": 3.0}]},
+            {"segments": [{"start": 2.5, "end": 5.0}]},
+            {"segments": []},
+        ]
+
+    def test_speaker_coverage(self):
+        # Cumulative speech per speaker, overlapping segments counted once
+        coverage = speaker_coverage(self.speakers, [-1.0, 0.0, 1.5, 3.5, 5.0, 10.0])
+        np.testing.assert_allclose(coverage, [
+            [0.0, 0.0, 0.0],
+            [0.0, 0.0, 0.0],
+            [1.5, 0.0, 0.0],
+            [3.0, 1.0, 0.0],
+            [4.0, 2.5, 0.0],
+            [5.0, 2.5, 0.0],
+        ])
+
+    def test_speaker_overlap_matrix(self):
+        sentences = [
+            {"text": "first", "start": 0.5, "end": 2.5},
+            {"text": "second", "start": 2.0, "end": 4.5},
+            {"text": "third", "start": 7.0, "end": 8.0},
+        ]
+        np.testing.assert_allclose(speaker_overlap_matrix(sentences, self.speakers), [
+            [2.0, 0.0, 0.0],
+            [1.5, 2.0, 0.0],
+            [0.0, 0.0, 0.0],
+        ])
+
+        # the largest overlap wins, sentences without any overlap go to speaker 0
+        assign_sentence_to_speakers(sentences, self.speakers)
+        self.assertEqual([sentence["speaker_index"] for sentence in sentences], [0, 1, 0])
+        self.assertEqual(sentences[1]["speaker_overlap"], [0.6, 0.8, 0.0])
+        self.assertEqual(sentences[1]["speaker_confidence"], 0.571)
+
+
+class TestFilterFragments(unittest.TestCase):
+
+    def test_filter_fragments_by_words(self):
+        # Fragments without a remaining word middle are dropped, the order is kept
+        fragments = [
+            {"text": "kept", "start": 0.0, "end": 1.0},
+            {"text": "only word edge", "start": 1.0, "end": 2.0},
+            {"text": "dropped", "start": 3.0, "end": 4.0},
+            {"text": "middle on border", "start": 5.0, "end": 5.5},
+        ]
+        words = [Word(" a", 0.2, 0.4), Word(" b", 1.8, 2.6), Word(" c", 4.5, 5.5)]
+
+        filtered = filter_fragments_by_words(fragments, words)
+        self.assertEqual([fragment["text"] for fragment in filtered], ["kept", "middle on border"])
+
+        self.assertEqual(filter_fragments_by_words(fragments, []), [])
+        self.assertEqual(filter_fragments_by_words([], words), [])